@@ -0,0 +1,501 @@
+# Chunk_Store.py
+import os
+import json
+import mmap
+import pickle
+import hashlib
+import threading
+import uuid
+from bisect import bisect_right
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/<COLLECTION>_chunks/
+#   records.bin    UTF-8 JSON records (source, path, text, ...) back to back
+#   offsets.i64    end offset of each record in records.bin (row id = FAISS row id)
+#   vectors.f32    normalized float32 embeddings, one row per record (for index rebuilds)
+#   hashes.sha     32-byte SHA-256 of each record's text (chunk-level dedupe)
+#   types.u8       chunk type code of each record (index into CHUNK_TYPES)
+#   pages.i32      source page of each record (-1 if unknown)
+#   manifest.json  store id + committed row count + blob size + vector dim + document table
+#
+# The document table maps a stable document id (hash of the document name) to
+# the row range holding its chunks (plus "ranges" for the parts of a streamed
+# document staged between other documents' rows). Rows not owned by a live
+# document are dead (deleted or superseded by a re-upload) and are skipped by
+# searches and index rebuilds.
+#
+# Both data files are append-only. The manifest is the commit point: bytes past
+# the committed sizes (rows flushed by a batch that has not committed yet, or
+# left by a crash mid-write) are ignored and truncated on the next write, so a
+# reader never sees a half-written row.
+RECORDS_FILE = "records.bin"
+OFFSETS_FILE = "offsets.i64"
+VECTORS_FILE = "vectors.f32"
+HASHES_FILE = "hashes.sha"
+HASH_BYTES = 32
+TYPES_FILE = "types.u8"
+PAGES_FILE = "pages.i32"
+# Loader chunk types (Document_Handler); codes are positions, so only append
+CHUNK_TYPES = ("paragraph", "figure_text", "dbc_message", "cdd_element", "arxml_element", "message", "signal")
+OTHER_TYPE = 255
+MANIFEST_FILE = "manifest.json"
+STORE_VERSION = 1
+
+
+class ChunkStore:
+    """
+    Chunk metadata keyed by FAISS row id, stored as a memory-mapped offset
+    array plus a record blob. Lookups decode only the requested rows, so
+    startup and per-query cost do not grow with the corpus.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.store_id = None  # random id written with the first commit; a recreated store gets a new one
+        self.rows = 0
+        self.blob_bytes = 0
+        self.dim = 0
+        self._offsets = None
+        self._vectors = None
+        self._blob = None
+        self._blob_file = None
+        self._pending: List[bytes] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_hashes: List[bytes] = []
+        self._pending_types: List[int] = []
+        self._pending_pages: List[int] = []
+        self._flushed_rows = 0  # rows written past the committed ones (see flush)
+        self._flushed_bytes = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self.docs: Dict[str, Dict] = {}
+        self._docs_dirty = False
+        self._live = None
+        self._owners = None
+        self._lock = threading.RLock()  # lazy mapping / column backfill; the resident store is shared by threads
+        self._load_manifest()
+
+    # --------------------------
+    # Paths / manifest
+    # --------------------------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load_manifest(self):
+        manifest = self._file(MANIFEST_FILE)
+        self._loaded = store_stamp(self.path)  # taken first: a commit while reading is seen as a change
+        if os.path.exists(manifest):
+            with open(manifest, "r") as f:
+                data = json.load(f)
+            self.store_id = data.get("id")
+            self.rows = int(data.get("rows", 0))
+            self.blob_bytes = int(data.get("blob_bytes", 0))
+            self.dim = int(data.get("dim", 0))
+            self.docs = data.get("docs", {})
+
+    def _write_manifest(self):
+        self.store_id = self.store_id or uuid.uuid4().hex
+        tmp = self._file(MANIFEST_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": STORE_VERSION, "id": self.store_id, "rows": self.rows,
+                       "blob_bytes": self.blob_bytes, "dim": self.dim, "docs": self.docs}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file(MANIFEST_FILE))
+        self._loaded = store_stamp(self.path)
+
+    def _check_unchanged(self):
+        """Refuse to write over a store another writer committed to since this one was opened."""
+        if store_stamp(self.path) != self._loaded:
+            raise RuntimeError(f"Chunk store {self.path} was changed by another writer; reopen it and retry")
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file(MANIFEST_FILE))
+
+    def stamp(self):
+        return store_stamp(self.path)
+
+    # --------------------------
+    # Reading
+    # --------------------------
+    def _map(self):
+        if self._blob is not None or self.rows == 0:
+            return
+        with self._lock:
+            if self._blob is not None:
+                return
+            offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self.rows,))
+            blob_file = open(self._file(RECORDS_FILE), "rb")
+            blob = mmap.mmap(blob_file.fileno(), self.blob_bytes, access=mmap.ACCESS_READ)
+            self._offsets, self._blob_file = offsets, blob_file
+            self._blob = blob  # set last: readers check it
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def next_row(self) -> int:
+        """Row id the next appended record will get (committed + flushed + staged rows)."""
+        return self.rows + self._flushed_rows + len(self._pending)
+
+    def get(self, row: int) -> Dict:
+        """Decode a single record by row id."""
+        if not 0 <= row < self.rows:
+            raise IndexError(row)
+        self._map()
+        offsets, blob = self._offsets, self._blob
+        start = int(offsets[row - 1]) if row > 0 else 0
+        end = int(offsets[row])
+        return json.loads(blob[start:end].decode("utf-8"))
+
+    def __getitem__(self, row: int) -> Dict:
+        return self.get(int(row))
+
+    def get_many(self, rows: Iterable[int]) -> List[Dict]:
+        return [self.get(int(r)) for r in rows]
+
+    def has_vectors(self) -> bool:
+        return self.dim > 0 and os.path.exists(self._file(VECTORS_FILE))
+
+    def vectors(self) -> np.ndarray:
+        """Memory-mapped (rows, dim) matrix of the stored normalized embeddings."""
+        if self.rows == 0 or not self.has_vectors():
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._vectors is None:
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r",
+                                      shape=(self.rows, self.dim))
+        return self._vectors
+
+    def _column(self, name: str, dtype, width: int, encode) -> np.ndarray:
+        """(rows, width) per-row column file, backfilled once from the records for stores created without it."""
+        path = self._file(name)
+        item = np.dtype(dtype).itemsize * width
+        with self._lock:  # one thread backfills, the others wait for the complete file
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < self.rows * item:
+                with open(path, "ab") as f:
+                    f.truncate(size - size % item)
+                    for row in range(size // item, self.rows):
+                        f.write(encode(self.get(row)))
+        return np.fromfile(path, dtype=dtype, count=self.rows * width).reshape(self.rows, width)
+
+    def _hashes(self) -> np.ndarray:
+        """(rows, 32) uint8 matrix of text hashes."""
+        return self._column(HASHES_FILE, np.uint8, HASH_BYTES, lambda rec: text_hash(rec.get("text", "")))
+
+    def types(self) -> np.ndarray:
+        """Chunk type code of every row (see CHUNK_TYPES)."""
+        if "types" not in self._columns:
+            self._columns["types"] = self._column(TYPES_FILE, np.uint8, 1, lambda rec: bytes([type_code(rec)]))[:, 0]
+        return self._columns["types"]
+
+    def pages(self) -> np.ndarray:
+        """Source page of every row (-1 if unknown)."""
+        if "pages" not in self._columns:
+            self._columns["pages"] = self._column(PAGES_FILE, np.int32, 1,
+                                                  lambda rec: np.int32(page_of(rec)).tobytes())[:, 0]
+        return self._columns["pages"]
+
+    def live_hashes(self) -> Dict[bytes, int]:
+        """Text hash -> row id for every live row (the collection-wide dedupe set)."""
+        live = self.live_rows()
+        if len(live) == 0:
+            return {}
+        hashes = self._hashes()[live]
+        return {h.tobytes(): int(row) for h, row in zip(hashes, live)}
+
+    # --------------------------
+    # Documents
+    # --------------------------
+    def find_document(self, name: str) -> Dict:
+        return self.docs.get(document_id(name))
+
+    def set_document(self, name: str, path: str, rows: range, content_hash: str = None,
+                     shared: Iterable[int] = (), module: str = None) -> np.ndarray:
+        """
+        Register (or re-point) a document to the row range holding its chunks.
+        `shared` lists rows of other documents (or of this document's previous
+        version) whose text it also contains (deduped at ingest); they stay
+        live as long as it does. `module` is the AUTOSAR module the document
+        is routed to. Returns the rows of the previous version that are no
+        longer referenced by any document.
+        """
+        size = self.next_row()
+        before = self._live_mask(size) if document_id(name) in self.docs else None
+        self.docs[document_id(name)] = {"name": name, "path": path, "sha256": content_hash,
+                                        "start": rows.start, "end": rows.stop,
+                                        "shared": sorted(int(r) for r in set(shared)),
+                                        "module": module}
+        self._docs_dirty = True
+        self._live = None
+        self._owners = None
+        if before is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(before & ~self._live_mask(size)).astype(np.int64)
+
+    def extend_document(self, name: str, rows: range, shared: Iterable[int] = ()):
+        """Add the rows (and shared rows) of a further part to a registered document."""
+        doc = self.docs[document_id(name)]
+        if len(rows) == 0:
+            pass
+        elif doc["end"] == doc["start"]:
+            doc["start"], doc["end"] = rows.start, rows.stop
+        elif doc.get("ranges") and doc["ranges"][-1][1] == rows.start:
+            doc["ranges"][-1][1] = rows.stop
+        elif not doc.get("ranges") and doc["end"] == rows.start:
+            doc["end"] = rows.stop
+        else:
+            doc.setdefault("ranges", []).append([rows.start, rows.stop])
+        doc["shared"] = sorted(set(doc["shared"]).union(int(r) for r in shared))
+        self._docs_dirty = True
+        self._live = None
+        self._owners = None
+
+    def rename_document(self, old: str, new: str, content_hash: str = None) -> np.ndarray:
+        """
+        Register document `old` (a staged version) under the name `new`,
+        replacing any document of that name; returns the rows of the replaced
+        version that are no longer referenced by any document.
+        """
+        size = self.next_row()
+        before = self._live_mask(size)
+        doc = self.docs.pop(document_id(old))
+        self.docs[document_id(new)] = dict(doc, name=new, sha256=content_hash)
+        self._docs_dirty = True
+        self._live = None
+        self._owners = None
+        return np.flatnonzero(before & ~self._live_mask(size)).astype(np.int64)
+
+    @staticmethod
+    def _doc_mask(docs: Iterable[Dict], size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        for doc in docs:
+            for start, end in document_ranges(doc):
+                mask[start:min(end, size)] = True
+            shared = np.asarray(doc.get("shared", []), dtype=np.int64)
+            mask[shared[shared < size]] = True
+        return mask
+
+    def _live_mask(self, size: int) -> np.ndarray:
+        return self._doc_mask(self.docs.values(), size)
+
+    def drop_document(self, name: str) -> np.ndarray:
+        """Forget a document; returns the row ids that are no longer referenced by any document."""
+        if document_id(name) not in self.docs:
+            return np.empty(0, dtype=np.int64)
+        size = self.next_row()
+        before = self._live_mask(size)
+        self.docs.pop(document_id(name))
+        self._docs_dirty = True
+        self._live = None
+        self._owners = None
+        return np.flatnonzero(before & ~self._live_mask(size)).astype(np.int64)
+
+    def row_document(self, row: int) -> Dict:
+        """
+        Live document a row belongs to: the one whose range holds it, else
+        one that shares it (a deduped chunk whose original document was
+        deleted). None for dead rows.
+        """
+        if self._owners is None:
+            ranges = sorted((start, end, d) for d in self.docs.values() for start, end in document_ranges(d)
+                            if end > start)  # disjoint, so tuples never compare the dicts
+            shared: Dict[int, Dict] = {}
+            for doc in self.docs.values():
+                for r in doc.get("shared", []):
+                    shared.setdefault(int(r), doc)
+            self._owners = ([r[0] for r in ranges], ranges, shared)
+        starts, ranges, shared = self._owners
+        i = bisect_right(starts, row) - 1
+        if i >= 0 and row < ranges[i][1]:
+            return ranges[i][2]
+        return shared.get(row)
+
+    def document_rows(self, docs: Iterable[Dict]) -> np.ndarray:
+        """Sorted ids of committed rows owned or shared by the given documents."""
+        return np.flatnonzero(self._doc_mask(docs, self.rows)).astype(np.int64)
+
+    def live_rows(self) -> np.ndarray:
+        """Sorted ids of committed rows referenced by a live document."""
+        if self._live is None:
+            self._live = np.flatnonzero(self._live_mask(self.rows)).astype(np.int64)
+        return self._live
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob_file.close()
+        self._offsets = None
+        self._vectors = None
+        self._columns = {}
+        self._blob = None
+        self._blob_file = None
+
+    # --------------------------
+    # Writing
+    # --------------------------
+    def append(self, records: List[Dict], vectors: np.ndarray = None) -> range:
+        """Stage records (and their normalized vectors) for the next commit; returns their row ids."""
+        first = self.next_row()
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            if self.dim and vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dim {vectors.shape[1]} does not match chunk store dim {self.dim}")
+            self.dim = vectors.shape[1]
+            self._pending_vectors.append(vectors)
+        for rec in records:
+            self._pending.append(json.dumps(rec, ensure_ascii=False).encode("utf-8"))
+            self._pending_hashes.append(text_hash(rec.get("text", "")))
+            self._pending_types.append(type_code(rec))
+            self._pending_pages.append(page_of(rec))
+        return range(first, first + len(records))
+
+    def flush(self):
+        """
+        Write staged rows to the data files, past the committed (and earlier
+        flushed) rows, without publishing them: readers and the next commit
+        only see rows up to the manifest's count, so a batch need not hold its
+        records and vectors in memory until the commit. The first flush of a
+        batch truncates any uncommitted tail left by a crash.
+        """
+        if not self._pending:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if self._flushed_rows == 0:
+            self._check_unchanged()  # the truncation below would drop the other writer's rows
+        if self._flushed_rows == 0 and self.rows:
+            # Backfill columns of rows written before they existed
+            self._hashes()
+            self.types()
+            self.pages()
+        rows = self.rows + self._flushed_rows
+        blob_bytes = self.blob_bytes + self._flushed_bytes
+
+        ends = np.cumsum([len(b) for b in self._pending], dtype=np.int64) + blob_bytes
+        with open(self._file(RECORDS_FILE), "ab") as f:
+            f.truncate(blob_bytes)  # drop any uncommitted tail
+            for b in self._pending:
+                f.write(b)
+        with open(self._file(OFFSETS_FILE), "ab") as f:
+            f.truncate(rows * 8)
+            f.write(ends.tobytes())
+        with open(self._file(HASHES_FILE), "ab") as f:
+            f.truncate(rows * HASH_BYTES)
+            f.write(b"".join(self._pending_hashes))
+        with open(self._file(TYPES_FILE), "ab") as f:
+            f.truncate(rows)
+            f.write(bytes(self._pending_types))
+        with open(self._file(PAGES_FILE), "ab") as f:
+            f.truncate(rows * 4)
+            f.write(np.asarray(self._pending_pages, dtype=np.int32).tobytes())
+        if self._pending_vectors:
+            with open(self._file(VECTORS_FILE), "ab") as f:
+                f.truncate(rows * self.dim * 4)
+                for v in self._pending_vectors:
+                    f.write(v.tobytes())
+
+        self._flushed_rows += len(self._pending)
+        self._flushed_bytes = int(ends[-1]) - self.blob_bytes
+        self._pending = []
+        self._pending_vectors = []
+        self._pending_hashes = []
+        self._pending_types = []
+        self._pending_pages = []
+
+    def commit(self):
+        """Append staged records to disk and publish them (and document changes) via the manifest."""
+        self.flush()
+        if not self._flushed_rows:
+            if self._docs_dirty:
+                os.makedirs(self.path, exist_ok=True)
+                self._check_unchanged()
+                self._write_manifest()
+                self._docs_dirty = False
+            return
+        self.close()
+        for name in (RECORDS_FILE, OFFSETS_FILE, HASHES_FILE, TYPES_FILE, PAGES_FILE, VECTORS_FILE):
+            if os.path.exists(self._file(name)):
+                with open(self._file(name), "rb+") as f:
+                    os.fsync(f.fileno())
+
+        self._check_unchanged()
+        self.rows += self._flushed_rows
+        self.blob_bytes += self._flushed_bytes
+        self._flushed_rows = 0
+        self._flushed_bytes = 0
+        self._live = None
+        self._write_manifest()
+        self._docs_dirty = False
+
+def text_hash(text: str) -> bytes:
+    """SHA-256 of a chunk's text: the collection-wide dedupe key."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def record_type(rec: Dict) -> str:
+    """Loader chunk type of a record (older records without one: figure or paragraph by text)."""
+    if rec.get("type"):
+        return rec["type"]
+    return "figure_text" if rec.get("text", "").startswith("[FIGURE]") else "paragraph"
+
+
+def type_code(rec: Dict) -> int:
+    ctype = record_type(rec)
+    return CHUNK_TYPES.index(ctype) if ctype in CHUNK_TYPES else OTHER_TYPE
+
+
+def page_of(rec: Dict) -> int:
+    page = rec.get("page")
+    return int(page) if page is not None else -1
+
+
+def document_ranges(doc: Dict) -> List[Tuple[int, int]]:
+    """(start, end) row ranges holding a document's chunks."""
+    return [(doc["start"], doc["end"])] + [(start, end) for start, end in doc.get("ranges", [])]
+
+
+def document_size(doc: Dict) -> int:
+    """Number of rows a document holds: its ranges plus the deduped rows it shares."""
+    ranges = document_ranges(doc)
+    return sum(end - start for start, end in ranges) + \
+        sum(1 for r in doc.get("shared", []) if not any(start <= r < end for start, end in ranges))
+
+
+def document_id(name: str) -> str:
+    """Stable document id: hash of the document name, so a revised upload maps to the same id."""
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+
+
+def store_stamp(path: str):
+    """Version stamp of a store's committed state (changes on every commit: each manifest is a new file)."""
+    try:
+        st = os.stat(os.path.join(path, MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# --------------------------
+# Legacy pickle migration
+# --------------------------
+def migrate_pickle(meta_path: str, store: ChunkStore, vectors: np.ndarray = None) -> int:
+    """One-time import of the old pickled metadata list (and index vectors) into an empty chunk store."""
+    if store.exists() or not os.path.exists(meta_path):
+        return 0
+    with open(meta_path, "rb") as f:
+        meta = pickle.load(f)
+    if vectors is not None and len(vectors) != len(meta):
+        vectors = None
+    rows = store.append(meta, vectors)
+    # Each run of consecutive rows from one source was one upload; a later
+    # upload of the same name supersedes the earlier copy
+    start = 0
+    for i, m in enumerate(meta):
+        if i + 1 == len(meta) or meta[i + 1].get("source") != m.get("source"):
+            store.set_document(m.get("source", ""), m.get("path", ""),
+                               range(rows.start + start, rows.start + i + 1))
+            start = i + 1
+    store.commit()
+    return len(meta)
@@ -1,128 +1,310 @@
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Tuple
+import os
 import re
-from openai import OpenAI
+import random
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 import config
 import tiktoken
+from Embedding_Cache import EmbeddingCache
 import time
-import hashlib
+from functools import lru_cache
+from itertools import groupby
  
 # --------------------------
 # OpenAI client
 # --------------------------
 _client = OpenAI(api_key=config.OPENAI_API_KEY)
+EMBED_BATCH_INPUTS = 2048  # max inputs per embeddings request
+EMBED_INPUT_TOKENS = 8191  # max tokens per embeddings input
+# Transient API errors retried with exponential backoff
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+EMBED_CACHE_PATH = os.path.join(config.DB_DIR, "embedding_cache.sqlite")
+_cache = EmbeddingCache(EMBED_CACHE_PATH, config.EMBED_CACHE_MAX_ROWS) if config.EMBED_CACHE else None
  
 # --------------------------
 # Tokenizer helper
 # --------------------------
+@lru_cache(maxsize=None)
+def _encoder(model: str):
+    return tiktoken.encoding_for_model(model)
+ 
+def count_tokens(text: str, model: str = None) -> int:
+    """Token count of text for the chat model (prompt budgeting)."""
+    return len(_encoder(model or config.CHAT_MODEL).encode(text))
+ 
 def chunk_by_tokens(text: str, max_tokens: int, model: str) -> List[str]:
     """Split a text chunk into smaller chunks that fit within max_tokens."""
-    enc = tiktoken.encoding_for_model(model)
-    tokens = enc.encode(text)
-    chunks = []
-    start = 0
-    while start < len(tokens):
-        end = min(start + max_tokens, len(tokens))
-        chunk_tokens = tokens[start:end]
-        chunk_text = enc.decode(chunk_tokens)
-        chunks.append(chunk_text)
-        start = end
-    return chunks
+    enc = _encoder(model)
+    tokens = enc.encode(text, disallowed_special=())
+    return [enc.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
  
 # --------------------------
 # Heading-based chunking
 # --------------------------
-def _normalize_ws(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
+# Line-anchored headings: "## Title", "7.3.1 Transmission request", setext "Title\n====="
+HEADING_PATTERN = re.compile(r"^(?:#{1,6} \S[^\n]*|\d+(?:\.\d+)*\.? +[A-Z][^\n]*|[A-Z][^\n]+\n[-=]{3,})[ \t]*$", re.M)
+# Token limit per chunk type (capped by CHUNK_SIZE)
+TYPE_MAX_TOKENS = {"figure": 150, "message": 200, "signal": 200, "cdd_element": 180, "arxml_element": 200}
+# Loader record types packed together up to their token limit (see pack_records)
+PACKED_TYPES = ("cdd_element", "arxml_element")
  
-def _heading_split(text: str) -> List[str]:
-    pattern = r"(?=\n#{1,6} .*|\n\d+(\.\d+)* .*|\n[A-Z][^\n]+\n[-=]{3,})"
-    parts = re.split(pattern, text)
-    chunks = []
-    buffer = ""
-    for part in parts:
-        if not part or part.isspace():
-            continue
-        if re.match(pattern, "\n" + part):
-            if buffer:
-                chunks.append(buffer.strip())
-                buffer = ""
-        buffer += part.strip() + " "
-    if buffer:
-        chunks.append(buffer.strip())
-    return chunks
+def _max_tokens(chunk_type: str) -> Tuple[int, int]:
+    """(chunk size, overlap) in tokens; CHUNK_OVERLAP is scaled down with the smaller type limits."""
+    size = getattr(config, "CHUNK_SIZE", 500)
+    max_tokens = min(size, TYPE_MAX_TOKENS.get(chunk_type, size))
+    overlap = getattr(config, "CHUNK_OVERLAP", 0) * max_tokens // max(1, size)
+    return max_tokens, min(overlap, max_tokens // 2)
  
-def chunk_text(text: str, chunk_type: str = "paragraph") -> List[str]:
+def chunk_spans(text: str, chunk_type: str = "paragraph") -> List[Dict]:
     """
-    Heading-based chunking with token splitting.
+    Heading-based chunking with token splitting, in one tokenizer pass.
+    The text is encoded once; paragraph text is cut at headings and
+    consecutive short sections are packed up to the chunk size, longer
+    sections are split into windows overlapping by CHUNK_OVERLAP tokens.
+    Chunk texts are slices of the input (line structure kept). Returns
+    [{"text", "tokens", "start", "end"}] with character offsets into `text`.
     chunk_type can be 'paragraph', 'figure', 'message', 'signal', 'cdd_element', 'arxml_element'
     """
-    text = _normalize_ws(text)
-    if not text:
+    if not text or text.isspace():
         return []
+    max_tokens, overlap = _max_tokens(chunk_type)
+    enc = _encoder(config.EMBED_MODEL)
+    tokens = enc.encode(text, disallowed_special=())
+    _, offsets = enc.decode_with_offsets(tokens)
+    offsets.append(len(text))
  
-    heading_chunks = _heading_split(text) if chunk_type == "paragraph" else [text]
- 
-    max_tokens = getattr(config, "CHUNK_SIZE", 500)
-    if chunk_type == "figure":
-        max_tokens = min(max_tokens, 150)
-    elif chunk_type in ["message", "signal"]:
-        max_tokens = min(max_tokens, 200)
-    elif chunk_type in ["cdd_element"]:
-        max_tokens = min(max_tokens, 180)
-    elif chunk_type == "arxml_element":
-        max_tokens = min(max_tokens, 200)
+    # Sections as token ranges, cut where a heading line starts
+    cuts = [0]
+    if chunk_type == "paragraph":
+        for m in HEADING_PATTERN.finditer(text):
+            t = bisect_right(offsets, m.start(), 0, len(tokens)) - 1  # token holding the heading start
+            if cuts[-1] < t < len(tokens):
+                cuts.append(t)
+    cuts.append(len(tokens))
  
-    safe_chunks = []
-    for chunk in heading_chunks:
-        token_chunks = chunk_by_tokens(chunk, max_tokens, config.EMBED_MODEL)
-        safe_chunks.extend(token_chunks)
+    windows = []
+    start = 0
+    for a, b in zip(cuts, cuts[1:]):
+        if b - start <= max_tokens:
+            continue  # section still fits into the current chunk
+        if a > start:
+            windows.append((start, a))
+        start = a
+        if b - a <= max_tokens:
+            continue  # the section starts the next chunk, later short sections are packed with it
+        step = max_tokens - overlap
+        while b - start > max_tokens:
+            windows.append((start, start + max_tokens))
+            start += step
+        windows.append((start, b))  # the section's last window does not run into the next heading
+        start = b
+    if start < len(tokens):
+        windows.append((start, len(tokens)))
  
-    max_chunks = getattr(config, "MAX_CHUNKS_PER_FILE", len(safe_chunks))
-    if len(safe_chunks) > max_chunks:
-        safe_chunks = safe_chunks[:max_chunks]
+    chunks = []
+    for a, b in windows:
+        lo, hi = offsets[a], offsets[b]
+        piece = text[lo:hi]
+        stripped = piece.strip()
+        if not stripped:
+            continue
+        lo += len(piece) - len(piece.lstrip())
+        chunks.append({"text": stripped, "tokens": b - a, "start": lo, "end": lo + len(stripped)})
+    return chunks
  
-    return safe_chunks
+def chunk_text(text: str, chunk_type: str = "paragraph") -> List[str]:
+    """Chunk texts only (see chunk_spans)."""
+    return [c["text"] for c in chunk_spans(text, chunk_type)]
  
 # --------------------------
 # Embedding helpers
 # --------------------------
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    """Embed multiple text chunks deterministically."""
-    embeddings = []
-    for chunk in texts:
-        # Use SHA256 hash as deterministic cache key
-        key = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
-        # Call API
-        resp = _client.embeddings.create(input=chunk, model=config.EMBED_MODEL)
-        emb = resp.data[0].embedding
-        embeddings.append(emb)
-        time.sleep(0.1)
+def _embed_kwargs(dimensions: int = None) -> Dict:
+    """Embeddings API arguments; `dimensions` defaults to config.EMBED_DIMENSIONS (0 = model size)."""
+    kwargs = {"model": config.EMBED_MODEL}
+    dimensions = config.EMBED_DIMENSIONS if dimensions is None else dimensions
+    if dimensions:
+        kwargs["dimensions"] = dimensions
+    return kwargs
+ 
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retry `attempt`: the server's Retry-After if given, else jittered backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60.0, 2 ** attempt) * (0.5 + random.random())
+ 
+def _embed_batch(inputs: List[str], dimensions: int = None) -> List[List[float]]:
+    """One embeddings request, retried on rate limits and transient errors."""
+    for attempt in range(config.EMBED_MAX_RETRIES + 1):
+        try:
+            resp = _client.embeddings.create(input=inputs, **_embed_kwargs(dimensions))
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        except RETRYABLE_ERRORS as e:
+            if attempt == config.EMBED_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"Embeddings request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+ 
+def pack_batches(token_counts: List[int], max_tokens: int, max_inputs: int = EMBED_BATCH_INPUTS) -> List[Tuple[int, int]]:
+    """Split inputs, in order, into (start, end) ranges of at most max_tokens tokens and max_inputs inputs."""
+    batches = []
+    start, tokens = 0, 0
+    for i, n in enumerate(token_counts):
+        if i > start and (tokens + n > max_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+ 
+def _cached(texts: List[str], dimensions: int, embed) -> List[List[float]]:
+    """
+    Vectors for texts from the embedding cache; `embed` is called once with
+    the distinct texts that are missing, and its vectors are cached.
+    """
+    if _cache is None:
+        return embed(texts)
+    dims = config.EMBED_DIMENSIONS if dimensions is None else dimensions
+    vectors = _cache.get_many(config.EMBED_MODEL, dims, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        new = dict(zip(missing, embed(missing)))
+        _cache.put_many(config.EMBED_MODEL, dims, missing, [new[t] for t in missing])
+        vectors = [new[t] if v is None else v for t, v in zip(texts, vectors)]
+    return vectors
+ 
+def embed_texts(texts: List[str], dimensions: int = None) -> List[List[float]]:
+    """
+    Embed many text chunks: cached vectors are reused, the rest are packed
+    into requests of up to EMBED_BATCH_TOKENS tokens, sent by EMBED_WORKERS
+    concurrent workers (retrying rate-limited requests), and returned in
+    input order.
+    """
+    if not texts:
+        return []
+    return _cached(texts, dimensions, lambda missing: _embed_uncached(missing, dimensions))
+ 
+def _embed_uncached(texts: List[str], dimensions: int = None) -> List[List[float]]:
+    started = time.perf_counter()
+    enc = _encoder(config.EMBED_MODEL)
+    token_counts = [len(t) for t in enc.encode_batch(texts, disallowed_special=())]
+    inputs = list(texts)
+    for i, n in enumerate(token_counts):
+        if n > EMBED_INPUT_TOKENS:  # the API rejects oversized inputs
+            inputs[i] = enc.decode(enc.encode(texts[i], disallowed_special=())[:EMBED_INPUT_TOKENS])
+            token_counts[i] = EMBED_INPUT_TOKENS
+    batches = pack_batches(token_counts, config.EMBED_BATCH_TOKENS)
+ 
+    with ThreadPoolExecutor(max_workers=max(1, min(config.EMBED_WORKERS, len(batches)))) as pool:
+        results = pool.map(lambda b: _embed_batch(inputs[b[0]:b[1]], dimensions), batches)
+        embeddings = [emb for batch in results for emb in batch]
+ 
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    tokens = sum(token_counts)
+    print(f"Embedded {len(texts)} chunks ({tokens} tokens) in {len(batches)} requests, {elapsed:.1f}s: "
+          f"{len(texts) / elapsed:.1f} chunks/s, {tokens / elapsed:.0f} tokens/s")
     return embeddings
  
-def embed_query(query: str) -> List[float]:
-    """Embed a single query deterministically."""
-    resp = _client.embeddings.create(input=query, model=config.EMBED_MODEL)
-    return resp.data[0].embedding
+def embed_query(query: str, dimensions: int = None) -> List[float]:
+    """Embed a single query deterministically (cached)."""
+    return _cached([query], dimensions, lambda missing: _embed_batch(missing, dimensions))[0]
+ 
+def embed_queries(queries: List[str], dimensions: int = None) -> List[List[float]]:
+    """Embed many queries with one embeddings request (per EMBED_BATCH_INPUTS uncached queries)."""
+    def embed(missing: List[str]) -> List[List[float]]:
+        embeddings = []
+        for start in range(0, len(missing), EMBED_BATCH_INPUTS):
+            embeddings.extend(_embed_batch(missing[start:start + EMBED_BATCH_INPUTS], dimensions))
+        return embeddings
+    return _cached(queries, dimensions, embed)
  
 # --------------------------
 # Process structured chunks from Document_Handler
 # --------------------------
+def _splitter_type(ctype: str) -> str:
+    if ctype == "figure_text":
+        return "figure"
+    if ctype in ["message", "signal", "cdd_element", "arxml_element"]:
+        return ctype
+    return "paragraph"
+ 
+def _record_pieces(text: str, max_tokens: int, enc) -> Iterator[Tuple[str, int]]:
+    """A record's text as (text, tokens) pieces of at most max_tokens, split at lines, each under the header line."""
+    n = len(enc.encode(text, disallowed_special=()))
+    if n <= max_tokens:
+        yield text, n
+        return
+    header, *lines = text.split("\n")
+    header_tokens = len(enc.encode(header, disallowed_special=())) + 1
+    piece, tokens = [header], header_tokens
+    for line in lines:
+        line_tokens = len(enc.encode(line, disallowed_special=())) + 1
+        if len(piece) > 1 and tokens + line_tokens > max_tokens:
+            yield "\n".join(piece), tokens
+            piece, tokens = [header], header_tokens
+        piece.append(line)
+        tokens += line_tokens
+    yield "\n".join(piece), tokens  # a single oversized line is split later by chunk_spans
+ 
+def pack_records(chunks: Iterable[Dict], chunk_type: str) -> Iterator[Dict]:
+    """
+    Pack consecutive loader records (CDD/ARXML) into chunks of up to the
+    chunk type's token limit; records over the limit are split at lines
+    with their header repeated. Records are never cut in two otherwise.
+    """
+    max_tokens, _ = _max_tokens(chunk_type)
+    enc = _encoder(config.EMBED_MODEL)
+    packed, tokens, first = [], 0, None
+    for c in chunks:
+        for text, n in _record_pieces(c["text"], max_tokens, enc):
+            if packed and tokens + n + 1 > max_tokens:
+                yield {**first, "text": "\n\n".join(packed)}
+                packed, tokens = [], 0
+            if not packed:
+                first = c
+            packed.append(text)
+            tokens += n + 1
+    if packed:
+        yield {**first, "text": "\n\n".join(packed)}
+ 
+def iter_document_records(chunks: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Like process_document_chunks, but keeps each piece's loader type and page
+    so they can be stored and filtered on, plus its token count and character
+    offsets in the loader chunk ({"text", "type", "page", "tokens", "start", "end"}).
+    Consumes `chunks` lazily, so streamed (generator) loader chunks stay streamed.
+    At most MAX_CHUNKS_PER_FILE records are yielded for the document; the
+    loader chunks after the cap are still read, but not chunked.
+    """
+    max_chunks = getattr(config, "MAX_CHUNKS_PER_FILE", 0)
+    count = 0
+    for ctype, group in groupby(chunks, key=lambda c: c.get("type", "paragraph")):
+        if ctype in PACKED_TYPES:
+            group = pack_records(group, _splitter_type(ctype))
+        for c in group:
+            if max_chunks and count >= max_chunks:
+                continue  # read on: streaming loaders collect ECUC values along with their records
+            spans = chunk_spans(c["text"], chunk_type=_splitter_type(ctype))
+            if max_chunks:
+                spans = spans[:max_chunks - count]
+            for span in spans:
+                yield {**span, "type": ctype, "page": c.get("page")}
+            count += len(spans)
+ 
+def process_document_records(chunks: Iterable[Dict]) -> List[Dict]:
+    """All records of iter_document_records as a list."""
+    return list(iter_document_records(chunks))
+ 
 def process_document_chunks(chunks: List[Dict]) -> List[str]:
     """
     Flatten structured document chunks (paragraph, figure, message, signal, cdd_element, arxml_element)
     into text chunks ready for embedding.
     """
-    final_chunks = []
-    for c in chunks:
-        ctype = c.get("type", "paragraph")
-        if ctype == "figure_text":
-            final_chunks.extend(chunk_text(c["text"], chunk_type="figure"))
-        elif ctype in ["message", "signal", "cdd_element"]:
-            final_chunks.extend(chunk_text(c["text"], chunk_type=ctype))
-        elif ctype == "arxml_element":
-            final_chunks.extend(chunk_text(c["text"], chunk_type="arxml_element"))
-        else:
-            final_chunks.extend(chunk_text(c["text"], chunk_type="paragraph"))
-    return final_chunks
- 
-
+    return [r["text"] for r in process_document_records(chunks)]
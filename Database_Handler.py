@@ -1,16 +1,43 @@
 import os
+import json
+import hashlib
 import faiss
 import numpy as np
-import pickle
+import threading
+import uuid
 from typing import List, Dict, Tuple
+try:
+    import fcntl
+except ImportError:  # Windows: no writer lock, the chunk store refuses conflicting writes instead
+    fcntl = None
  
-from Document_Handler import load_document, load_arxml  # ARXML loader
-from Data_Handler import chunk_text, embed_texts, embed_query
+from Chunk_Store import (ChunkStore, CHUNK_TYPES, OTHER_TYPE, document_size, migrate_pickle, record_type, store_stamp,
+                         text_hash)
+from Lexical_Index import LexicalIndex, query_identifiers, reciprocal_rank_fusion
+from Signal_Index import SignalIndex, answer_signal_query
+from Ecuc_Index import EcucIndex, answer_ecuc_query, ecuc_context
+from Index_Factory import (build_index, configure_search, describe_index, needs_rebuild, index_report, size_report,
+                           index_codec, reduce_dims, search_dim, search_params)
+from Module_Router import detect_document_module, route_query
+from Data_Handler import count_tokens, embed_texts, embed_query, embed_queries
 import config
  
 DB_DIR = config.DB_DIR
 FAISS_INDEX_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}.faiss")
-META_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_meta.pkl")
+META_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_meta.pkl")  # legacy, migrated on first open
+CHUNKS_DIR = os.path.join(DB_DIR, f"{config.COLLECTION}_chunks")
+HEADER_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_index.json")
+LEXICAL_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_lexical.sqlite")
+SIGNALS_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_signals.sqlite")
+ECUC_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_ecuc.sqlite")
+WRITE_LOCK_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_write.lock")  # held by one IngestSession at a time
+PARTIAL_SUFFIX = "\0partial"  # document-table name suffix of a document whose parts are still being staged
+ 
+# Metadata filters: msearch(..., filters={"type": "figure", "source": [...], "page": 12})
+FILTER_ATTRIBUTES = ("source", "module", "type", "page")
+TYPE_ALIASES = {"figure": "figure_text", "dbc": "dbc_message", "cdd": "cdd_element", "arxml": "arxml_element"}
+# Filters matching at most this many chunks are scored exactly from the stored vectors
+FILTER_EXACT_MAX = 2048
  
 # --------------------------
 # Helper functions
@@ -18,130 +45,992 @@ META_PATH = os.path.join(DB_DIR, f"{config.COLLECTION}_meta.pkl")
 def _ensure_dir():
     os.makedirs(DB_DIR, exist_ok=True)
  
-def create_or_load_index(d: int) -> Tuple[faiss.IndexFlatIP, List[Dict]]:
-    """Create new FAISS index or load existing one."""
+def open_chunk_store() -> ChunkStore:
+    """Open the collection's chunk store, importing the legacy metadata pickle once."""
+    store = ChunkStore(CHUNKS_DIR)
+    if not store.exists() and os.path.exists(META_PATH):
+        vectors = None
+        if os.path.exists(FAISS_INDEX_PATH):
+            legacy = faiss.read_index(FAISS_INDEX_PATH)
+            vectors = legacy.reconstruct_n(0, legacy.ntotal)  # legacy stores are IndexFlatIP
+        if migrate_pickle(META_PATH, store, vectors):
+            print(f"Migrated {len(store)} chunks from {META_PATH} to {CHUNKS_DIR}")
+            LexicalIndex(LEXICAL_PATH).sync(store)
+            if store.has_vectors():
+                # Re-index by row id so superseded duplicate uploads drop out of search
+                _publish(*_build_from_store(store), store)
+    return store
+ 
+def load_header() -> Dict:
+    """Index header (type, dim, training size) written next to the FAISS file."""
+    if not os.path.exists(HEADER_PATH):
+        return {}
+    with open(HEADER_PATH, "r") as f:
+        return json.load(f)
+ 
+def _write_header(header: Dict):
+    tmp = HEADER_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp, HEADER_PATH)
+ 
+def check_header(header: Dict, store: ChunkStore = None):
+    """
+    Fail fast when a collection was built with a different embedding model or
+    size than config asks for (vectors from different models are not comparable).
+    """
+    if not header:
+        return
+    built_model = header.get("embed_model")
+    if built_model and built_model != config.EMBED_MODEL:
+        raise ValueError(f"Collection '{config.COLLECTION}' was built with EMBED_MODEL={built_model}, "
+                         f"config has {config.EMBED_MODEL}. Re-ingest or switch COLLECTION.")
+    built_dim = header.get("embed_dim")
+    if built_dim and config.EMBED_DIMENSIONS and built_dim != config.EMBED_DIMENSIONS:
+        raise ValueError(f"Collection '{config.COLLECTION}' stores {built_dim}-d embeddings, "
+                         f"config has EMBED_DIMENSIONS={config.EMBED_DIMENSIONS}. Re-ingest or switch COLLECTION.")
+    if built_dim and store is not None and store.dim and store.dim != built_dim:
+        raise ValueError(f"Chunk store holds {store.dim}-d vectors but the index header says {built_dim}-d.")
+ 
+def file_sha256(path: str) -> str:
+    """Content hash of a source file (used to skip re-indexing unchanged uploads)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+ 
+def _empty_index(d: int) -> faiss.Index:
+    return build_index(np.empty((0, search_dim(d)), dtype=np.float32), ids=np.empty(0, dtype=np.int64))
+ 
+def _is_id_mapped(index: faiss.Index) -> bool:
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+ 
+def create_or_load_index(d: int = None) -> Tuple[faiss.Index, ChunkStore]:
+    """Create new FAISS index or load existing one (None if there is none and d is unknown)."""
     _ensure_dir()
-    if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(META_PATH):
-        index = faiss.read_index(FAISS_INDEX_PATH)
-        with open(META_PATH, "rb") as f:
-            meta = pickle.load(f)
-        return index, meta
+    store = open_chunk_store()
+    if os.path.exists(FAISS_INDEX_PATH) and store.exists():
+        check_header(load_header(), store)
+        index = configure_search(faiss.read_index(FAISS_INDEX_PATH))
+        return index, store
     else:
-        index = faiss.IndexFlatIP(d)  # cosine similarity
-        return index, []
+        index = _empty_index(d) if d else None
+        return index, store
+ 
+def _build_from_store(store: ChunkStore) -> Tuple[faiss.Index, Dict]:
+    """Build the configured index over the live (reduced) stored vectors, with its memory / recall report."""
+    live = store.live_rows()
+    index = build_index(reduce_dims(store.vectors()[live], search_dim(store.dim)), ids=live)
+    header = describe_index(index)
+    header["report"] = index_report(index, store.vectors(), ids=live)  # scored blockwise from the memory map
+    return index, header
+ 
+def _publish(index: faiss.Index, header: Dict, store: ChunkStore):
+    """Write a new base index (tmp file + atomic rename) covering the rows of `store`."""
+    header.update({"embed_model": config.EMBED_MODEL, "embed_dim": store.dim, "rows": index.ntotal,
+                   "covered_rows": len(store)})
+    index_tmp = f"{FAISS_INDEX_PATH}.{os.getpid()}.tmp"
+    faiss.write_index(index, index_tmp)
+    rep = header.get("report")
+    if rep is not None and "index_bytes" not in rep:  # freshly rebuilt: size from the written file
+        size_report(rep, os.path.getsize(index_tmp))
+        print(f"Rebuilt {header['index_type']}/{header['codec']} {index.d}-d index over {index.ntotal} vectors: "
+              f"{rep['index_bytes'] / 1e6:.1f} MB vs {rep['float32_bytes'] / 1e6:.1f} MB float32 "
+              f"({rep['compression']}x), recall@{rep.get('k', 0)}={rep.get('recall_at_k', 1.0)}")
+    os.replace(index_tmp, FAISS_INDEX_PATH)
+    _write_header(header)
+    # No lexical sync here: a background compaction publishes an older store snapshot
+    # than the sessions that committed meanwhile (commit_changes syncs it)
+    _resident.invalidate()
+ 
+def covered_rows(header: Dict, index: faiss.Index) -> int:
+    """Chunk store rows the base index was built over; later rows belong to the delta segment."""
+    if "covered_rows" in header:
+        return int(header["covered_rows"])
+    if _is_id_mapped(index) and index.ntotal:
+        return int(faiss.vector_to_array(faiss.downcast_index(index).id_map).max()) + 1
+    return index.ntotal
+ 
+def needs_compaction(store: ChunkStore) -> bool:
+    """True if the delta segment or the tombstoned base rows have grown enough to fold into the base."""
+    header = load_header()
+    live = store.live_rows()
+    if not os.path.exists(FAISS_INDEX_PATH) or "covered_rows" not in header:
+        return len(live) > 0
+    if needs_rebuild(header, len(live), dim=search_dim(store.dim)):
+        return True
+    covered = header["covered_rows"]
+    delta = int(np.count_nonzero(live >= covered))
+    dead = header.get("rows", 0) - (len(live) - delta)
+    return delta >= config.COMPACT_DELTA_ROWS or dead > config.COMPACT_DEAD_FRACTION * max(1, header.get("rows", 0))
+ 
+def _fold_delta(index: faiss.Index, store: ChunkStore, covered: int) -> bool:
+    """Remove dead rows from a loaded base index and add the delta rows; False if it must be rebuilt."""
+    if not (_is_id_mapped(index) and index.is_trained):
+        return False
+    live = store.live_rows()
+    live_mask = np.zeros(len(store), dtype=bool)
+    live_mask[live] = True
+    base_ids = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    dead = base_ids[~live_mask[base_ids]]
+    if len(dead):
+        try:
+            index.remove_ids(faiss.IDSelectorBatch(dead))
+        except RuntimeError:
+            return False  # HNSW cannot remove by id
+    new = live[live >= covered]
+    if len(new):
+        index.add_with_ids(reduce_dims(store.vectors()[new], index.d), new)
+    return True
  
-def save_index(index: faiss.IndexFlatIP, meta: List[Dict]):
+_compaction_lock = threading.Lock()
+ 
+def compact_index(force_rebuild: bool = False) -> int:
+    """
+    Fold the delta segment (rows appended since the base index was written)
+    into the base index and drop rows of deleted documents, then write the
+    base once. Rebuilds from the stored vectors instead when config or corpus
+    growth calls for it. Returns the number of vectors in the new base.
+    """
+    with _compaction_lock:
+        store = open_chunk_store()
+        if not store.has_vectors():
+            return 0
+        header = load_header()
+        index = None
+        if not force_rebuild and os.path.exists(FAISS_INDEX_PATH) and header \
+                and not needs_rebuild(header, len(store.live_rows()), dim=search_dim(store.dim)):
+            index = faiss.read_index(FAISS_INDEX_PATH)
+            if not _fold_delta(index, store, covered_rows(header, index)):
+                index = None
+        if index is None:
+            index, header = _build_from_store(store)
+        _publish(index, header, store)
+        return index.ntotal
+ 
+class Compactor:
+    """Runs compact_index on a background thread; requests made during a run queue one more run."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+ 
+    def request(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is None:
+                # Non-daemon: a CLI ingest waits for the merge before exiting
+                self._thread = threading.Thread(target=self._run, name="index-compactor")
+                self._thread.start()
+ 
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+            try:
+                compact_index()
+            except Exception as e:
+                print(f"Failed to compact index: {e}")
+ 
+    def wait(self):
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+ 
+_compactor = Compactor()
+ 
+def commit_changes(store: ChunkStore, removed: np.ndarray = None):
+    """
+    Publish staged chunk rows and document changes: the append-only store
+    commit (manifest rename) makes them searchable at once through the delta
+    segment, the lexical index is updated, and the FAISS base index is merged
+    in the background once the delta or the deleted rows have grown.
+    """
     _ensure_dir()
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    with open(META_PATH, "wb") as f:
-        pickle.dump(meta, f)
+    store.commit()
+    LexicalIndex(LEXICAL_PATH).sync(store, removed)
+    _resident.invalidate()
+    if store.has_vectors() and needs_compaction(store):
+        _compactor.request()
+ 
+def rebuild_index() -> int:
+    """Rebuild the on-disk index from stored vectors using the configured INDEX_TYPE."""
+    return compact_index(force_rebuild=True)
  
 # --------------------------
-# Add chunks to FAISS
+# Resident index (process-wide)
 # --------------------------
-def add_text_chunks(chunks: List[str], embeddings: List[List[float]], source_name: str, source_path: str) -> int:
-    """Add text chunks + embeddings to FAISS index."""
-    if not chunks:
-        return 0
+class IndexSegments:
+    """
+    What searches run against: the base index from disk plus an in-memory
+    delta index over live rows appended since the base was written. Base rows
+    of deleted documents stay tombstoned (masked by the live-row bitmap)
+    until the next compaction drops them.
+    """
+    def __init__(self, base: faiss.Index, delta: faiss.Index, tombstones: np.ndarray = None):
+        self.base = base
+        self.delta = delta
+        self.tombstones = tombstones
+ 
+    @property
+    def ntotal(self) -> int:
+        return sum(seg.ntotal for seg in (self.base, self.delta) if seg is not None)
+ 
+def _segments(base: faiss.Index, header: Dict, store: ChunkStore) -> IndexSegments:
+    live = store.live_rows()
+    covered = covered_rows(header, base) if base is not None else 0
+    new = live[live >= covered]
+    delta = None
+    if len(new) and store.has_vectors():
+        delta = build_index(reduce_dims(store.vectors()[new], search_dim(store.dim)), "Flat", "float32", ids=new)
+    tombstones = None
+    if base is not None and base.ntotal > len(live) - len(new):
+        tombstones = np.zeros(len(store), dtype=bool)
+        tombstones[live] = True
+    if base is None and delta is None:
+        return None
+    return IndexSegments(base, delta, tombstones)
+ 
+class ResidentIndex:
+    """
+    Process-wide holder for the index segments and the chunk store.
+    Loaded from disk once and served from memory. A store commit only
+    rebuilds the small delta segment; the base index is re-read only when a
+    compaction rewrote it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._base_stamp = None
+        self._base = None
+        self._header = {}
+        self._index = None
+        self._store = None
+        self._bitmaps: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lexical = LexicalIndex(LEXICAL_PATH)
+ 
+    @staticmethod
+    def _file_stamp(path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+ 
+    def get(self) -> Tuple[IndexSegments, ChunkStore]:
+        """Return (index segments, store), reloading only what changed on disk."""
+        if not os.path.exists(CHUNKS_DIR) and os.path.exists(META_PATH):
+            open_chunk_store()
+        base_stamp = (self._file_stamp(FAISS_INDEX_PATH), self._file_stamp(HEADER_PATH))
+        stamp = (base_stamp, store_stamp(CHUNKS_DIR))
+        with self._lock:
+            if stamp != self._stamp:
+                if stamp[1] is None:
+                    self._index, self._store = None, None
+                else:
+                    if base_stamp != self._base_stamp:
+                        self._header = load_header()
+                        self._base = None
+                        if os.path.exists(FAISS_INDEX_PATH):
+                            self._base = configure_search(faiss.read_index(FAISS_INDEX_PATH))
+                        self._base_stamp = base_stamp
+                    self._store = ChunkStore(CHUNKS_DIR)
+                    check_header(self._header, self._store)
+                    self._index = _segments(self._base, self._header, self._store)
+                    if self._lexical.indexed_rows() < len(self._store):
+                        self._lexical.sync(self._store)  # collections built before the lexical index
+                self._bitmaps = {}
+                self._stamp = stamp
+            return self._index, self._store
+ 
+    def bitmap(self, store: ChunkStore, attr: str, value) -> np.ndarray:
+        """Row bitmap of one filter value, cached until the collection changes."""
+        if store is not self._store:
+            return _attribute_bitmap(store, attr, value)
+        with self._lock:
+            key = (attr, str(value))
+            if key not in self._bitmaps:
+                self._bitmaps[key] = _attribute_bitmap(store, attr, value)
+            return self._bitmaps[key]
+ 
+    def lexical(self) -> LexicalIndex:
+        return self._lexical
+ 
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+            self._base_stamp = None
+ 
+_resident = ResidentIndex()
+ 
+def document_module(doc: Dict) -> str:
+    """Module of a document-table entry (detected from the name for older entries)."""
+    return doc.get("module") or detect_document_module(doc.get("name", ""))
+ 
+def _attribute_bitmap(store: ChunkStore, attr: str, value) -> np.ndarray:
+    mask = np.zeros(len(store), dtype=bool)
+    if attr == "source":
+        doc = store.find_document(str(value))
+        if doc:
+            mask[store.document_rows([doc])] = True
+    elif attr == "module":
+        mask[store.document_rows(d for d in store.docs.values() if document_module(d) == str(value).upper())] = True
+    elif attr == "type":
+        ctype = TYPE_ALIASES.get(value, value)
+        code = CHUNK_TYPES.index(ctype) if ctype in CHUNK_TYPES else OTHER_TYPE
+        mask = store.types() == code
+    elif attr == "page":
+        mask = store.pages() == int(value)
+    else:
+        raise ValueError(f"Unknown filter '{attr}'. Expected one of {FILTER_ATTRIBUTES}")
+    return mask
+ 
+def filter_mask(store: ChunkStore, filters: Dict) -> np.ndarray:
+    """
+    Row bitmap of live chunks matching `filters` ({attribute: value or list of
+    values}); values of one attribute are OR-ed, attributes are AND-ed.
+    """
+    mask = np.zeros(len(store), dtype=bool)
+    mask[store.live_rows()] = True
+    for attr, values in filters.items():
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple, set, range)):
+            values = [values]
+        attr_mask = np.zeros(len(store), dtype=bool)
+        for value in values:
+            attr_mask |= _resident.bitmap(store, attr, value)
+        mask &= attr_mask
+    return mask
+ 
+def get_resident_index() -> Tuple[IndexSegments, ChunkStore]:
+    """Shared in-memory (index segments, chunk store) used by every search path."""
+    return _resident.get()
+ 
+# --------------------------
+# Batched ingest session
+# --------------------------
+class IngestSession:
+    """
+    Holds the chunk store open for a whole batch of documents and commits it
+    once (manifest rename). The new chunks are searchable right after the
+    commit through the delta segment; the FAISS base index is merged by the
+    background compactor, never rewritten per upload.
+ 
+        with IngestSession() as session:
+            for path in paths:
+                session.add(chunks, embeddings, source_name, source_path)
+ 
+    Documents are identified by name: adding a name that is already indexed
+    replaces its chunks. A streamed document is staged part by part
+    (add_part, then finish_document or abort_document), so its chunks and
+    values need not be held in memory. Leaving the block normally commits;
+    an exception discards the batch.
+ 
+    A session holds the collection's writer lock from its first call until
+    it commits or fails, so sessions of other threads and processes (UI,
+    FastAPI, CLI) wait instead of writing over each other's rows.
+    """
+    def __init__(self):
+        self.store = None
+        self.added = 0
+        self.removed = 0
+        self.skipped = 0
+        self._dirty = False
+        self._seen = None
+        self._removed_rows: List[np.ndarray] = []
+        self._signals: Dict[str, List[Dict]] = {}  # source -> DBC messages to store (None: drop)
+        self._ecuc: Dict[str, str] = {}  # source -> token of its staged ECUC values to store (None: drop)
+        self._partials: Dict[str, Dict] = {}  # name -> {"module", "token"} of documents being staged
+        self._lock_file = None
+ 
+    def __enter__(self) -> "IngestSession":
+        return self
+ 
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._release()
+        return False
+ 
+    def _open(self):
+        if self.store is None:
+            _ensure_dir()
+            if fcntl is not None:
+                self._lock_file = open(WRITE_LOCK_PATH, "a")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)  # waits for the current writer
+            try:
+                self.store = open_chunk_store()  # opened under the lock: sees the last writer's commit
+                check_header(load_header(), self.store)
+            except Exception:
+                self._release()
+                raise
+ 
+    def _release(self):
+        """Drop the store and the writer lock; the next call reopens both."""
+        if self.store is not None:
+            self.store.close()
+        self.store = None
+        self._seen = None
+        self._partials = {}
+        if self._lock_file is not None:
+            self._lock_file.close()  # closing the file releases the flock
+            self._lock_file = None
+ 
+    def is_unchanged(self, source_name: str, content_hash: str) -> bool:
+        """True if this document is already indexed with identical content."""
+        self._open()
+        doc = self.store.find_document(source_name)
+        return bool(doc and content_hash and doc.get("sha256") == content_hash)
+ 
+    def _seen_hashes(self) -> Dict[bytes, int]:
+        """Text hash -> row id of every live chunk, loaded once per session."""
+        if self._seen is None:
+            self._seen = self.store.live_hashes()
+        return self._seen
+ 
+    def known_hashes(self) -> frozenset:
+        """Snapshot of the text hashes already in the collection: chunks with these need no embedding."""
+        self._open()
+        return frozenset(self._seen_hashes())
+ 
+    def delete_document(self, source_name: str) -> int:
+        """Remove a document's chunks from the index; returns the number of chunks removed."""
+        self._open()
+        self._signals[source_name] = None
+        self._ecuc[source_name] = None
+        self._dirty = True
+        return self._forget(self.store.drop_document(source_name))
+ 
+    def _forget(self, dead: np.ndarray) -> int:
+        """Tombstone rows no document references any more."""
+        if len(dead) == 0:
+            return 0
+        if self._seen is not None:
+            dead_set = set(dead.tolist())
+            self._seen = {h: r for h, r in self._seen.items() if r not in dead_set}
+        self._removed_rows.append(dead)
+        self.removed += len(dead)
+        return len(dead)
+ 
+    def add(self, chunks: List, embeddings: List[List[float]] = None, source_name: str = "",
+            source_path: str = "", content_hash: str = None, module: str = None,
+            dbc_messages: List[Dict] = None, ecuc_values: List[Tuple[str, str, str]] = None) -> int:
+        """
+        Add (or replace) one document's chunks in the in-memory batch.
+        `chunks` are texts or records from process_document_records
+        ({"text", "type", "page", "tokens", "start", "end"}), whose type/page become
+        searchable filters.
+        Chunks whose text is already in the collection (or repeated within the
+        document, or unchanged since the previous version of a re-upload) are
+        skipped. Only the new chunks are embedded: `embeddings` may be None, or
+        hold None for chunks the caller skipped embedding. `module` picks the
+        module the document is routed to (detected from name and text if None).
+        `dbc_messages` (load_dbc's "messages") fill the structured signal index,
+        `ecuc_values` (load_arxml's "ecuc_values") the ECUC value index.
+        """
+        if not chunks:
+            return 0
+        added = self.add_part(chunks, embeddings, source_name, source_path, module, ecuc_values)
+        self.finish_document(source_name, content_hash, dbc_messages)
+        return added
+ 
+    def add_part(self, chunks: List, embeddings: List[List[float]] = None, source_name: str = "",
+                 source_path: str = "", module: str = None, ecuc_values: List[Tuple[str, str, str]] = None) -> int:
+        """
+        Stage one part of a document: its chunks (deduped and embedded as in
+        add) and ECUC values go to the chunk store's data files and the ECUC
+        index's staging table right away, but only become the document
+        (replacing its previous version) on finish_document. Returns the
+        number of new chunks.
+        """
+        chunks = [c if isinstance(c, dict) else {"text": c} for c in chunks]
+        self._open()
+        partial = source_name + PARTIAL_SUFFIX
+        state = self._partials.get(source_name)
+        if state is None:
+            module = module or detect_document_module(source_name, " ".join(c["text"] for c in chunks[:3]))
+            state = self._partials[source_name] = {"module": module, "token": None}
+            end = self.store.next_row()
+            self.store.set_document(partial, source_path, range(end, end), None, (), module)
+        module = state["module"]
+        if ecuc_values:
+            if state["token"] is None:
+                state["token"] = uuid.uuid4().hex
+            EcucIndex(ECUC_PATH).stage(state["token"], source_name, ecuc_values)
  
-    d = len(embeddings[0])
-    index, meta = create_or_load_index(d)
+        # Collection-wide content-hash dedupe, against the previous version too:
+        # a re-upload keeps its unchanged chunks' rows and vectors
+        seen = self._seen_hashes()
+        keep, hashes, shared = [], set(), set()
+        for i, chunk in enumerate(chunks):
+            h = text_hash(chunk["text"])
+            if h in seen:
+                shared.add(seen[h])  # keep the other document's copy alive while this one exists
+                continue
+            if h in hashes:
+                continue
+            keep.append(i)
+            hashes.add(h)
+        self.skipped += len(chunks) - len(keep)
+        new_chunks = [chunks[i] for i in keep]
+        if not new_chunks:
+            self.store.extend_document(partial, range(0), shared)
+            return 0
  
-    # Normalize embeddings for cosine similarity
-    xb = np.array(embeddings, dtype=np.float32)
-    faiss.normalize_L2(xb)
-    index.add(xb)
+        embeddings = [None] * len(new_chunks) if embeddings is None else [embeddings[i] for i in keep]
+        missing = [j for j, e in enumerate(embeddings) if e is None]
+        if missing:
+            for j, e in zip(missing, embed_texts([new_chunks[j]["text"] for j in missing])):
+                embeddings[j] = e
  
-    # Update metadata
-    for text in chunks:
-        meta.append({
+        # Normalize embeddings for cosine similarity
+        xb = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(xb)
+ 
+        # Stage chunk rows + vectors (row id == FAISS id)
+        rows = self.store.append([{
             "source": source_name,
             "path": source_path,
-            "text": text
-        })
+            "module": module,
+            "type": record_type(c),
+            "page": c.get("page"),
+            "tokens": c.get("tokens"),
+            "start": c.get("start"),
+            "end": c.get("end"),
+            "text": c["text"]
+        } for c in new_chunks], xb)
+        self.store.flush()  # rows go to the data files now; commit() publishes them
+        self.store.extend_document(partial, rows, shared)
+        self._seen.update((text_hash(c["text"]), r) for c, r in zip(new_chunks, rows))
+ 
+        self.added += len(new_chunks)
+        return len(new_chunks)
+ 
+    def finish_document(self, source_name: str, content_hash: str = None, dbc_messages: List[Dict] = None):
+        """Make the staged parts the document `source_name`, replacing its previous version."""
+        state = self._partials.pop(source_name)
+        self._signals[source_name] = dbc_messages or None  # replaces (or drops) the previous version's rows
+        self._ecuc[source_name] = state["token"]
+        self._dirty = True
+        self._forget(self.store.rename_document(source_name + PARTIAL_SUFFIX, source_name, content_hash))
+ 
+    def abort_document(self, source_name: str):
+        """Drop the staged parts of `source_name`; its previous version (if any) stays."""
+        state = self._partials.pop(source_name, None)
+        if state is None:
+            return
+        if state["token"] is not None:
+            EcucIndex(ECUC_PATH).unstage(state["token"])
+        self._forget(self.store.drop_document(source_name + PARTIAL_SUFFIX))
+ 
+    replace_document = add
+ 
+    def commit(self):
+        """Write the batch to disk once (no-op if nothing changed) and release the writer lock."""
+        try:
+            for name in list(self._partials):  # documents whose last part never arrived
+                self.abort_document(name)
+            if self.added or self.removed or self._dirty:
+                removed = np.concatenate(self._removed_rows) if self._removed_rows else None
+                commit_changes(self.store, removed)
+                if self._signals:
+                    SignalIndex(SIGNALS_PATH).update({s: m for s, m in self._signals.items() if m is not None},
+                                                     [s for s, m in self._signals.items() if m is None])
+                if self._ecuc:
+                    EcucIndex(ECUC_PATH).update({}, [s for s, t in self._ecuc.items() if t is None],
+                                                {s: t for s, t in self._ecuc.items() if t is not None})
+        finally:
+            self._removed_rows = []
+            self._signals = {}
+            self._ecuc = {}
+            self.added = 0
+            self.removed = 0
+            self._dirty = False
+            self._release()
  
-    save_index(index, meta)
-    return len(chunks)
+# --------------------------
+# Add / replace / delete documents
+# --------------------------
+def add_text_chunks(chunks: List[str], embeddings: List[List[float]], source_name: str, source_path: str) -> int:
+    """Add text chunks + embeddings to FAISS index (single-document session)."""
+    with IngestSession() as session:
+        return session.add(chunks, embeddings, source_name, source_path)
+ 
+def replace_document(chunks: List[str], embeddings: List[List[float]], source_name: str, source_path: str,
+                     content_hash: str = None) -> int:
+    """Replace all chunks of a document (by name) with a new version."""
+    with IngestSession() as session:
+        return session.replace_document(chunks, embeddings, source_name, source_path, content_hash)
+ 
+def delete_document(source_name: str) -> int:
+    """Delete all chunks of a document (by name) from the index."""
+    with IngestSession() as session:
+        return session.delete_document(source_name)
+ 
+def list_documents() -> List[Dict]:
+    """Indexed documents with their chunk counts (including chunks deduped against other documents)."""
+    store = open_chunk_store()
+    return [{"name": d["name"], "path": d["path"], "chunks": document_size(d),
+             "sha256": d.get("sha256"),
+             "module": document_module(d)} for d in store.docs.values()]
  
 # --------------------------
 # Semantic search
 # --------------------------
-def msearch(query: str, top_k: int = 5) -> List[Dict]:
-    """Search FAISS index for top_k relevant chunks."""
+Hits = List[Tuple[np.ndarray, np.ndarray]]  # one (scores, ids) pair per query
+ 
+def _top(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, kind="stable")[:k]
+    return scores[order], ids[order]
+ 
+def _search_segments(segs: IndexSegments, store: ChunkStore, Q: np.ndarray, top_k: int,
+                     allowed: np.ndarray = None) -> Hits:
+    """Search the base index (minus tombstoned rows) and the delta segment, merging hits per query."""
+    if allowed is not None and np.count_nonzero(allowed) <= FILTER_EXACT_MAX:
+        return search_index_batch(segs.base if segs.base is not None else segs.delta, store, Q, top_k, allowed)  # exact, no index pass
+    found = []
+    if segs.base is not None:
+        found.append(search_index_batch(segs.base, store, Q, top_k,
+                                        allowed if allowed is not None else segs.tombstones))
+    if segs.delta is not None:
+        found.append(search_index_batch(segs.delta, store, Q, top_k, allowed))
+    if len(found) == 1:
+        return found[0]
+    return [_merge_hits([hits[qi] for hits in found], top_k) for qi in range(len(Q))]
+ 
+def search_index_batch(index: faiss.Index, store: ChunkStore, Q: np.ndarray, top_k: int,
+                       allowed: np.ndarray = None) -> Hits:
+    """
+    Search normalized full-size (nq, d) queries in one index pass. Compressed
+    (fp16/int8/pq) or reduced-dimension indexes fetch RERANK_FACTOR * top_k
+    candidates and re-score them with the full vectors from the chunk store.
+    `allowed` (row bitmap from filter_mask) restricts the search itself through
+    a FAISS ID selector; small filtered sets are scored exactly instead.
+    """
+    if Q.shape[1] != store.dim and store.dim:
+        raise ValueError(f"Query has {Q.shape[1]} dims, collection stores {store.dim}-d vectors")
+    if isinstance(index, IndexSegments):
+        return _search_segments(index, store, Q, top_k, allowed)
+    params = None
+    if allowed is not None:
+        rows = np.flatnonzero(allowed)
+        if len(rows) <= FILTER_EXACT_MAX and store.has_vectors():
+            S = Q @ store.vectors()[rows].T
+            return [_top(scores, rows, top_k) for scores in S]
+        bitmap = np.packbits(allowed, bitorder="little")  # must outlive the search below
+        params = search_params(index, faiss.IDSelectorBitmap(bitmap))
+ 
+    factor = config.RERANK_FACTOR
+    approximate = index_codec(index) != "float32" or index.d < Q.shape[1]
+    if not (approximate and factor > 1 and store.has_vectors()):
+        D, I = index.search(reduce_dims(Q, index.d), top_k, params=params)
+        return [(d[i >= 0], i[i >= 0]) for d, i in zip(D, I)]
+ 
+    _, I = index.search(reduce_dims(Q, index.d), top_k * factor, params=params)
+    vectors = store.vectors()
+    hits = []
+    for q, row in zip(Q, I):
+        ids = row[(row >= 0) & (row < len(store))]
+        hits.append(_top(vectors[ids] @ q, ids, top_k))
+    return hits
+ 
+def search_index(index: faiss.Index, store: ChunkStore, q: np.ndarray, top_k: int,
+                 allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Search one normalized (1, d) query (see search_index_batch)."""
+    return search_index_batch(index, store, q, top_k, allowed)[0]
+ 
+def _merge_hits(hits: Hits, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    D = np.concatenate([d for d, _ in hits])
+    I = np.concatenate([i for _, i in hits])
+    D, I = _top(D, I, len(I))
+    _, first = np.unique(I, return_index=True)  # a chunk shared by two modules counts once
+    first = np.sort(first)
+    return D[first][:top_k], I[first][:top_k]
+ 
+def search_routed_batch(index: faiss.Index, store: ChunkStore, Q: np.ndarray, top_k: int,
+                        modules: List[str] = None, allowed: np.ndarray = None) -> Hits:
+    """
+    Search only the chunks of the given modules: their (cached) module row
+    bitmaps restrict the main index through an ID selector, so routing needs
+    no per-module copy of the vectors. Falls back to (or tops up from) the
+    unrestricted search when the modules hold no or fewer than top_k chunks.
+    `allowed` is an optional filter bitmap.
+    """
+    routed = None
+    for module in modules or []:
+        bitmap = _resident.bitmap(store, "module", module)
+        routed = bitmap.copy() if routed is None else routed | bitmap
+    if routed is not None and allowed is not None:
+        routed &= allowed
+    if routed is None or not routed.any():
+        return search_index_batch(index, store, Q, top_k, allowed)
+ 
+    hits = search_index_batch(index, store, Q, top_k, routed)
+ 
+    short = [qi for qi, (_, ids) in enumerate(hits) if len(ids) < top_k]
+    if short:
+        extra = search_index_batch(index, store, Q[short], top_k + max(len(hits[qi][1]) for qi in short), allowed)
+        for qi, (gD, gI) in zip(short, extra):
+            D, I = hits[qi]
+            keep = ~np.isin(gI, I)
+            hits[qi] = (np.concatenate([D, gD[keep]])[:top_k], np.concatenate([I, gI[keep]])[:top_k])
+    return hits
+ 
+def search_routed(index: faiss.Index, store: ChunkStore, q: np.ndarray, top_k: int,
+                  modules: List[str] = None, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Routed search of one normalized (1, d) query (see search_routed_batch)."""
+    return search_routed_batch(index, store, q, top_k, modules, allowed)[0]
+ 
+def hybrid_search_batch(index: faiss.Index, store: ChunkStore, Q: np.ndarray, queries: List[str], top_k: int,
+                        routes: List[List[str]] = None, allowed: np.ndarray = None) -> Hits:
+    """
+    Dense (routed) search fused with BM25 over the lexical index by reciprocal
+    rank fusion, so exact identifiers (CanControllerFdBaudrateConfig) rank high.
+    Queries routed to the same modules share one index pass. Ids are in fused
+    order; scores are the cosine similarity of each chunk.
+    """
+    routes = routes or [[] for _ in queries]
+    n = max(top_k, config.HYBRID_CANDIDATES) if config.HYBRID_SEARCH else top_k
+    dense: Hits = [None] * len(queries)
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for qi, modules in enumerate(routes):
+        groups.setdefault(tuple(modules or ()), []).append(qi)
+    for modules, members in groups.items():
+        for qi, hit in zip(members, search_routed_batch(index, store, Q[members], n, list(modules), allowed)):
+            dense[qi] = hit
+    if not config.HYBRID_SEARCH:
+        return dense
+ 
+    if allowed is None:
+        allowed = np.zeros(len(store), dtype=bool)
+        allowed[store.live_rows()] = True
+    hits = []
+    for qi, query in enumerate(queries):
+        dense_scores, dense_ids = dense[qi]
+        _, lexical_ids = _resident.lexical().search(query, n, allowed)
+        if len(lexical_ids) == 0:
+            hits.append((dense_scores[:top_k], dense_ids[:top_k]))
+            continue
+        fused = reciprocal_rank_fusion([dense_ids, lexical_ids], config.RRF_K)
+        ids = np.array(sorted(fused, key=fused.get, reverse=True)[:top_k], dtype=np.int64)
+        if store.has_vectors():
+            scores = store.vectors()[ids] @ Q[qi]
+        else:
+            scores = np.array([fused[i] for i in ids], dtype=np.float32)
+        hits.append((scores, ids))
+    return hits
+ 
+def hybrid_search(index: faiss.Index, store: ChunkStore, q: np.ndarray, query: str, top_k: int,
+                  modules: List[str] = None, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Hybrid search of one normalized (1, d) query (see hybrid_search_batch)."""
+    return hybrid_search_batch(index, store, q, [query], top_k, [modules or []], allowed)[0]
+ 
+def _results(store: ChunkStore, D: np.ndarray, I: np.ndarray) -> List[Dict]:
+    results = []
+    for score, i in zip(D, I):
+        if 0 <= i < len(store):
+            r = store.get(int(i))  # decodes only this row
+            doc = store.row_document(int(i))
+            if doc is not None and doc["name"] != r.get("source"):
+                # Deduped chunk kept alive by another document after its own was deleted
+                r.update(source=doc["name"], path=doc["path"], module=document_module(doc))
+            r["id"] = int(i)
+            r["score"] = float(score)
+            results.append(r)
+    return results
+ 
+def mmr_rerank(results: List[Dict], lambda_: float = None, top_n: int = None) -> List[Dict]:
+    """
+    Maximal-marginal-relevance order of msearch results: each pick maximizes
+    lambda * score - (1 - lambda) * (max similarity to the chunks already
+    picked), computed on the stored vectors of the candidates. Near-duplicate
+    chunks (overlap, repeated spec text) sink to the end.
+    """
+    lambda_ = config.MMR_LAMBDA if lambda_ is None else lambda_
+    top_n = len(results) if top_n is None else min(top_n, len(results))
+    _, store = get_resident_index()
+    if len(results) < 3 or store is None or not store.has_vectors() \
+            or any(r.get("id") is None or r["id"] >= len(store) for r in results):
+        return results[:top_n]
+ 
+    V = store.vectors()[[r["id"] for r in results]]
+    pairwise = V @ V.T
+    relevance = np.array([r["score"] for r in results], dtype=np.float32)
+    redundancy = np.zeros(len(results), dtype=np.float32)
+    picked = np.zeros(len(results), dtype=bool)
+    order = []
+    for _ in range(top_n):
+        mmr = lambda_ * relevance - (1 - lambda_) * redundancy
+        mmr[picked] = -np.inf
+        j = int(np.argmax(mmr))
+        order.append(j)
+        picked[j] = True
+        redundancy = np.maximum(redundancy, pairwise[j])
+    return [results[j] for j in order]
+ 
+def apply_cutoffs(results: List[Dict], query: str, min_score: float = None, token_budget: int = None,
+                  mmr: bool = None) -> List[Dict]:
+    """
+    Trim ranked results to what is relevant:
+    - similarity threshold (min_score, default SIMILARITY_THRESHOLD)
+    - score-gap cutoff: stop at the first drop of SCORE_GAP between consecutive
+      scores once MIN_RESULTS chunks are kept
+    - optional MMR re-ranking (default MMR_RERANK), so the budget covers distinct content
+    - token budget over the chunk texts (default CONTEXT_TOKEN_BUDGET)
+    Chunks quoting an exact identifier from the query always pass the score cutoffs.
+    """
+    min_score = config.SIMILARITY_THRESHOLD if min_score is None else min_score
+    token_budget = config.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    mmr = config.MMR_RERANK if mmr is None else mmr
+    identifiers = query_identifiers(query)
+    exact = [any(ident in r.get("text", "") for ident in identifiers) for r in results]
+ 
+    scores = sorted((r["score"] for r in results if r["score"] >= min_score), reverse=True)
+    floor = min_score
+    if config.SCORE_GAP > 0:
+        for i in range(max(1, config.MIN_RESULTS), len(scores)):
+            if scores[i - 1] - scores[i] >= config.SCORE_GAP:
+                floor = scores[i - 1]
+                break
+ 
+    passed = [r for r, is_exact in zip(results, exact) if r["score"] >= floor or is_exact]
+    if mmr:
+        passed = mmr_rerank(passed)
+ 
+    kept, used = [], 0
+    for r in passed:
+        if token_budget:
+            tokens = count_tokens(r.get("text", ""))
+            if kept and used + tokens > token_budget:
+                break
+            used += tokens
+        kept.append(r)
+    return kept
+ 
+def msearch(query: str, top_k: int = 5, modules: List[str] = None, filters: Dict = None,
+            min_score: float = None, token_budget: int = None, mmr: bool = None) -> List[Dict]:
+    """
+    The retrieval engine: up to top_k relevant chunks for a question.
+    Questions naming a module (CanIf, PduR, Rte_...) are routed to that
+    module's chunks; pass `modules` to override the routing. `filters`
+    restricts results by metadata, e.g. {"type": "figure"},
+    {"source": "AUTOSAR_SWS_COM.pdf", "page": [12, 13]}. Results are cut by
+    similarity threshold, score gap and token budget, optionally after MMR
+    diversification (see apply_cutoffs; min_score=0 and token_budget=0 turn
+    those off).
+    """
     try:
         query_vector = embed_query(query)
     except Exception as e:
         print(f"Failed to embed query: {e}")
         return []
  
-    d = len(query_vector)
-    index, meta = create_or_load_index(d)
+    index, store = get_resident_index()
  
-    if len(meta) == 0:
+    if index is None or len(store) == 0:
         return []
  
     # Normalize query
     q = np.array(query_vector, dtype=np.float32).reshape(1, -1)
     faiss.normalize_L2(q)
  
-    # Search
-    D, I = index.search(q, top_k)
-    results = []
-    for score, i in zip(D[0], I[0]):
-        if 0 <= i < len(meta):
-            r = meta[i].copy()
-            r["score"] = float(score)
-            results.append(r)
+    # Search (restricted to the module's chunks when the question names one)
+    if modules is None:
+        modules = route_query(query) if config.MODULE_ROUTING else []
+    allowed = filter_mask(store, filters) if filters else None
+    D, I = hybrid_search(index, store, q, query, top_k, modules, allowed)
+    return apply_cutoffs(_results(store, D, I), query, min_score, token_budget, mmr)
+ 
+def msearch_batch(queries: List[str], top_k: int = 5, filters: Dict = None,
+                  min_score: float = None, token_budget: int = None, mmr: bool = None) -> List[List[Dict]]:
+    """
+    msearch for many questions at once: one embeddings request for all of
+    them and one index pass per routed module group. Returns one result list
+    per query (empty for blank queries).
+    """
+    results: List[List[Dict]] = [[] for _ in queries]
+    todo = [qi for qi, query in enumerate(queries) if query and query.strip()]
+    if not todo:
+        return results
+    try:
+        query_vectors = embed_queries([queries[qi] for qi in todo])
+    except Exception as e:
+        print(f"Failed to embed queries: {e}")
+        return results
+ 
+    index, store = get_resident_index()
+    if index is None or len(store) == 0:
+        return results
+ 
+    Q = np.array(query_vectors, dtype=np.float32)
+    faiss.normalize_L2(Q)
+    texts = [queries[qi] for qi in todo]
+    routes = [route_query(t) if config.MODULE_ROUTING else [] for t in texts]
+    allowed = filter_mask(store, filters) if filters else None
+    for qi, (D, I) in zip(todo, hybrid_search_batch(index, store, Q, texts, top_k, routes, allowed)):
+        results[qi] = apply_cutoffs(_results(store, D, I), queries[qi], min_score, token_budget, mmr)
     return results
  
+# --------------------------
+# Structured lookups (no embedding / LLM)
+# --------------------------
+def structured_answer(query: str) -> str:
+    """
+    Exact answer to a question about an ingested DBC signal or message or
+    a configured ECUC parameter value, or None when it has no structured
+    match and should go through RAG.
+    """
+    if not config.STRUCTURED_LOOKUP or not query:
+        return None
+    answer = None
+    if os.path.exists(SIGNALS_PATH):
+        answer = answer_signal_query(SignalIndex(SIGNALS_PATH), query)
+    if answer is None and os.path.exists(ECUC_PATH):
+        answer = answer_ecuc_query(EcucIndex(ECUC_PATH), query)
+    return answer
+ 
+def structured_context(query: str) -> List[Dict]:
+    """Configured ECUC values of the parameters / containers the question names, as extra LLM context."""
+    if not config.STRUCTURED_LOOKUP or not query or not os.path.exists(ECUC_PATH):
+        return []
+    return ecuc_context(EcucIndex(ECUC_PATH), query)
+ 
 # --------------------------
 # Load entire FAISS index
 # --------------------------
-def load_all() -> Tuple[faiss.IndexFlatIP, List[Dict]]:
-    """Return index and metadata if exists, else (None, [])."""
-    if not os.path.exists(FAISS_INDEX_PATH) or not os.path.exists(META_PATH):
+def load_all() -> Tuple[faiss.Index, ChunkStore]:
+    """Return the resident index and chunk store if they exist, else (None, [])."""
+    index, store = get_resident_index()
+    if index is None:
         return None, []
-    index = faiss.read_index(FAISS_INDEX_PATH)
-    with open(META_PATH, "rb") as f:
-        meta = pickle.load(f)
-    return index, meta
+    return index, store
  
 # --------------------------
 # Ingest documents
 # --------------------------
 def ingest_documents(paths: List[str]) -> int:
-    """Load documents (PDF, DOCX, MD, etc.), chunk, embed, and add to FAISS."""
-    total_chunks = 0
-    for path in paths:
-        try:
-            doc = load_document(path)
-            text = doc.get("content", "")
-            chunks = chunk_text(text)
-            embeddings = embed_texts(chunks)
-            added = add_text_chunks(chunks, embeddings, source_name=doc.get("name", ""), source_path=path)
-            total_chunks += added
-        except Exception as e:
-            print(f"Failed to ingest {path}: {e}")
-    return total_chunks
+    """
+    Load documents (PDF, DOCX, MD, etc.), chunk, embed, and add to FAISS in one
+    batch, parsing files in parallel (see Ingest_Pipeline).
+    """
+    from Ingest_Pipeline import ingest_paths  # imports this module
+    return ingest_paths([(path, os.path.basename(path)) for path in paths])["chunks"]
  
 # --------------------------
 # Ingest ARXML files
 # --------------------------
 def ingest_arxml_files(paths: List[str]) -> int:
-    """Specifically ingest ARXML files into FAISS."""
-    total_chunks = 0
-    for path in paths:
-        ext = os.path.splitext(path)[1].lower()
-        if ext != ".arxml":
-            continue
-        try:
-            doc = load_arxml(path)
-            chunks = chunk_text(" ".join([c["text"] for c in doc["chunks"]]))
-            embeddings = embed_texts(chunks)
-            added = add_text_chunks(chunks, embeddings, source_name=doc.get("name", ""), source_path=path)
-            total_chunks += added
-        except Exception as e:
-            print(f"Failed to ingest ARXML {path}: {e}")
-    return total_chunks
- 
- 
\ No newline at end of file
+    """
+    Specifically ingest ARXML files into FAISS in one batch. Each file is
+    streamed through the ingest pipeline part by part (see Ingest_Pipeline),
+    so a large ARXML is never held as one record list.
+    """
+    from Ingest_Pipeline import ingest_paths  # imports this module
+    files = [(path, os.path.basename(path)) for path in paths if os.path.splitext(path)[1].lower() == ".arxml"]
+    return ingest_paths(files)["chunks"]
@@ -1,8 +1,10 @@
 # Document_Handler.py
 import os
-from typing import List, Dict
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
 import chardet
-from langchain_community.document_loaders import PyPDFLoader
 import fitz  # PyMuPDF
 from PIL import Image
 import pytesseract
@@ -10,6 +12,10 @@ import io
 from docx import Document
 import cantools
 import xml.etree.ElementTree as ET
+import config
+from OCR_Cache import OCRCache
+ 
+_ocr_cache = OCRCache(os.path.join(config.DB_DIR, "ocr_cache.sqlite"))
  
 # --------------------------
 # Text/Document loaders
@@ -30,45 +36,103 @@ def load_docx(path: str) -> str:
     return "\n".join(paragraphs)
  
 def load_pdf_text_only(path: str) -> str:
-    loader = PyPDFLoader(path)
-    docs = loader.load()
-    return "\n".join([doc.page_content for doc in docs])
+    with fitz.open(path) as doc:
+        return "\n".join(page.get_text("text") for page in doc)
+ 
+def _ocr_bytes(image_bytes: bytes) -> str:
+    """OCR one image (runs in an OCR worker process); None if the image cannot be read."""
+    try:
+        return pytesseract.image_to_string(Image.open(io.BytesIO(image_bytes))).strip()
+    except Exception as e:
+        print(f"Failed to OCR image: {e}")
+        return None
+ 
+def _ocr_images(doc, images: List[Tuple[int, int]], source: str) -> List[Dict]:
+    """
+    OCR text of (page number, image xref) candidates of an open PDF as
+    figure_text chunks. Each distinct image is read once (by xref, then by
+    content hash; a logo repeated on every page yields one chunk, at its
+    first page), known images come from the OCR cache and the rest are
+    OCR'd in a process pool.
+    """
+    first_page: Dict[int, int] = {}
+    for page_num, xref in images:
+        first_page.setdefault(xref, page_num)
+ 
+    candidates: Dict[bytes, Tuple[int, bytes]] = {}  # content hash -> (first page, image bytes)
+    for xref, page_num in first_page.items():
+        base_img = doc.extract_image(xref)
+        if not base_img:
+            continue
+        image_bytes = base_img["image"]
+        candidates.setdefault(hashlib.sha256(image_bytes).digest(), (page_num, image_bytes))
+ 
+    texts = _ocr_cache.get_many(list(candidates))
+    missing = [h for h in candidates if h not in texts]
+    if missing:
+        # Inside an ingest worker process the cores are already busy with other files
+        workers = 1 if multiprocessing.parent_process() else min(config.OCR_WORKERS or os.cpu_count() or 1, len(missing))
+        blobs = [candidates[h][1] for h in missing]
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(_ocr_bytes, blobs))
+        else:
+            results = [_ocr_bytes(b) for b in blobs]
+        new = {h: t for h, t in zip(missing, results) if t is not None}
+        _ocr_cache.put_many(new)
+        texts.update(new)
  
-def extract_diagram_text_from_pdf(path: str) -> List[Dict]:
     extracted_chunks = []
+    for h, (page_num, _) in sorted(candidates.items(), key=lambda kv: kv[1][0]):
+        if texts.get(h):
+            extracted_chunks.append({
+                "text": f"[FIGURE] {texts[h]}",
+                "source": source,
+                "page": page_num,
+                "type": "figure_text"
+            })
+    return extracted_chunks
+ 
+def _page_images(page, page_num: int) -> List[Tuple[int, int]]:
+    """(page number, xref) of the page's images of at least OCR_MIN_SIZE pixels, sized without extracting them."""
+    return [(page_num, img[0]) for img in page.get_images(full=True)
+            if min(img[2], img[3]) >= config.OCR_MIN_SIZE]  # (xref, smask, width, height, ...)
+ 
+def extract_diagram_text_from_pdf(path: str) -> List[Dict]:
     try:
-        doc = fitz.open(path)
-        for page_num, page in enumerate(doc, start=1):
-            for img in page.get_images(full=True):
-                xref = img[0]
-                base_img = doc.extract_image(xref)
-                image_bytes = base_img["image"]
-                image = Image.open(io.BytesIO(image_bytes))
-                text = pytesseract.image_to_string(image)
-                if text.strip():
-                    extracted_chunks.append({
-                        "text": f"[FIGURE] {text.strip()}",
-                        "source": os.path.basename(path),
-                        "page": page_num,
-                        "type": "figure_text"
-                    })
+        with fitz.open(path) as doc:
+            images = [c for page_num, page in enumerate(doc, start=1) for c in _page_images(page, page_num)]
+            return _ocr_images(doc, images, os.path.basename(path))
     except Exception as e:
         print(f"Error extracting diagram text from PDF {path}: {e}")
-    return extracted_chunks
+        return []
  
 def load_pdf(path: str) -> Dict:
-    text_content = load_pdf_text_only(path)
-    figure_chunks = extract_diagram_text_from_pdf(path)
-    chunks = [{
-        "text": text_content,
-        "source": os.path.basename(path),
-        "page": None,
-        "type": "paragraph"
-    }]
-    chunks.extend(figure_chunks)
+    """
+    One PyMuPDF pass over the PDF: a paragraph chunk per page (with its page
+    number) and the page's images as OCR candidates for figure_text chunks.
+    """
+    source = os.path.basename(path)
+    chunks = []
+    with fitz.open(path) as doc:
+        images = []
+        for page_num, page in enumerate(doc, start=1):
+            text = page.get_text("text")
+            if text.strip():
+                chunks.append({
+                    "text": text,
+                    "source": source,
+                    "page": page_num,
+                    "type": "paragraph"
+                })
+            images.extend(_page_images(page, page_num))
+        try:
+            chunks.extend(_ocr_images(doc, images, source))
+        except Exception as e:
+            print(f"Error extracting diagram text from PDF {path}: {e}")
     return {
         "path": path,
-        "name": os.path.basename(path),
+        "name": source,
         "chunks": chunks
     }
  
@@ -81,13 +145,30 @@ def load_dbc(path: str) -> Dict:
     except Exception as e:
         raise ValueError(f"Failed to load DBC file {path}: {e}")
  
-    chunks = []
+    chunks, messages = [], []
     for msg in db.messages:
         msg_text = f"Message: {msg.name} (ID: {hex(msg.frame_id)})\nSignals:"
+        signals = []
         for sig in msg.signals:
+            byte_order = "Motorola" if sig.byte_order in (1, "big_endian") else "Intel"  # cantools: "big_endian"
+            # Plain (picklable) row for the structured signal index (Signal_Index)
+            signals.append({
+                "name": sig.name,
+                "start": sig.start,
+                "length": sig.length,
+                "byte_order": byte_order,
+                "is_signed": bool(sig.is_signed),
+                "scale": sig.scale,
+                "offset": sig.offset,
+                "minimum": sig.minimum,
+                "maximum": sig.maximum,
+                "unit": sig.unit,
+                "choices": ", ".join(f"{k}={v}" for k, v in (getattr(sig, "choices", None) or {}).items()) or None,
+                "comment": getattr(sig, "comment", None)
+            })
             sig_text = (
                 f" - {sig.name}: start_bit={sig.start}, length={sig.length}, "
-                f"byte_order={'Motorola' if sig.byte_order == 1 else 'Intel'}, "
+                f"byte_order={byte_order}, "
                 f"value_type={'Signed' if sig.is_signed else 'Unsigned'}, "
                 f"scale={sig.scale}, offset={sig.offset}, "
                 f"min={sig.minimum}, max={sig.maximum}, "
@@ -96,6 +177,14 @@ def load_dbc(path: str) -> Dict:
                 f"description={getattr(sig, 'comment', None)}"
             )
             msg_text += "\n" + sig_text
+        messages.append({
+            "name": msg.name,
+            "frame_id": msg.frame_id,
+            "length": msg.length,
+            "senders": ", ".join(getattr(msg, "senders", None) or []) or None,
+            "comment": getattr(msg, "comment", None),
+            "signals": signals
+        })
  
         chunks.append({
             "text": msg_text,
@@ -107,86 +196,164 @@ def load_dbc(path: str) -> Dict:
     return {
         "path": path,
         "name": os.path.basename(path),
-        "chunks": chunks
+        "chunks": chunks,
+        "messages": messages
     }
  
 # --------------------------
-# CDD loader
+# Streaming XML (CDD / ARXML)
 # --------------------------
-def load_cdd(path: str) -> Dict:
+def iter_xml_elements(path: str, kind: str = "XML") -> Iterator[Tuple[str, ET.Element]]:
     """
-    Load any CDD XML file and recursively extract all elements.
-    Each element becomes a chunk with path, attributes, and text.
+    Stream (element path, element) pairs of an XML file with iterparse, each
+    at its end tag (children before parents). Elements are cleared and
+    detached once consumed and the path is kept on a stack, so memory stays
+    bounded by the nesting depth, not the file size.
     """
-    import xml.etree.ElementTree as ET
- 
+    stack: List[Tuple[ET.Element, str]] = []
     try:
-        tree = ET.parse(path)
-        root = tree.getroot()
-    except Exception as e:
-        raise ValueError(f"Failed to load CDD file {path}: {e}")
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                tag = elem.tag.split("}")[-1]  # remove namespace
+                stack.append((elem, f"{stack[-1][1]}/{tag}" if stack else tag))
+                continue
+            _, full_path = stack.pop()
+            yield full_path, elem
+            elem.clear()
+            if stack:
+                stack[-1][0].remove(elem)
+    except ET.ParseError as e:
+        raise ValueError(f"Failed to load {kind} file {path}: {e}")
  
-    chunks = []
+# Logical records: every element's content is gathered into the nearest
+# enclosing record element and emitted as one chunk when that element ends.
+# ARXML records are identifiables (elements with a SHORT-NAME: packages, ECUC
+# containers, signals, ...), with ECUC parameter values rendered as
+# "<definition> = <value>"; CDD records are the diagnostic objects below,
+# named by their QUAL, with the data objects and services inside a DID or
+# service kept in its record.
+XML_NS = "{http://www.w3.org/XML/1998/namespace}"  # xml:lang etc.
+CDD_RECORD_TAGS = {"ECU", "VAR", "DIAGINST", "SERVICE", "PROTOCOLSERVICE", "DID", "DTC", "DATAOBJ", "STRUCTDT",
+                   "ENUMDT", "DCLTMPL", "DCLSRVTMPL", "JOB", "NEGRESCODE"}
+CDD_ENCLOSING_TAGS = {"DID", "SERVICE", "PROTOCOLSERVICE"}
+ 
+def _ecuc_value(fields: Dict[str, str]) -> str:
+    definition = fields["DEFINITION-REF"].rsplit("/", 1)[-1]
+    return f"{definition} = {fields.get('VALUE', fields.get('VALUE-REF', ''))}"
+ 
+def iter_xml_records(path: str, kind: str, record_tags=None, enclosing_tags=(),
+                     ecuc_values: List[Tuple[str, str, str]] = None) -> Iterator[Tuple[str, str, List[str]]]:
+    """
+    Stream (record tag, record name path, content lines) for every record of
+    an XML file: elements with a SHORT-NAME child, or with a tag in
+    `record_tags` (named by their QUAL child, else their name or id) that
+    are not inside an element with a tag in `enclosing_tags`. Nested records
+    are emitted on their own (inner ones first); content outside any record
+    is emitted under the root element.
+    ECUC values are also appended to `ecuc_values` (if given) as
+    (container SHORT-NAME path, definition ref, value) as they are read.
+    """
+    # Per depth: {"items": [(relative path, text)], "fields": {leaf tag: text}, "name": ...};
+    # path "" = a line rendered already (ECUC value)
+    frames: List[Dict] = []
  
-    def extract_element(elem, parent_path=""):
-        tag = elem.tag.split("}")[-1]  # remove namespace
-        full_path = f"{parent_path}/{tag}" if parent_path else tag
+    def frame(depth: int) -> Dict:
+        while len(frames) <= depth:
+            frames.append({"items": [], "fields": {}, "name": None})
+        return frames[depth]
  
-        # Combine text and attributes
+    def is_record(tag: str, ancestors: List[str]) -> bool:
+        return bool(record_tags) and tag in record_tags and not any(a in enclosing_tags for a in ancestors)
+ 
+    for full_path, elem in iter_xml_elements(path, kind):
+        *ancestors, tag = full_path.split("/")
+        depth = len(ancestors)
+        own = frame(depth)  # filled by the children, which ended before this element
+        del frames[depth:]
+        parent = frame(depth - 1) if depth else None
         text = (elem.text or "").strip()
-        attrs = ", ".join([f"{k}={v}" for k, v in elem.attrib.items()])
-        content = f"Path: {full_path}\nAttributes: {attrs}\nText: {text}" if text or attrs else None
- 
-        if content:
-            chunks.append({
-                "text": content,
-                "source": os.path.basename(path),
-                "page": None,
-                "type": "cdd_element"
-            })
+        attrs = ", ".join(f"{k.split('}')[-1]}={v}" for k, v in elem.attrib.items() if not k.startswith(XML_NS))
  
-        # Recurse into children
-        for child in elem:
-            extract_element(child, full_path)
+        if tag == "SHORT-NAME" and parent is not None:
+            parent["name"] = text
+            continue
+        if tag == "QUAL" and parent is not None and is_record(ancestors[-1], ancestors[:-1]):
+            parent["name"] = text  # set before the record's other children end, so nested records get the path
+        if own["name"] is None and is_record(tag, ancestors):
+            own["name"] = elem.attrib.get("name") or elem.attrib.get("id") or tag
+        if own["name"] is not None or parent is None:
+            lines = ([text] if text else []) + [f"{p}: {t}" if p else t for p, t in own["items"]]
+            if lines:
+                names = [f["name"] for f in frames if f["name"]] + ([own["name"]] if own["name"] else [])
+                header = f"{tag} /{'/'.join(names)}" + (f" [{attrs}]" if attrs else "")
+                yield tag, header, lines
+            continue
  
-    extract_element(root)
+        if "DEFINITION-REF" in own["fields"]:
+            parent["items"].append(("", _ecuc_value(own["fields"])))
+            if ecuc_values is not None:
+                container = "/" + "/".join(f["name"] for f in frames if f["name"])
+                ecuc_values.append((container, own["fields"]["DEFINITION-REF"],
+                                    own["fields"].get("VALUE", own["fields"].get("VALUE-REF", ""))))
+        elif text and not own["items"]:  # leaf element
+            parent["fields"][tag] = text
+            parent["items"].append((f"{tag} [{attrs}]" if attrs else tag, text))
+        else:
+            if attrs or text:
+                parent["items"].append((tag, " ".join(filter(None, [f"[{attrs}]" if attrs else "", text]))))
+            parent["items"].extend((p and f"{tag}/{p}", t) for p, t in own["items"])
  
+# --------------------------
+# CDD loader
+# --------------------------
+def iter_cdd_chunks(path: str) -> Iterator[Dict]:
+    """One cdd_element chunk per diagnostic record (DID, service, DTC, data object, ...)."""
+    source = os.path.basename(path)
+    for _, header, lines in iter_xml_records(path, "CDD", CDD_RECORD_TAGS, CDD_ENCLOSING_TAGS):
+        yield {
+            "text": "\n".join([header] + lines),
+            "source": source,
+            "page": None,
+            "type": "cdd_element"
+        }
+ 
+def load_cdd(path: str) -> Dict:
+    """
+    Load any CDD XML file; "chunks" is a generator streaming one chunk per
+    diagnostic record with its element paths, attributes, and texts.
+    """
     return {
         "path": path,
         "name": os.path.basename(path),
-        "chunks": chunks
+        "chunks": iter_cdd_chunks(path)
     }
  
 # --------------------------
 # ARXML loader
 # --------------------------
-def load_arxml(path: str) -> Dict:
-    try:
-        tree = ET.parse(path)
-        root = tree.getroot()
-    except Exception as e:
-        raise ValueError(f"Failed to load ARXML file {path}: {e}")
- 
-    chunks = []
- 
-    def extract_elements(elem, parent_name=""):
-        tag_name = elem.tag.split("}")[-1]
-        full_name = f"{parent_name}/{tag_name}" if parent_name else tag_name
-        if elem.text and elem.text.strip():
-            chunks.append({
-                "text": f"{full_name}: {elem.text.strip()}",
-                "source": os.path.basename(path),
-                "page": None,
-                "type": "arxml_element"
-            })
-        for child in elem:
-            extract_elements(child, full_name)
+def iter_arxml_chunks(path: str, ecuc_values: List[Tuple[str, str, str]] = None) -> Iterator[Dict]:
+    """One arxml_element chunk per identifiable (ECUC container with its parameter values, signal, ...)."""
+    source = os.path.basename(path)
+    for _, header, lines in iter_xml_records(path, "ARXML", ecuc_values=ecuc_values):
+        yield {
+            "text": "\n".join([header] + lines),
+            "source": source,
+            "page": None,
+            "type": "arxml_element"
+        }
  
-    extract_elements(root)
+def load_arxml(path: str) -> Dict:
+    """
+    Load an ARXML file; "chunks" is a generator streaming its identifiables.
+    "ecuc_values" (for the ECUC value index, Ecuc_Index) is filled as the
+    chunks are read and is complete once the generator is exhausted.
+    """
+    ecuc_values: List[Tuple[str, str, str]] = []
     return {
         "path": path,
         "name": os.path.basename(path),
-        "chunks": chunks
+        "chunks": iter_arxml_chunks(path, ecuc_values),
+        "ecuc_values": ecuc_values
     }
  
 # --------------------------
@@ -0,0 +1,225 @@
+# Ecuc_Index.py
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from Lexical_Index import query_identifiers
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/<COLLECTION>_ecuc.sqlite
+#   containers   id -> (source, SHORT-NAME path, last path segment)   e.g. /ActiveEcuC/CanIf/CanIfPublicCfg
+#   definitions  id -> (definition ref, parameter name)               e.g. /AUTOSAR/EcucDefs/CanIf/.../CanIfPublicTxBuffering
+#   ecuc_values  (container id, definition id, value)
+#   staged_values  (session token, source, container path, definition ref, value) of
+#                  documents still being ingested, moved into the tables above by update()
+#
+# Filled from the ECUC parameter / reference values of the ingested ARXML
+# files. Container paths and definition refs are stored once and referenced
+# by id, so a configuration with thousands of container instances of the
+# same definition stays small. A streamed ARXML file stages its values part by
+# part, so they are never all held in memory; rows left staged by a failed
+# batch are dropped when their source is next updated. Questions asking for a
+# named parameter's value ("what is CanIfPublicTxBuffering set to") are
+# answered from here without an LLM call; other questions naming parameters
+# get their configured values as extra context.
+EcucValue = Tuple[str, str, str]  # (container path, definition ref, value)
+
+# Questions asking for a parameter's configured value (naming a parameter alone is not
+# enough: "what does X mean" goes to RAG), unless they ask what the specification allows
+VALUE_PATTERN = re.compile(r"\b(set to|value|values|enabled|disabled)\b", re.I)
+SPEC_PATTERN = re.compile(r"\b(sws|spec(?:ification)?|standard|allowed|permitted|valid|range|default|"
+                          r"multiplicity|requirements?|shall|must)\b", re.I)
+# The only questions answered with a whole container: "parameters of TxPdu_A"
+CONTAINER_PATTERN = re.compile(r"\b(?:parameters?|values|settings) (?:of|in) (?:the )?(?:container )?([A-Za-z_]\w*)",
+                               re.I)
+DEFINITION_REF_PATTERN = re.compile(r"(?:/[A-Za-z_]\w*){2,}")
+MAX_ANSWER_VALUES = 50
+
+
+class EcucIndex:
+    """On-disk (SQLite) container path / definition ref -> value index of the ingested ECU configurations."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS containers (id INTEGER PRIMARY KEY, source, path, name)")
+        conn.execute("CREATE TABLE IF NOT EXISTS definitions (id INTEGER PRIMARY KEY, ref UNIQUE, parameter)")
+        conn.execute("CREATE TABLE IF NOT EXISTS ecuc_values (container INTEGER, definition INTEGER, value)")
+        conn.execute("CREATE TABLE IF NOT EXISTS staged_values (token, source, path, name, ref, parameter, value)")
+        conn.execute("CREATE INDEX IF NOT EXISTS containers_source ON containers (source)")
+        conn.execute("CREATE INDEX IF NOT EXISTS containers_path ON containers (source, path)")
+        conn.execute("CREATE INDEX IF NOT EXISTS staged_values_source ON staged_values (source, token)")
+        conn.execute("CREATE INDEX IF NOT EXISTS containers_name ON containers (name COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS definitions_parameter ON definitions (parameter COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ecuc_values_container ON ecuc_values (container)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ecuc_values_definition ON ecuc_values (definition)")
+        return conn
+
+    def stage(self, token: str, source: str, values: List[EcucValue]):
+        """Store part of a source's (container path, definition ref, value)s for a later update(staged={source: token})."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO staged_values VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             ((token, source, path, path.rsplit("/", 1)[-1], ref, ref.rsplit("/", 1)[-1], value)
+                              for path, ref, value in values))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def unstage(self, token: str):
+        """Drop the values staged under `token` (an aborted document)."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM staged_values WHERE token = ?", (token,))
+        finally:
+            conn.close()
+
+    def update(self, replace: Dict[str, List[EcucValue]], delete: List[str] = (), staged: Dict[str, str] = None):
+        """
+        Drop the values of `delete` sources, then store each source's
+        (container path, definition ref, value)s: given in `replace`, or staged
+        under the token `staged` maps it to.
+        """
+        staged = staged or {}
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for source in list(delete) + list(replace) + list(staged):
+                conn.execute("DELETE FROM ecuc_values WHERE container IN (SELECT id FROM containers WHERE source = ?)",
+                             (source,))
+                conn.execute("DELETE FROM containers WHERE source = ?", (source,))
+            for source, values in replace.items():
+                containers: Dict[str, int] = {}
+                definitions: Dict[str, int] = {}
+                rows = []
+                for path, ref, value in values:
+                    if path not in containers:
+                        containers[path] = conn.execute(
+                            "INSERT INTO containers (source, path, name) VALUES (?, ?, ?)",
+                            (source, path, path.rsplit("/", 1)[-1])).lastrowid
+                    if ref not in definitions:
+                        conn.execute("INSERT OR IGNORE INTO definitions (ref, parameter) VALUES (?, ?)",
+                                     (ref, ref.rsplit("/", 1)[-1]))
+                        definitions[ref] = conn.execute("SELECT id FROM definitions WHERE ref = ?", (ref,)).fetchone()[0]
+                    rows.append((containers[path], definitions[ref], value))
+                conn.executemany("INSERT INTO ecuc_values VALUES (?, ?, ?)", rows)
+            for source, token in staged.items():
+                # Intern paths and refs in SQL: the staged values never pass through memory
+                conn.execute("INSERT INTO containers (source, path, name) SELECT source, path, min(name) "
+                             "FROM staged_values WHERE source = ? AND token = ? GROUP BY path ORDER BY min(rowid)",
+                             (source, token))
+                conn.execute("INSERT OR IGNORE INTO definitions (ref, parameter) SELECT ref, min(parameter) "
+                             "FROM staged_values WHERE source = ? AND token = ? GROUP BY ref", (source, token))
+                conn.execute("INSERT INTO ecuc_values SELECT c.id, d.id, s.value FROM staged_values s "
+                             "JOIN containers c ON c.source = s.source AND c.path = s.path "
+                             "JOIN definitions d ON d.ref = s.ref "
+                             "WHERE s.source = ? AND s.token = ? ORDER BY s.rowid", (source, token))
+            for source in list(delete) + list(replace) + list(staged):
+                conn.execute("DELETE FROM staged_values WHERE source = ?", (source,))  # published or stale
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _select(self, where: str, args) -> List[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(r) for r in conn.execute(
+                "SELECT c.source, c.path, d.ref, d.parameter, v.value FROM ecuc_values v "
+                "JOIN containers c ON c.id = v.container JOIN definitions d ON d.id = v.definition "
+                f"WHERE {where} ORDER BY c.source, c.path, v.rowid LIMIT {MAX_ANSWER_VALUES + 1}", args)]
+        except sqlite3.OperationalError as e:
+            print(f"Failed ECUC lookup: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def find_parameters(self, names: List[str], containers: List[str] = None) -> List[Dict]:
+        """
+        Values of the parameters with these (case-insensitive) names or
+        definition refs, in every container or the named ones.
+        """
+        if not names:
+            return []
+        marks = ",".join("?" * len(names))
+        where = f"(d.parameter COLLATE NOCASE IN ({marks}) OR d.ref IN ({marks}))"
+        if containers:
+            where += f" AND c.name COLLATE NOCASE IN ({','.join('?' * len(containers))})"
+        return self._select(where, [*names, *names, *(containers or [])])
+
+    def find_containers(self, names: List[str]) -> List[Dict]:
+        """All values of the containers with these SHORT-NAMEs; never a module's own configuration."""
+        if not names:
+            return []
+        hits = self._select(f"c.name COLLATE NOCASE IN ({','.join('?' * len(names))})", names)
+        return [h for h in hits if h["path"].rsplit("/", 1)[-1] != module_name(h["ref"])]
+
+
+def module_name(ref: str) -> str:
+    """Module of a definition ref: /AUTOSAR/EcucDefs/CanIf/... (or a vendor's /MICROSAR/CanIf/...) -> CanIf."""
+    parts = ref.strip("/").split("/")
+    return parts[2] if len(parts) > 2 and parts[1] == "EcucDefs" else parts[1] if len(parts) > 1 else ""
+
+
+def _lookup(index: EcucIndex, query: str) -> List[Dict]:
+    """
+    Values of the parameters (or definition refs) named in the query, only
+    in the named containers if it names any of theirs.
+    """
+    names = list(dict.fromkeys(query_identifiers(query) + DEFINITION_REF_PATTERN.findall(query)))
+    return index.find_parameters(names, names) or index.find_parameters(names)
+
+
+def _container_lookup(index: EcucIndex, query: str) -> List[Dict]:
+    """All values of the container a "parameters of <container>" question names."""
+    match = CONTAINER_PATTERN.search(query)
+    return index.find_containers([match.group(1)]) if match else []
+
+
+def format_values(hits: List[Dict]) -> List[str]:
+    lines = [f"- `{h['path']}/{h['parameter']}` = **{h['value']}** ({h['source']})" for h in hits[:MAX_ANSWER_VALUES]]
+    if len(hits) > MAX_ANSWER_VALUES:
+        lines.append(f"- ... (more than {MAX_ANSWER_VALUES} values, name the container to narrow it down)")
+    return lines
+
+
+def answer_ecuc_query(index: EcucIndex, query: str) -> Optional[str]:
+    """
+    Configured value(s) for a question asking for the value of a named ECUC
+    parameter (or for the parameters of a named container), or None for
+    anything else, e.g. questions about what the specification allows (the
+    caller then falls back to RAG, with ecuc_context as extra context).
+    """
+    if not query or SPEC_PATTERN.search(query):
+        return None
+    hits = (_lookup(index, query) if VALUE_PATTERN.search(query) else []) or _container_lookup(index, query)
+    return "\n".join(format_values(hits)) if hits else None
+
+
+def _by_source(hits: List[Dict]) -> Dict[str, List[Dict]]:
+    grouped: Dict[str, List[Dict]] = {}
+    for h in hits:
+        grouped.setdefault(h["source"], []).append(h)
+    return grouped
+
+
+def ecuc_context(index: EcucIndex, query: str) -> List[Dict]:
+    """The configured values of the parameters (or container) the query names, as LLM context items."""
+    hits = (_lookup(index, query) or _container_lookup(index, query)) if query else []
+    if not hits:
+        return []
+    return [{"source": source, "text": "ECU configuration values:\n" + "\n".join(format_values(group)),
+             "type": "ecuc_value"}
+            for source, group in _by_source(hits).items()]
@@ -0,0 +1,95 @@
+# Embedding_Cache.py
+import hashlib
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/embedding_cache.sqlite
+#   embeddings  (model, dims, sha256(text)) -> float32 vector bytes, last use time
+#
+# One cache for every embedding call (document chunks, questions, good
+# answers), shared by all collections: the key carries the model and the
+# requested dimensions, so vectors of different models never mix. Lookups
+# and inserts touch only their own rows; the least recently used rows are
+# evicted once the cache holds more than max_rows vectors.
+
+
+class EmbeddingCache:
+    """Persistent content-addressed embedding cache (SQLite) with LRU eviction."""
+    def __init__(self, path: str, max_rows: int = 0):
+        self.path = path
+        self.max_rows = max_rows
+        self._rows = None  # approximate row count, loaded on first insert
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, dims INTEGER, hash BLOB, vector BLOB, "
+                     "used REAL, PRIMARY KEY (model, dims, hash)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+        return conn
+
+    def get_many(self, model: str, dims: int, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vector per text (None on a miss); hits are marked as recently used."""
+        keys = [text_key(t) for t in texts]
+        found = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(keys), 500):  # SQLite bound-parameter limit
+                part = list(set(keys[start:start + 500]))
+                rows = conn.execute(f"SELECT hash, vector FROM embeddings WHERE model = ? AND dims = ? "
+                                    f"AND hash IN ({','.join('?' * len(part))})", (model, dims, *part))
+                found.update((bytes(h), v) for h, v in rows)
+            if found:
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")  # one transaction for all hits, not one per row
+                conn.executemany("UPDATE embeddings SET used = ? WHERE model = ? AND dims = ? AND hash = ?",
+                                 ((now, model, dims, h) for h in found))
+                conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Failed to read embedding cache: {e}")
+        finally:
+            conn.close()
+        return [np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None for k in keys]
+
+    def put_many(self, model: str, dims: int, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts, then evict the least recently used rows beyond max_rows."""
+        if not texts:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO embeddings (model, dims, hash, vector, used) VALUES (?, ?, ?, ?, ?)",
+                             ((model, dims, text_key(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+                              for t, v in zip(texts, vectors)))
+            if self.max_rows:
+                if self._rows is None:
+                    self._rows = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+                else:
+                    self._rows += len(texts)
+                if self._rows > self.max_rows:
+                    keep = int(self.max_rows * 0.9)  # evict in bulk, not on every insert
+                    conn.execute("DELETE FROM embeddings WHERE (model, dims, hash) IN (SELECT model, dims, hash "
+                                 "FROM embeddings ORDER BY used LIMIT ?)", (self._rows - keep,))
+                    self._rows = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Failed to write embedding cache: {e}")
+        finally:
+            conn.close()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
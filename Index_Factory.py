@@ -0,0 +1,290 @@
+# Index_Factory.py
+import math
+from typing import Dict
+
+import faiss
+import numpy as np
+
+import config
+
+# --------------------------
+# Supported index types
+# --------------------------
+# Flat : exact inner-product search (brute force)
+# IVF  : inverted lists over k-means centroids (IVF-Flat), needs training
+# HNSW : graph-based ANN, no training, does not support removals
+INDEX_TYPES = ("Flat", "IVF", "HNSW")
+
+# Vector codecs (how each vector is stored inside the index)
+# float32 : uncompressed (12 KB per 3072-d vector)
+# fp16    : scalar-quantized half floats (2x smaller)
+# int8    : scalar-quantized 8-bit (4x smaller), trained per dimension
+# pq      : product-quantized codes, PQ_M bytes per vector, trained
+VECTOR_CODECS = ("float32", "fp16", "int8", "pq")
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+# IVF needs enough vectors to train its centroids; smaller corpora stay Flat
+IVF_MIN_TRAIN = 39
+# PQ trains 256 centroids per sub-quantizer and k-means wants ~39 points per
+# centroid; smaller corpora use int8 scalar quantization instead
+PQ_MIN_TRAIN = 39 * 256
+# Retrain IVF / SQ / PQ once the corpus has grown this much since the last training
+IVF_RETRAIN_GROWTH = 4.0
+
+
+def normalize_index_type(index_type: str = None) -> str:
+    index_type = (index_type or config.INDEX_TYPE).strip()
+    for known in INDEX_TYPES:
+        if index_type.lower() in (known.lower(), f"{known.lower()}-flat", f"{known.lower()}flat"):
+            return known
+    raise ValueError(f"Unknown INDEX_TYPE '{index_type}'. Expected one of {INDEX_TYPES}")
+
+
+def normalize_codec(codec: str = None) -> str:
+    codec = (codec or config.VECTOR_CODEC).strip().lower()
+    codec = {"f32": "float32", "float16": "fp16", "f16": "fp16", "sq8": "int8", "sq": "int8"}.get(codec, codec)
+    if codec not in VECTOR_CODECS:
+        raise ValueError(f"Unknown VECTOR_CODEC '{codec}'. Expected one of {VECTOR_CODECS}")
+    return codec
+
+
+def pq_m(d: int) -> int:
+    """PQ sub-quantizer count: config.PQ_M, or the largest common choice dividing d (>= 4 dims each)."""
+    if config.PQ_M > 0:
+        if d % config.PQ_M:
+            raise ValueError(f"PQ_M={config.PQ_M} must divide the vector dimension {d}")
+        return config.PQ_M
+    for m in (96, 64, 48, 32, 24, 16, 8, 4, 2, 1):
+        if d % m == 0 and d // m >= 4:
+            return m
+    return 1
+
+
+def search_dim(embed_dim: int) -> int:
+    """First-pass index dimension: config.SEARCH_DIMENSIONS if smaller than the stored vectors."""
+    if 0 < config.SEARCH_DIMENSIONS < embed_dim:
+        return config.SEARCH_DIMENSIONS
+    return embed_dim
+
+
+def reduce_dims(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """
+    Truncate to the first `dims` components and re-normalize. For the
+    text-embedding-3 models this equals asking the API for `dimensions=dims`.
+    """
+    if dims >= vectors.shape[1]:
+        return vectors
+    x = np.array(vectors[:, :dims], dtype=np.float32, order="C")  # copy: normalize_L2 works in place
+    faiss.normalize_L2(x)
+    return x
+
+
+def ivf_nlist(n: int) -> int:
+    """Number of IVF lists for n vectors (config.IVF_NLIST, or ~4*sqrt(n) capped by training size)."""
+    if config.IVF_NLIST > 0:
+        return max(1, min(config.IVF_NLIST, n // IVF_MIN_TRAIN))
+    return max(1, min(int(4 * math.sqrt(n)), n // IVF_MIN_TRAIN))
+
+
+# --------------------------
+# Build / configure
+# --------------------------
+def build_index(vectors: np.ndarray, index_type: str = None, codec: str = None,
+                ids: np.ndarray = None) -> faiss.Index:
+    """
+    Build (and train if needed) an inner-product index over normalized vectors.
+    With `ids`, the index is wrapped in an IndexIDMap2 so results carry those
+    (chunk store row) ids and documents can be removed by id range.
+    """
+    index_type = normalize_index_type(index_type)
+    codec = normalize_codec(codec)
+    n, d = vectors.shape
+    xb = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    if codec == "pq" and n < PQ_MIN_TRAIN:
+        codec = "int8"
+    if codec == "pq" and index_type == "HNSW":
+        raise ValueError("VECTOR_CODEC=pq is not supported with INDEX_TYPE=HNSW; use int8 or fp16")
+
+    if index_type == "IVF" and n >= IVF_MIN_TRAIN:
+        quantizer = faiss.IndexFlatIP(d)
+        nlist = ivf_nlist(n)
+        if codec == "pq":
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m(d), 8, faiss.METRIC_INNER_PRODUCT)
+        elif codec in _SQ_TYPES:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, _SQ_TYPES[codec], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "HNSW":
+        if codec in _SQ_TYPES:
+            index = faiss.IndexHNSWSQ(d, _SQ_TYPES[codec], config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(d, config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+    elif codec == "pq":
+        index = faiss.IndexPQ(d, pq_m(d), 8, faiss.METRIC_INNER_PRODUCT)
+    elif codec in _SQ_TYPES:
+        index = faiss.IndexScalarQuantizer(d, _SQ_TYPES[codec], faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexFlatIP(d)  # cosine similarity
+
+    if not index.is_trained and n:
+        index.train(xb)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+    if n and index.is_trained:
+        if ids is not None:
+            index.add_with_ids(xb, np.ascontiguousarray(ids, dtype=np.int64))
+        else:
+            index.add(xb)
+    configure_search(index)
+    return index
+
+
+def unwrap_index(index: faiss.Index) -> faiss.Index:
+    """The underlying index of an IndexIDMap/IndexIDMap2 (or the index itself)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def configure_search(index: faiss.Index) -> faiss.Index:
+    """Apply query-time knobs (nprobe / efSearch) from config to a loaded index."""
+    if index is None:
+        return index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config.IVF_NPROBE, ivf.nlist)
+    hnsw = unwrap_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = config.HNSW_EF_SEARCH
+    return index
+
+
+def search_params(index: faiss.Index, sel: faiss.IDSelector) -> faiss.SearchParameters:
+    """Per-query parameters restricting a search to `sel`, keeping the index's nprobe / efSearch."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+    inner = unwrap_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+
+def index_codec(index: faiss.Index) -> str:
+    """Vector codec of a built index (inverse of build_index's codec choice)."""
+    inner = unwrap_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    ivf = faiss.try_extract_index_ivf(index)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    sq = getattr(inner, "sq", None)
+    if sq is None and ivf is not None:
+        sq = getattr(faiss.downcast_index(ivf), "sq", None)
+    if sq is not None:
+        return {v: k for k, v in _SQ_TYPES.items()}.get(sq.qtype, "int8")
+    return "float32"
+
+
+def describe_index(index: faiss.Index) -> Dict:
+    """Header fields describing a built index (stored next to it on disk)."""
+    codec = index_codec(index)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        header = {"index_type": "IVF", "codec": codec, "dim": index.d, "nlist": ivf.nlist}
+    elif isinstance(unwrap_index(index), faiss.IndexHNSW):
+        header = {"index_type": "HNSW", "codec": codec, "dim": index.d}
+    else:
+        header = {"index_type": "Flat", "codec": codec, "dim": index.d}
+    header["id_map"] = isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+    if ivf is not None or codec in ("int8", "pq"):
+        header["trained_rows"] = index.ntotal
+    return header
+
+
+def needs_rebuild(header: Dict, rows: int, index_type: str = None, codec: str = None, dim: int = None) -> bool:
+    """
+    True if the configured index type / codec / first-pass dim differs from the
+    built one, or a trained index (IVF centroids, SQ/PQ codebooks) has outgrown
+    its training.
+    """
+    index_type = normalize_index_type(index_type)
+    codec = normalize_codec(codec)
+    if codec == "pq" and rows < PQ_MIN_TRAIN:
+        codec = "int8"
+    if header.get("codec", "float32") != codec:
+        return True
+    if dim and header.get("dim") != dim:
+        return True
+    if not header.get("id_map"):
+        return True
+
+    built = header.get("index_type")
+    if index_type == "IVF" and rows < IVF_MIN_TRAIN:
+        return built != "Flat"
+    if built != index_type:
+        return True
+    if "trained_rows" in header:
+        return rows > IVF_RETRAIN_GROWTH * max(1, header["trained_rows"])
+    return False
+
+
+# --------------------------
+# Build report
+# --------------------------
+REPORT_BLOCK_ROWS = 65536
+
+
+def exact_neighbours(xq: np.ndarray, vectors: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    """
+    Ids (from `rows`) of the exact top-k inner-product neighbours of `xq`
+    among vectors[rows], scored block by block so a memory-mapped store is
+    never copied whole.
+    """
+    best_s = np.empty((len(xq), 0), dtype=np.float32)
+    best_i = np.empty((len(xq), 0), dtype=np.int64)
+    for start in range(0, len(rows), REPORT_BLOCK_ROWS):
+        block = rows[start:start + REPORT_BLOCK_ROWS]
+        scores = np.concatenate([best_s, xq @ np.asarray(vectors[block], dtype=np.float32).T], axis=1)
+        ids = np.concatenate([best_i, np.broadcast_to(block, (len(xq), len(block)))], axis=1)
+        top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_s = np.take_along_axis(scores, top, axis=1)
+        best_i = np.take_along_axis(ids, top, axis=1)
+    return best_i
+
+
+def index_report(index: faiss.Index, vectors: np.ndarray, k: int = 10, num_queries: int = 100,
+                 ids: np.ndarray = None) -> Dict:
+    """
+    Raw float32 size of the indexed vectors, and recall@k of the index
+    (without re-ranking) against exact full-dimension search on a sample of
+    them. The indexed vectors are vectors[ids] (all of `vectors` if None),
+    e.g. the live rows of the memory-mapped chunk store. The index size is
+    added from the written file (see size_report).
+    """
+    rows = np.arange(len(vectors), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    n, d = len(rows), vectors.shape[1]
+    report = {"float32_bytes": n * d * 4}
+    if n == 0:
+        return report
+
+    rng = np.random.default_rng(0)
+    sample = rows[np.sort(rng.choice(n, size=min(num_queries, n), replace=False))]
+    xq = np.ascontiguousarray(vectors[sample], dtype=np.float32)
+    k = min(k, n)
+    truth = exact_neighbours(xq, vectors, rows, k)
+    _, found = index.search(reduce_dims(xq, index.d), k)
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    report["recall_at_k"] = round(hits / truth.size, 4)
+    report["k"] = k
+    return report
+
+
+def size_report(report: Dict, index_bytes: int) -> Dict:
+    """Add the index size (bytes of the written index file) and its compression vs float32 to a report."""
+    report["index_bytes"] = int(index_bytes)
+    report["compression"] = round(report.get("float32_bytes", 0) / max(1, index_bytes), 2)
+    return report
@@ -0,0 +1,313 @@
+# Ingest_Pipeline.py
+import os
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from Document_Handler import load_document
+from Data_Handler import embed_texts, iter_document_records, process_document_records
+from Chunk_Store import text_hash
+from Database_Handler import IngestSession, file_sha256
+import config
+
+# --------------------------
+# Pipeline
+# --------------------------
+# parse + chunk   process pool (INGEST_WORKERS, default one per core)
+#       |         bounded queue
+# embed           INGEST_EMBED_THREADS threads (embed_texts batches and caches)
+#       |         bounded queue
+# index           the calling thread, the only IngestSession writer
+#
+# At most INGEST_WORKERS + INGEST_QUEUE_SIZE documents (or parts), plus one
+# part per streaming worker, are between submission and indexing, and the session stages each part as it
+# arrives (rows and vectors flushed to the chunk store's data files, ECUC
+# values to the ECUC index's staging table), so memory stays bounded however
+# many and however large the files are. The session commits (writes the
+# manifest) once at the end.
+#
+# ARXML / CDD files go to a second pool (INGEST_STREAM_WORKERS processes)
+# whose workers run their streaming loaders and hand each part of
+# INGEST_PART_RECORDS records on through a bounded queue as it is read, so a
+# large file is embedded while it is still being parsed.
+DONE = None
+STREAMED_TYPES = (".arxml", ".cdd")
+_parts = None  # streaming worker: queue of parts to the pipeline
+
+
+def parse_file(path: str, name: str = None) -> Dict:
+    """Stage 1 (worker process): load and chunk one file into chunk records."""
+    started = time.perf_counter()
+    try:
+        doc = load_document(path)
+        records = process_document_records(doc.get("chunks", []))
+        return {"path": path, "name": name or doc.get("name") or os.path.basename(path), "records": records,
+                "messages": doc.get("messages"), "ecuc_values": doc.get("ecuc_values"), "part": 0, "parts": 1,
+                "parse_seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"path": path, "name": name or os.path.basename(path), "error": f"{type(e).__name__}: {e}",
+                "part": 0, "parts": 1}
+
+
+def _take(values: List) -> List:
+    """The values a streaming loader appended so far, leaving its list empty."""
+    taken = list(values)
+    values.clear()
+    return taken
+
+
+def stream_file(path: str, name: str = None) -> Iterator[Dict]:
+    """
+    Stage 1 for streamed files: chunk records (and the ECUC values
+    read with them) in parts; the last part carries the part count.
+    """
+    name = name or os.path.basename(path)
+    part, records = 0, []
+    started = time.perf_counter()
+    try:
+        doc = load_document(path)
+        values = doc.get("ecuc_values", [])
+        for record in iter_document_records(doc["chunks"]):
+            records.append(record)
+            if len(records) >= config.INGEST_PART_RECORDS:
+                yield {"path": path, "name": name, "records": records, "ecuc_values": _take(values), "part": part,
+                       "parse_seconds": time.perf_counter() - started}
+                part, records = part + 1, []
+                started = time.perf_counter()
+        yield {"path": path, "name": name, "records": records, "ecuc_values": _take(values), "part": part,
+               "parts": part + 1, "parse_seconds": time.perf_counter() - started}
+    except Exception as e:
+        yield {"path": path, "name": name, "error": f"{type(e).__name__}: {e}", "part": part, "parts": part + 1}
+
+
+def _init_stream_worker(parts):
+    global _parts
+    _parts = parts
+
+
+def stream_to_queue(path: str, name: str = None):
+    """Stage 1 for streamed files (streaming worker process): put each part on the pipeline's queue as it is read."""
+    for part in stream_file(path, name):
+        _parts.put(part)
+
+
+def _embed_stage(parsed: queue.Queue, embedded: queue.Queue, known: frozenset = frozenset()):
+    """
+    Stage 2 (I/O thread): embed each parsed document's chunks. Chunks whose
+    text is in `known` (the collection's text hashes when the run started) or
+    repeated within the item are deduped by the session, so they get no
+    embedding (None).
+    """
+    while True:
+        item = parsed.get()
+        if item is DONE:
+            embedded.put(DONE)
+            return
+        if "error" not in item and item["records"]:
+            started = time.perf_counter()
+            hashes = [text_hash(r["text"]) for r in item["records"]]
+            new = {}
+            for h, r in zip(hashes, item["records"]):
+                if h not in known:
+                    new.setdefault(h, r["text"])
+            try:
+                vectors = dict(zip(new, np.asarray(embed_texts(list(new.values())), dtype=np.float32))) if new else {}
+                item["embeddings"] = [vectors.pop(h, None) for h in hashes]
+            except Exception as e:
+                item["error"] = f"{type(e).__name__}: {e}"
+            item["embed_seconds"] = time.perf_counter() - started
+        embedded.put(item)
+
+
+def ingest_paths(files: List[Tuple[str, str]], session: IngestSession = None,
+                 progress: Callable[[int, int, Dict], None] = None) -> Dict:
+    """
+    Ingest (path, document name) pairs through the parse / embed / index
+    pipeline. Unchanged files (same name and content hash) are skipped
+    before parsing. `progress(done, total, item)` is called after each
+    document is indexed. Uses (and leaves open) `session` if given, else
+    commits a session of its own. Returns the throughput report.
+    """
+    if session is None:
+        with IngestSession() as own:
+            return ingest_paths(files, own, progress)
+
+    started = time.perf_counter()
+    todo, unchanged = [], 0
+    for path, name in files:
+        digest = file_sha256(path)
+        if session.is_unchanged(name, digest):
+            unchanged += 1
+            continue
+        todo.append((path, name, digest))
+    report = {"files": 0, "unchanged": unchanged, "failed": 0, "chunks": 0, "duplicates": 0,
+              "parse_seconds": 0.0, "embed_seconds": 0.0}
+    if todo:
+        _run(todo, session, report, progress)
+
+    report["seconds"] = elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"Ingested {report['files']} files ({report['chunks']} chunks, {report['duplicates']} duplicates, "
+          f"{report['unchanged']} unchanged, {report['failed']} failed) in {elapsed:.1f}s: "
+          f"{report['files'] / elapsed:.2f} files/s, {report['chunks'] / elapsed:.1f} chunks/s "
+          f"(parse {report['parse_seconds']:.1f}s, embed {report['embed_seconds']:.1f}s summed over workers)")
+    return report
+
+
+def _run(todo: List[Tuple[str, str, str]], session: IngestSession, report: Dict, progress):
+    digests = {path: digest for path, _, digest in todo}
+    streamed = [(path, name) for path, name, _ in todo if os.path.splitext(path)[1].lower() in STREAMED_TYPES]
+    pooled = [(path, name) for path, name, _ in todo if os.path.splitext(path)[1].lower() not in STREAMED_TYPES]
+    workers = max(1, min(config.INGEST_WORKERS or os.cpu_count() or 1, len(pooled)))
+    embedders = max(1, min(config.INGEST_EMBED_THREADS, len(todo)))
+    # Items submitted but not yet indexed; the queues can hold them all, so stages never block on put
+    limit = workers + config.INGEST_QUEUE_SIZE
+    slots = threading.Semaphore(limit)
+    parsed = queue.Queue(maxsize=limit)
+    embedded = queue.Queue(maxsize=limit)
+    pool = None
+    if pooled:
+        pool = ProcessPoolExecutor(workers) if workers > 1 else ThreadPoolExecutor(1)
+    stream_pool, streams = None, []
+    if streamed:
+        stream_workers = max(1, min(config.INGEST_STREAM_WORKERS, len(streamed)))
+        parts = multiprocessing.Queue(stream_workers)
+        stream_pool = ProcessPoolExecutor(stream_workers, initializer=_init_stream_worker, initargs=(parts,))
+
+    known = session.known_hashes()
+    pending = [len(todo)]
+    pending_lock = threading.Lock()
+
+    def queued_document():
+        with pending_lock:
+            pending[0] -= 1
+            last = pending[0] == 0
+        if last:  # every document is queued: stop the embedders
+            for _ in range(embedders):
+                parsed.put(DONE)
+
+    def queue_result(future, path, name):
+        if future.cancelled():
+            return
+        try:
+            parsed.put(future.result())
+        except Exception as e:  # worker process died
+            parsed.put({"path": path, "name": name, "error": f"{type(e).__name__}: {e}", "part": 0, "parts": 1})
+        queued_document()
+
+    def feed():
+        for path, name in pooled:
+            slots.acquire()
+            future = pool.submit(parse_file, path, name)
+            future.add_done_callback(lambda f, path=path, name=name: queue_result(f, path, name))
+
+    streaming = {path for path, _ in streamed}
+
+    def stream_ended(path):
+        with pending_lock:
+            if path not in streaming:
+                return
+            streaming.discard(path)
+        queued_document()
+
+    def stream_failed(future, path, name):
+        if future.cancelled() or future.exception() is None:
+            return
+        # Worker process died: its unsent parts are lost (and the parts queue unusable), so abort directly
+        slots.acquire()
+        parsed.put({"path": path, "name": name, "error": f"{type(future.exception()).__name__}: "
+                                                         f"{future.exception()}", "abort": True})
+        stream_ended(path)
+
+    def forward():
+        while streaming:
+            try:
+                part = parts.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            slots.acquire()
+            parsed.put(part)
+            if "parts" in part:
+                stream_ended(part["path"])
+
+    for path, name in streamed:
+        streams.append(stream_pool.submit(stream_to_queue, path, name))
+        streams[-1].add_done_callback(lambda f, path=path, name=name: stream_failed(f, path, name))
+
+    threads = [threading.Thread(target=feed, name="ingest-feed", daemon=True),
+               threading.Thread(target=forward, name="ingest-stream", daemon=True)]
+    threads += [threading.Thread(target=_embed_stage, args=(parsed, embedded, known), name="ingest-embed", daemon=True)
+                for _ in range(embedders)]
+    for t in threads:
+        t.start()
+
+    done, finished = 0, 0
+    items: Dict[str, Dict] = {}  # path -> document whose parts are being staged
+    ended = set()  # paths of the documents indexed (or failed) so far
+    try:
+        while finished < embedders:
+            part = embedded.get()
+            if part is DONE:
+                finished += 1
+                continue
+            if part["path"] in ended:
+                slots.release()  # a late part of a document whose worker died
+                continue
+            item = items.setdefault(part["path"], {"path": part["path"], "name": part["name"], "staged": 0,
+                                                   "parts": None, "records": 0, "added": 0, "duplicates": 0,
+                                                   "parse_seconds": 0.0, "embed_seconds": 0.0})
+            item["staged"] += 1
+            item["parts"] = part.get("parts", item["parts"])
+            item["parse_seconds"] += part.get("parse_seconds", 0.0)
+            item["embed_seconds"] += part.get("embed_seconds", 0.0)
+            if "error" in part:
+                item["error"] = part["error"]
+                if part.get("abort"):
+                    item["parts"] = item["staged"]  # no more parts will come
+            elif "error" not in item and (part["records"] or part.get("ecuc_values")):
+                before = session.skipped
+                item["added"] += session.add_part(part["records"], part.get("embeddings"), source_name=item["name"],
+                                                  source_path=item["path"], ecuc_values=part.get("ecuc_values"))
+                item["records"] += len(part["records"])
+                item["duplicates"] += session.skipped - before
+                item["messages"] = part.get("messages") or item.get("messages")
+            slots.release()  # the part is staged in the chunk store, no longer held here
+            if item["parts"] is None or item["staged"] < item["parts"]:
+                continue  # parts of a streamed document are still being embedded
+            del items[item["path"]]
+            ended.add(item["path"])
+
+            done += 1
+            report["parse_seconds"] += item["parse_seconds"]
+            report["embed_seconds"] += item["embed_seconds"]
+            if "error" in item:
+                session.abort_document(item["name"])
+                report["failed"] += 1
+                print(f"Failed to ingest {item['path']}: {item['error']}")
+            elif not item["records"]:
+                session.abort_document(item["name"])
+                print(f"[{done}/{len(todo)}] {item['name']} is empty.")
+            else:
+                session.finish_document(item["name"], digests[item["path"]], item.get("messages"))
+                report["files"] += 1
+                report["chunks"] += item["added"]
+                report["duplicates"] += item["duplicates"]
+                print(f"[{done}/{len(todo)}] Indexed {item['added']} chunks from {item['name']}")
+            if progress:
+                progress(done, len(todo), item)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if stream_pool is not None:
+            for future in streams:
+                future.cancel()
+            while not all(future.done() for future in streams):
+                try:
+                    parts.get(timeout=0.1)  # unblock workers still putting parts of an abandoned run
+                except queue.Empty:
+                    pass
+            stream_pool.shutdown(wait=True)
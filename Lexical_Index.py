@@ -0,0 +1,129 @@
+# Lexical_Index.py
+import re
+import sqlite3
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Chunk_Store import ChunkStore
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/<COLLECTION>_lexical.sqlite
+#   chunks  FTS5 table of chunk texts, rowid = chunk store row id
+#   meta    number of chunk store rows already indexed, id of the store they belong to
+#
+# BM25 over exact tokens finds identifiers (CanControllerFdBaudrateConfig,
+# ComTxModeNumberOfRepetitions, CanIf_Transmit) that dense embeddings rank
+# poorly. Rows of deleted documents are removed on commit and also skipped at
+# query time through the store's live rows.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "the", "to", "what", "when", "which", "who", "why", "with",
+}
+
+
+class LexicalIndex:
+    """On-disk BM25 (SQLite FTS5) index over the chunk store texts."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text, tokenize='unicode61')")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        return conn
+
+    def indexed_rows(self) -> int:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def sync(self, store: ChunkStore, removed: np.ndarray = None) -> int:
+        """
+        Index the live store rows added since the last sync and drop `removed`
+        rows; returns rows added. A store snapshot older than the last sync
+        adds nothing; a recreated store (new store id) is indexed from scratch.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # one writer: the ingest process or a backfilling reader
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            start = meta.get("rows", 0)
+            if meta.get("store", store.store_id) != store.store_id:  # store was recreated
+                conn.execute("DELETE FROM chunks")
+                start = 0
+            if removed is not None and len(removed):
+                conn.executemany("DELETE FROM chunks WHERE rowid = ?", ((int(r),) for r in removed))
+            live = store.live_rows()
+            new = live[live >= start]  # rows that died before their first sync are never indexed
+            conn.executemany("INSERT INTO chunks (rowid, text) VALUES (?, ?)",
+                             ((int(r), store.get(int(r)).get("text", "")) for r in new))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rows', ?)", (max(start, len(store)),))
+            if store.store_id:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('store', ?)", (store.store_id,))
+            conn.execute("COMMIT")
+            return len(new)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def search(self, query: str, k: int, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k chunk rows for the query terms (any term may match).
+        `allowed` is a row bitmap (live rows / filter_mask); other rows are skipped.
+        Returns (scores, ids), higher score = better.
+        """
+        match = match_expression(query)
+        if not match:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        conn = self._connect()
+        scores, ids = [], []
+        try:
+            cursor = conn.execute("SELECT rowid, bm25(chunks) FROM chunks WHERE chunks MATCH ? ORDER BY rank",
+                                  (match,))
+            for rowid, score in cursor:
+                if allowed is not None and not (rowid < len(allowed) and allowed[rowid]):
+                    continue
+                ids.append(rowid)
+                scores.append(-score)  # FTS5 bm25() is lower-is-better
+                if len(ids) >= k:
+                    break
+        except sqlite3.OperationalError as e:
+            print(f"Failed lexical search: {e}")
+        finally:
+            conn.close()
+        return np.array(scores, dtype=np.float32), np.array(ids, dtype=np.int64)
+
+
+def query_terms(query: str) -> List[str]:
+    """Query tokens as FTS5 unicode61 splits them (underscores separate), minus stopwords."""
+    terms = []
+    for tok in re.findall(r"[^\W_]+", query or ""):
+        if len(tok) > 1 and tok.lower() not in STOPWORDS and tok.lower() not in terms:
+            terms.append(tok.lower())
+    return terms
+
+
+def query_identifiers(query: str) -> List[str]:
+    """AUTOSAR identifiers in a query: CamelCase names (CanIfTxPduId) and API names (CanIf_Transmit)."""
+    return re.findall(r"\b[A-Za-z][A-Za-z0-9]*_[A-Za-z0-9_]+\b|\b[A-Z]?[a-z0-9]+(?:[A-Z][a-z0-9]*){2,}\b", query or "")
+
+
+def match_expression(query: str) -> str:
+    return " OR ".join(f'"{t}"' for t in query_terms(query))
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> Dict[int, float]:
+    """RRF score per id over several ranked id lists: sum of 1 / (k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking, start=1):
+            fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (k + rank)
+    return fused
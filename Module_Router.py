@@ -0,0 +1,80 @@
+# Module_Router.py
+import os
+import re
+from typing import List
+
+# --------------------------
+# Module keywords (documents)
+# --------------------------
+# Shared with question_generator: detects which AUTOSAR module a document covers
+MODULE_KEYWORDS = {
+    "RTE": [r"\brte\b", r"\brunnable\b", r"runtime environment"],
+    "COM": [r"\bcom\b", r"communication module", r"\bipdu\b", r"\bsignal\b"],
+    "PDUR": [r"\bpdur\b", r"\bpdu router\b"],
+    "CANIF": [r"\bcanif\b", r"can interface", r"can interface module", r"can interface layer"],
+    "CANTP": [r"\bcantp\b", r"can transport protocol"],
+    "CAN": [r"\bcan driver\b"],
+    "DEM": [r"\bdem\b", r"diagnostic event"],
+    "DCM": [r"\bdcm\b", r"diagnostic communication"],
+    "NVM": [r"\bnvm\b", r"non volatile memory", r"nvblock"]
+}
+MODULE_PRIORITY = ["CANTP", "CANIF", "DEM", "DCM", "COM", "RTE", "CAN", "PDUR", "NVM"]
+GENERAL = "GENERAL"
+
+# Filename tokens (AUTOSAR_SWS_CANInterface.pdf -> "caninterface") per module
+FILENAME_MODULES = {
+    "caninterface": "CANIF", "canif": "CANIF",
+    "cantp": "CANTP", "cantransportlayer": "CANTP",
+    "pdurouter": "PDUR", "pdur": "PDUR",
+    "candriver": "CAN",
+    "rte": "RTE",
+    "com": "COM",
+    "dcm": "DCM",
+    "dem": "DEM",
+    "nvm": "NVM", "nvram": "NVM",
+}
+# Architecture / methodology documents span every module
+GENERAL_FILENAME_TOKENS = {"layeredsoftwarearchitecture", "softwarecomponenttemplate", "methodology"}
+
+# --------------------------
+# Module patterns (queries)
+# --------------------------
+# Matches module names, API prefixes (CanIf_Transmit, Rte_Write) and
+# parameter prefixes (CanIfPublicTxBuffering, ComTxModeNumberOfRepetitions)
+QUERY_PATTERNS = {
+    "CANIF": re.compile(r"(?i:\bcan\s?if\b|can interface)|\bCanIf(?=[A-Z_])|\bCANIF"),
+    "CANTP": re.compile(r"(?i:\bcan\s?tp\b|can transport)|\bCanTp(?=[A-Z_])|\bCANTP"),
+    "CAN": re.compile(r"(?i:can driver|\bcan_)|\bCan(?!If|Tp|Nm|Sm|Trcv)(?=[A-Z])"),
+    "PDUR": re.compile(r"(?i:\bpdu\s?r\b|pdu router)|\bPduR(?=[A-Z_])|\bPDUR"),
+    "COM": re.compile(r"(?i:\bcom\b|\bcom_|communication module)|\bCom(?=[A-Z])"),
+    "RTE": re.compile(r"(?i:\brte\b|\brte_|runtime environment|\brunnables?\b)|\bRte(?=[A-Z])"),
+    "DCM": re.compile(r"(?i:\bdcm\b|\bdcm_|diagnostic communication)|\bDcm(?=[A-Z])"),
+    "DEM": re.compile(r"(?i:\bdem\b|\bdem_|diagnostic event)|\bDem(?=[A-Z])"),
+    "NVM": re.compile(r"(?i:\bnvm\b|\bnvm_|non volatile memory|nvblock)|\bNvM(?=[A-Z])"),
+}
+
+
+def detect_document_module(doc_name: str, text: str = "") -> str:
+    """
+    Module a document belongs to: filename tokens first (AUTOSAR_SWS_CANInterface.pdf),
+    then keyword detection on the start of its text. Returns GENERAL if none match.
+    """
+    stem = os.path.splitext(os.path.basename(doc_name))[0].lower()
+    tokens = [t for t in re.split(r"[\s_\-.]+", stem) if t]
+    if any(t in GENERAL_FILENAME_TOKENS for t in tokens):
+        return GENERAL
+    for token in tokens:
+        if token in FILENAME_MODULES:
+            return FILENAME_MODULES[token]
+
+    combined = (stem + " " + (text or "")[:2000]).lower()
+    for mod in MODULE_PRIORITY:
+        for kw in MODULE_KEYWORDS.get(mod, []):
+            if re.search(kw, combined, re.IGNORECASE):
+                return mod
+    return GENERAL
+
+
+def route_query(query: str) -> List[str]:
+    """Modules a question explicitly targets (empty list = search everything)."""
+    return [mod for mod, pattern in QUERY_PATTERNS.items() if pattern.search(query or "")]
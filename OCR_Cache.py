@@ -0,0 +1,52 @@
+# OCR_Cache.py
+import os
+import sqlite3
+from typing import Dict, List
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/ocr_cache.sqlite
+#   ocr  sha256(image bytes) -> OCR text ("" for images without text)
+#
+# Figures are OCR'd once per distinct image content, whichever document or
+# page they appear on; re-ingesting a PDF reads every figure text from here.
+
+
+class OCRCache:
+    """Persistent OCR results (SQLite) keyed by image content hash."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS ocr (hash BLOB PRIMARY KEY, text TEXT) WITHOUT ROWID")
+        return conn
+
+    def get_many(self, hashes: List[bytes]) -> Dict[bytes, str]:
+        """OCR text of the cached hashes (missing hashes are left out)."""
+        found = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(hashes), 500):  # SQLite bound-parameter limit
+                part = hashes[start:start + 500]
+                rows = conn.execute(f"SELECT hash, text FROM ocr WHERE hash IN ({','.join('?' * len(part))})", part)
+                found.update((bytes(h), t) for h, t in rows)
+        except sqlite3.OperationalError as e:
+            print(f"Failed to read OCR cache: {e}")
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, texts: Dict[bytes, str]):
+        if not texts:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO ocr (hash, text) VALUES (?, ?)", texts.items())
+        except sqlite3.OperationalError as e:
+            print(f"Failed to write OCR cache: {e}")
+        finally:
+            conn.close()
@@ -1,63 +1,42 @@
 # Retrieve.py
 from typing import List, Dict
-import numpy as np
-from Database_Handler import load_all, msearch, embed_query
+from Database_Handler import msearch, mmr_rerank
  
 # --------------------------
 # Search function with scores
 # --------------------------
-def search(query_text: str, top_k: int = 5) -> List[Dict]:
+def search(query_text: str, top_k: int = 5, filters: Dict = None) -> List[Dict]:
     """
     Search FAISS index using a query text, return top-k results with scores.
-    Each result contains: 'source', 'path', 'text', 'score'.
+    Each result contains: 'source', 'path', 'text', 'score' (plus module/type/page).
+    Same engine as Database_Handler.msearch: routing, filters, hybrid fusion
+    and the similarity / score-gap / token-budget cutoffs.
     """
     if not query_text.strip():
         return []
- 
-    # Embed query
-    try:
-        query_vector = embed_query(query_text)
-    except Exception as e:
-        print(f"Failed to embed query: {e}")
-        return []
- 
-    query_vector = np.array(query_vector, dtype=np.float32).reshape(1, -1)
- 
-    # Load FAISS index
-    index, meta = load_all()
-    if index is None or len(meta) == 0:
-        return []
- 
-    # Normalize for cosine similarity
-    from faiss import normalize_L2
-    normalize_L2(query_vector)
- 
-    # Search
-    D, I = index.search(query_vector, top_k)
-    results: List[Dict] = []
-    for score, i in zip(D[0], I[0]):
-        if 0 <= i < len(meta):
-            r = meta[i].copy()
-            r["score"] = float(score)
-            results.append(r)
-    return results
+    return msearch(query_text, top_k=top_k, filters=filters)
  
 # --------------------------
 # Build context function
 # --------------------------
-def build_context(results: List[Dict], max_chars: int = 2000) -> str:
+def build_context(results: List[Dict], max_chars: int = 2000, mmr: bool = False) -> str:
     """
     Build structured context grouped by module/document.
     Helps LLM see natural flows across layers.
+    With mmr=True near-duplicate chunks are moved behind distinct ones first.
     """
     if not results:
         return ""
+    if mmr:
+        results = mmr_rerank(results)
  
     context: List[str] = []
     grouped: Dict[str, List[str]] = {}
     for r in results:
         source = r.get("source", "Unknown")
         text = r.get("text", "")
+        if r.get("page"):
+            text = f"(page {r['page']}) {text}"  # PDF page, for citations
         grouped.setdefault(source, []).append(text)
  
     for module, texts in grouped.items():
@@ -0,0 +1,159 @@
+# Signal_Index.py
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional
+
+# --------------------------
+# Layout
+# --------------------------
+# <DB_DIR>/<COLLECTION>_signals.sqlite
+#   messages  one row per DBC message: source, name, frame_id, length, senders, comment
+#   signals   one row per signal: source, message, frame_id, name, bit layout, scaling, range, unit, ...
+#
+# Filled from the parsed DBC databases at ingest. Questions that name a
+# signal or message ("start bit and scale of VehicleSpeed", "which message
+# carries EngineTemp", "signals of 0x1A0") are answered from these tables
+# without embedding or an LLM call.
+SIGNAL_COLUMNS = ("source", "message", "frame_id", "name", "start", "length", "byte_order", "is_signed",
+                  "scale", "offset", "minimum", "maximum", "unit", "choices", "comment")
+MESSAGE_COLUMNS = ("source", "name", "frame_id", "length", "senders", "comment")
+
+# Questions asking for DBC facts (names alone are not enough: "explain how VehicleSpeed is used" goes to RAG)
+LOOKUP_TERMS = (r"(?:start ?bit|bit ?length|length|size|scal(?:e|ing)|factor|offset|min(?:imum)?|max(?:imum)?|"
+                r"range|unit|byte ?order|endian\w*|intel|motorola|signed|unsigned|value ?table|values|enum\w*|"
+                r"(?:frame|can|message|msg) ?id|dlc|which message|what message|carr(?:y|ies)|contains?|sender|"
+                r"signals? (?:of|in)|layout|definition)")
+LOOKUP_PATTERN = re.compile(rf"\b{LOOKUP_TERMS}\b", re.I)
+# The subject of a lookup phrase: the name right after it ("scale of VehicleSpeed",
+# "signals of the message 0x1A0") or right before it ("VehicleSpeed start bit");
+# lookaheads, so overlapping phrases ("which message carries X") are all seen
+SUBJECT_NAME = r"(0x[0-9a-f]+|[A-Za-z_][A-Za-z0-9_]*)"
+SUBJECT_KIND = r"(?:(?:the|a|an)\s+)?(?:(?:signal|message|msg|frame)\s+)?"
+SUBJECT_AFTER = re.compile(
+    rf"(?=\b{LOOKUP_TERMS}\s+(?:(?:of|for|in|on|from|by)\s+)?{SUBJECT_KIND}{SUBJECT_NAME}\b)", re.I)
+SUBJECT_BEFORE = re.compile(rf"(?=\b{SUBJECT_NAME}(?:'s)?\s+{SUBJECT_KIND}{LOOKUP_TERMS}\b)", re.I)
+FRAME_ID_PATTERN = re.compile(r"0x[0-9a-f]+", re.I)
+SENTENCE_START = r"(?:^|[.!?:]\s+)\W*"
+# Names no English word looks like: CamelCase (VehicleSpeed, also single-hump, which
+# Lexical_Index.query_identifiers skips) or with an underscore / digit (ENG_Temp, Wheel2)
+IDENTIFIER_SHAPE = re.compile(r"\w*(?:[a-z0-9][A-Z]|_|[A-Za-z][0-9])\w*")
+
+
+class SignalIndex:
+    """On-disk (SQLite) message / signal tables of the ingested DBC files."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS messages ({', '.join(MESSAGE_COLUMNS)})")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS signals ({', '.join(SIGNAL_COLUMNS)})")
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_name ON messages (name COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_id ON messages (frame_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_source ON messages (source)")
+        conn.execute("CREATE INDEX IF NOT EXISTS signals_name ON signals (name COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS signals_message ON signals (source, message)")
+        return conn
+
+    def update(self, replace: Dict[str, List[Dict]], delete: List[str] = ()):
+        """Drop the tables' rows of `delete` sources, then store each source's messages (with their signals)."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for source in list(delete) + list(replace):
+                conn.execute("DELETE FROM messages WHERE source = ?", (source,))
+                conn.execute("DELETE FROM signals WHERE source = ?", (source,))
+            for source, messages in replace.items():
+                conn.executemany(f"INSERT INTO messages VALUES ({', '.join('?' * len(MESSAGE_COLUMNS))})",
+                                 ((source, m["name"], m["frame_id"], m.get("length"), m.get("senders"),
+                                   m.get("comment")) for m in messages))
+                conn.executemany(f"INSERT INTO signals VALUES ({', '.join('?' * len(SIGNAL_COLUMNS))})",
+                                 ((source, m["name"], m["frame_id"], *(s.get(c) for c in SIGNAL_COLUMNS[3:]))
+                                  for m in messages for s in m["signals"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _select(self, sql: str, args) -> List[Dict]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(r) for r in conn.execute(sql, args)]
+        except sqlite3.OperationalError as e:
+            print(f"Failed signal lookup: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def find_signals(self, names: List[str]) -> List[Dict]:
+        if not names:
+            return []
+        return self._select(f"SELECT * FROM signals WHERE name COLLATE NOCASE IN ({','.join('?' * len(names))})",
+                            names)
+
+    def find_messages(self, names: List[str], frame_ids: List[int] = ()) -> List[Dict]:
+        if not names and not frame_ids:
+            return []
+        return self._select(f"SELECT * FROM messages WHERE name COLLATE NOCASE IN ({','.join('?' * len(names))}) "
+                            f"OR frame_id IN ({','.join('?' * len(frame_ids))})", [*names, *frame_ids])
+
+    def message_signals(self, source: str, message: str) -> List[Dict]:
+        return self._select("SELECT * FROM signals WHERE source = ? AND message = ? ORDER BY start", (source, message))
+
+
+def format_signal(s: Dict) -> str:
+    text = (f"**{s['name']}** (message {s['message']}, ID {hex(s['frame_id'])}, {s['source']}): "
+            f"start bit {s['start']}, length {s['length']} bits, {s['byte_order']}, "
+            f"{'signed' if s['is_signed'] else 'unsigned'}, scale {s['scale']}, offset {s['offset']}, "
+            f"range [{s['minimum']}, {s['maximum']}]" + (f" {s['unit']}" if s["unit"] else ""))
+    if s["choices"]:
+        text += f", values {s['choices']}"
+    if s["comment"]:
+        text += f". {s['comment']}"
+    return text
+
+
+def lookup_subjects(query: str) -> List[str]:
+    """The names (or 0x frame ids) a DBC lookup question asks about, as written."""
+    return list(dict.fromkeys(m.group(1) for pattern in (SUBJECT_AFTER, SUBJECT_BEFORE)
+                              for m in pattern.finditer(query or "")))
+
+
+def answer_signal_query(index: SignalIndex, query: str) -> Optional[str]:
+    """
+    Exact answer for a DBC lookup question about a signal or message, or
+    None when the question is not a lookup or its subject names nothing in
+    the tables (the caller then falls back to RAG). Subjects match a name in
+    its exact case (not as a capitalized first word), or in any case if they
+    are identifier-shaped (VehicleSpeed, ENG_Temp, vehiclespeed is not), so "what is the status
+    range" does not answer with a message called Status.
+    """
+    subjects = lookup_subjects(query)
+    frame_ids = [int(s, 16) for s in subjects if FRAME_ID_PATTERN.fullmatch(s)]
+    names = [s for s in subjects if not FRAME_ID_PATTERN.fullmatch(s)]
+    if not names and not frame_ids:
+        return None
+    any_case = {n.lower() for n in names if IDENTIFIER_SHAPE.fullmatch(n)}
+    names = [n for n in names if n.lower() in any_case
+             or not re.search(rf"{SENTENCE_START}{re.escape(n)}\b", query)]  # "Status of ..." is sentence case
+
+    def named(name: str) -> bool:
+        return name in names or name.lower() in any_case
+
+    signals = [s for s in index.find_signals(names) if named(s["name"])]
+    if signals:
+        return "\n".join(f"- {format_signal(s)}" for s in signals)
+    messages = [m for m in index.find_messages(names, frame_ids) if named(m["name"]) or m["frame_id"] in frame_ids]
+    if not messages:
+        return None
+    lines = []
+    for m in messages:
+        lines.append(f"**{m['name']}** (ID {hex(m['frame_id'])}, {m['length']} bytes, {m['source']})"
+                     + (f", sent by {m['senders']}" if m["senders"] else "") + ":")
+        lines.extend(f"- {format_signal(s)}" for s in index.message_signals(m["source"], m["name"]))
+    return "\n".join(lines)
@@ -2,17 +2,16 @@
 import streamlit as st
 import pandas as pd
 import os
-import pickle
 import time
 from graphviz import Source
 import streamlit.components.v1 as components
 import json
 from difflib import get_close_matches
-import hashlib
+import re
  
-from Document_Handler import load_document, load_dbc, load_cdd
-from Data_Handler import chunk_text, embed_texts, embed_query, process_document_chunks
-from Database_Handler import add_text_chunks, msearch
+from Data_Handler import embed_query
+from Database_Handler import msearch, delete_document, list_documents, structured_answer, structured_context
+from Ingest_Pipeline import ingest_paths
 from LLM_Handler import answer_with_context, answer_with_code, answer_with_flowchart
 from valid_answer import add_good_answer, search_good_answer
 import config
@@ -24,7 +23,6 @@ os.makedirs(DATA_DIR, exist_ok=True)
  
 FEEDBACK_FILE = os.path.join(DATA_DIR, "feedback_log.csv")
 DOCS_FILE = os.path.join(DATA_DIR, "uploaded_docs.csv")
-EMB_CACHE_FILE = os.path.join(DATA_DIR, "embedding_cache.pkl")
 QMAP_FILE = os.path.join(DATA_DIR, "Question_Map.json")
  
 # --- Load question mapping JSON ---
@@ -58,6 +56,12 @@ def map_to_canonical(query: str) -> str:
                 return canonical
     return query
  
+# --- Figure questions: search only figure chunks, answer from the figure context ---
+FIGURE_QUERY = re.compile(r"\b(figure|diagram|sequence chart|flow ?chart)s?\b", re.IGNORECASE)
+ 
+def is_figure_question(query: str) -> bool:
+    return bool(FIGURE_QUERY.search(query))
+ 
 # --- Streamlit setup ---
 st.set_page_config(page_title="AUTOSAR AI AGENT", layout="wide")
 st.title("🚗 AUTOSAR AI AGENT")
@@ -74,29 +78,12 @@ if "last_answer" not in st.session_state:
     st.session_state.conversation = []
  
 # --- Embedding cache ---
-if os.path.exists(EMB_CACHE_FILE):
-    with open(EMB_CACHE_FILE, "rb") as f:
-        emb_cache = pickle.load(f)
-else:
-    emb_cache = {}
- 
 def cached_embed(text: str):
     """
     Return deterministic embedding for a text.
-    Uses SHA256 hash as key in embedding cache.
+    embed_query reads through the persistent embedding cache (Embedding_Cache).
     """
-    key = hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
- 
-    if key in emb_cache:
-        return emb_cache[key]
- 
-    emb = embed_query(text)
-    emb_cache[key] = emb
- 
-    with open(EMB_CACHE_FILE, "wb") as f:
-        pickle.dump(emb_cache, f)
- 
-    return emb
+    return embed_query(text.strip())
  
 # --- Feedback ---
 def save_feedback(feedback_type):
@@ -125,32 +112,46 @@ with tabs[0]:
         uploaded_files = []
         os.makedirs("Documents.cache_uploads", exist_ok=True)
  
+        paths = []
         for f in files:
             tmp_path = os.path.join("Documents.cache_uploads", f.name)
             with open(tmp_path, "wb") as out:
                 out.write(f.read())
- 
-            ext = os.path.splitext(f.name)[1].lower()
-            if ext == ".dbc":
-                doc = load_dbc(tmp_path)
-            elif ext == ".cdd":
-                doc = load_cdd(tmp_path)
-            else:  # .docx, .md, .pdf, .arxml
-                doc = load_document(tmp_path)
- 
-            # Flatten chunks and embed
-            chunks = process_document_chunks(doc["chunks"])
-            embs = embed_texts(chunks)
-            added = add_text_chunks(chunks, embs, source_name=doc["name"], source_path=tmp_path)
-            total += added
-            uploaded_files.append(doc["name"])
- 
-        st.success(f"Indexed {total} chunks.")
+            paths.append((tmp_path, f.name))
+ 
+        # One session for the whole upload: files are parsed in parallel and committed once.
+        # Re-uploading a document replaces its chunks; identical re-uploads are skipped.
+        bar = st.progress(0.0, text="Parsing documents...")
+ 
+        def on_progress(done, n, item):
+            bar.progress(done / n, text=f"{done}/{n}: {item['name']}")
+            if "error" in item:
+                st.error(f"Failed to index {item['name']}: {item['error']}")
+            elif "added" in item:
+                uploaded_files.append(item["name"])
+ 
+        report = ingest_paths(paths, progress=on_progress)
+        total = report["chunks"]
+        if report["unchanged"]:
+            st.info(f"{report['unchanged']} files are already indexed and unchanged; skipped.")
+        st.success(f"Indexed {total} chunks ({report['duplicates']} duplicate chunks skipped) "
+                   f"in {report['seconds']:.1f}s.")
  
         if uploaded_files:
             df = pd.DataFrame(uploaded_files, columns=["document"])
             df.to_csv(DOCS_FILE, mode="a", index=False, header=not os.path.exists(DOCS_FILE))
  
+    # --- Remove a document from the index ---
+    indexed_docs = sorted(d["name"] for d in list_documents())
+    if indexed_docs:
+        doc_to_delete = st.selectbox("Remove an indexed document", indexed_docs, index=None)
+        if st.button("Delete from Index") and doc_to_delete:
+            removed = delete_document(doc_to_delete)
+            if os.path.exists(DOCS_FILE):
+                df_docs = pd.read_csv(DOCS_FILE)
+                df_docs[df_docs["document"] != doc_to_delete].to_csv(DOCS_FILE, index=False)
+            st.success(f"Removed {removed} chunks of {doc_to_delete}.")
+ 
     st.markdown("### 📂 Uploaded Documents")
     if os.path.exists(DOCS_FILE):
         df_docs = pd.read_csv(DOCS_FILE).drop_duplicates()
@@ -167,6 +168,7 @@ with tabs[1]:
     generate_code = st.checkbox("Generate code snippet", value=False)
     code_language = st.selectbox("Select programming language", ["Python", "C", "C++", "Java"], index=0)
     generate_flowchart = st.checkbox("Generate Flowchart / Diagram", value=False)
+    diversify = st.checkbox("Diversify retrieved context (MMR)", value=config.MMR_RERANK)
  
     # --- Submit function ---
     def submit_question(user_query):
@@ -194,6 +196,14 @@ with tabs[1]:
                 flowchart_svg = None
                 config_answer_generated = True
  
+        # --- Exact DBC / ECUC lookups (signal layout, configured values) from the structured indexes ---
+        if not config_answer_generated and not generate_code and not generate_flowchart:
+            structured = structured_answer(user_query.strip())
+            if structured:
+                new_answer = structured
+                flowchart_svg = None
+                config_answer_generated = True
+ 
         if not config_answer_generated:
             good_hits = search_good_answer(query_canonical)
             if good_hits:
@@ -201,7 +211,15 @@ with tabs[1]:
                 flowchart_svg = None
             else:
                 qvec = cached_embed(query_canonical)
-                doc_results = msearch(query_canonical, top_k=config.TOP_K)
+                # TOP_K caps the candidates; the threshold, score gap and token budget trim them
+                figure_only = is_figure_question(query_canonical)
+                doc_results = []
+                if figure_only:
+                    doc_results = msearch(query_canonical, top_k=config.TOP_K, filters={"type": "figure"},
+                                          mmr=diversify)
+                    figure_only = bool(doc_results)
+                if not doc_results:
+                    doc_results = msearch(query_canonical, top_k=config.TOP_K, mmr=diversify)
  
                 if doc_results:
                     for r in doc_results:
@@ -216,10 +234,16 @@ with tabs[1]:
                             "type": chunk_type,
                             "page": page_info
                         })
+                # Configured values of the ECUC parameters the question names, ahead of the retrieved text
+                combined_context = structured_context(user_query.strip()) + combined_context
  
                 context_text = "\n".join([r["text"] for r in combined_context]) if combined_context else ""
  
-                if not context_text:
+                if not context_text and list_documents():
+                    # Retrieval cut everything below SIMILARITY_THRESHOLD
+                    new_answer = "No match found in AUTOSAR docs."
+                    flowchart_svg = None
+                elif not context_text:
                     new_answer = "No documents or good answers indexed yet. Please ingest docs first."
                     flowchart_svg = None
                 else:
@@ -231,7 +255,7 @@ with tabs[1]:
                         new_answer = answer_with_code(query_canonical, combined_context, language=code_language)
                         flowchart_svg = None
                     else:
-                        new_answer = answer_with_context(query_canonical, context_text)
+                        new_answer = answer_with_context(query_canonical, context_text, figure_only=figure_only)
                         flowchart_svg = None
  
         end_time = time.time()
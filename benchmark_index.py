@@ -0,0 +1,88 @@
+"""
+Index benchmark:
+- Loads the stored chunk vectors of the collection
+- Builds each requested index type (Flat, IVF, HNSW) x vector codec (float32, fp16, int8, pq)
+- Reports index size, recall@k against exact Flat search and p50/p99 single-query latency
+
+Queries are sampled from the stored chunk vectors by default; pass --questions
+to embed the canonical questions from Question_Map.json instead.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from Database_Handler import open_chunk_store
+from Index_Factory import INDEX_TYPES, VECTOR_CODECS, build_index
+
+
+def load_queries(xb: np.ndarray, num_queries: int, questions: bool, seed: int) -> np.ndarray:
+    if questions:
+        from Data_Handler import embed_texts
+        with open("Question_Map.json", "r") as f:
+            qmap = json.load(f)
+        texts = [e["canonical"] for e in qmap.values() if isinstance(e, dict) and e.get("canonical")]
+        xq = np.array(embed_texts(texts[:num_queries]), dtype=np.float32)
+        faiss.normalize_L2(xq)
+        return xq
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(xb), size=min(num_queries, len(xb)), replace=False)
+    return np.ascontiguousarray(xb[np.sort(rows)], dtype=np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / max(1, (truth >= 0).sum())
+
+
+def bench(index, xq: np.ndarray, k: int):
+    latencies = []
+    found = np.empty((len(xq), k), dtype=np.int64)
+    for i in range(len(xq)):
+        t0 = time.perf_counter()
+        _, I = index.search(xq[i:i + 1], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = I[0]
+    return found, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark FAISS index types on the indexed corpus.")
+    ap.add_argument("--types", nargs="+", default=list(INDEX_TYPES), help="Index types to compare")
+    ap.add_argument("--codecs", nargs="+", default=["float32"], help=f"Vector codecs {VECTOR_CODECS}")
+    ap.add_argument("--k", type=int, default=10, help="Recall@k cutoff")
+    ap.add_argument("--queries", type=int, default=200, help="Number of queries")
+    ap.add_argument("--questions", action="store_true", help="Embed Question_Map.json questions as queries")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    store = open_chunk_store()
+    if not store.has_vectors():
+        raise SystemExit("No stored vectors found. Ingest documents first.")
+    xb = store.vectors()[store.live_rows()]
+    xq = load_queries(xb, args.queries, args.questions, args.seed)
+    print(f"Corpus: {len(xb)} vectors x {store.dim} dims, {len(xq)} queries, k={args.k}")
+
+    truth_index = build_index(xb, "Flat", "float32")
+    truth, _, _ = bench(truth_index, xq, args.k)
+
+    print(f"{'type':<8}{'codec':<9}{'size MB':>10}{'build s':>10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for index_type in args.types:
+        for codec in args.codecs:
+            try:
+                t0 = time.perf_counter()
+                index = build_index(xb, index_type, codec)
+                build_s = time.perf_counter() - t0
+            except ValueError as e:
+                print(f"{index_type:<8}{codec:<9}  skipped: {e}")
+                continue
+            size_mb = faiss.serialize_index(index).nbytes / 1e6
+            found, p50, p99 = bench(index, xq, args.k)
+            print(f"{index_type:<8}{codec:<9}{size_mb:>10.1f}{build_s:>10.2f}"
+                  f"{recall_at_k(found, truth):>10.3f}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,16 +12,67 @@ if not OPENAI_API_KEY:
  
 # Models
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-large").strip()
+# Embedding size sent as the API `dimensions` parameter (0 = model default, 3072 for -3-large)
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0"))
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini").strip()
+# Embedding requests: inputs packed up to EMBED_BATCH_TOKENS tokens per request (API limit 300k),
+# EMBED_WORKERS requests in flight, rate-limited requests retried up to EMBED_MAX_RETRIES times
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# Persistent embedding cache keyed by (model, dimensions, sha256(text)), <DB_DIR>/embedding_cache.sqlite;
+# least recently used vectors are evicted beyond EMBED_CACHE_MAX_ROWS (0 = unbounded)
+EMBED_CACHE = os.getenv("EMBED_CACHE", "1").strip().lower() in ("1", "true", "yes")
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", "200000"))
  
 # Vector DB
 DB_DIR = os.getenv("DB_DIR", "vector_store").strip()
 COLLECTION = os.getenv("COLLECTION", "autosar").strip()
  
+# Index type: Flat (exact), IVF (IVF-Flat, trained) or HNSW (graph)
+INDEX_TYPE = os.getenv("INDEX_TYPE", "Flat").strip()
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = auto (~4*sqrt(n))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "128"))
+ 
+# Vector codec inside the index: float32 | fp16 | int8 | pq
+VECTOR_CODEC = os.getenv("VECTOR_CODEC", "float32").strip()
+PQ_M = int(os.getenv("PQ_M", "0"))  # PQ bytes per vector, 0 = auto
+# Re-rank RERANK_FACTOR * top_k compressed candidates with full-precision vectors (0/1 = off)
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+# First-pass index dimension (e.g. 256); the shortlist is re-scored at full size (0 = full)
+SEARCH_DIMENSIONS = int(os.getenv("SEARCH_DIMENSIONS", "0"))
+# Restrict questions that name a module (CanIf, PduR, Rte_...) to that module's chunks
+MODULE_ROUTING = os.getenv("MODULE_ROUTING", "1").strip().lower() in ("1", "true", "yes")
+# Fuse dense results with BM25 (exact identifiers) by reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1").strip().lower() in ("1", "true", "yes")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))  # candidates per ranking before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+# New chunks go to an in-memory delta segment; the background compactor merges it into the
+# FAISS base index once it holds COMPACT_DELTA_ROWS rows or deleted rows exceed COMPACT_DEAD_FRACTION
+COMPACT_DELTA_ROWS = int(os.getenv("COMPACT_DELTA_ROWS", "2000"))
+COMPACT_DEAD_FRACTION = float(os.getenv("COMPACT_DEAD_FRACTION", "0.2"))
+# Answer exact DBC lookups (signal layout, which message carries a signal) and configured ECUC values
+# from the structured indexes, no LLM
+STRUCTURED_LOOKUP = os.getenv("STRUCTURED_LOOKUP", "1").strip().lower() in ("1", "true", "yes")
+ 
 # Chunking
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "4800"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "550"))
 MAX_CHUNKS_PER_FILE = int(os.getenv("MAX_CHUNKS_PER_FILE", "4000"))
+# Ingest pipeline: parse/chunk processes (0 = one per core), embedding threads,
+# parsed documents buffered between stages
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_EMBED_THREADS = int(os.getenv("INGEST_EMBED_THREADS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+INGEST_PART_RECORDS = int(os.getenv("INGEST_PART_RECORDS", "512"))  # records per part of a streamed ARXML/CDD file
+INGEST_STREAM_WORKERS = int(os.getenv("INGEST_STREAM_WORKERS", "2"))  # processes streaming ARXML/CDD files
+# PDF figure OCR: images smaller than OCR_MIN_SIZE pixels (either side) are skipped,
+# OCR_WORKERS processes (0 = one per core); results cached in <DB_DIR>/ocr_cache.sqlite
+OCR_MIN_SIZE = int(os.getenv("OCR_MIN_SIZE", "100"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
 TOP_K = int(os.getenv("TOP_K", "200"))
  
 # Safety/guardrails (RAG prompt template)
@@ -39,4 +90,14 @@ TEMPERATURE = float(os.getenv("TEMPERATURE", "0"))
  
 # Minimum similarity for FAISS retrieval
 # If below threshold → "No match found in AUTOSAR docs"
-SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.75"))
\ No newline at end of file
+# (cosine scores of text-embedding-3 models rarely exceed ~0.7, even for exact matches)
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.35"))
+# Stop at the first drop of at least SCORE_GAP between consecutive scores (0 = off),
+# but never return fewer than MIN_RESULTS chunks that pass the threshold
+SCORE_GAP = float(os.getenv("SCORE_GAP", "0.08"))
+MIN_RESULTS = int(os.getenv("MIN_RESULTS", "3"))
+# Token budget of the retrieved chunk texts per question (0 = unlimited)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+# Maximal-marginal-relevance re-ranking of retrieved chunks (pushes near-duplicates down)
+MMR_RERANK = os.getenv("MMR_RERANK", "0").strip().lower() in ("1", "true", "yes")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = relevance only, 0 = diversity only
\ No newline at end of file
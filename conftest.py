@@ -1,24 +1,27 @@
-import os
 import pytest
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from ragas.llms import LangchainLLMWrapper
-from ragas.embeddings import LangchainEmbeddingsWrapper
-import config  # import your config.py
 
-API_KEY = getattr(config, "OPENAI_API_KEY", None)
-if not API_KEY:
-    raise RuntimeError("OPENAI_API_KEY not set in config.py")
+
+def _api_key() -> str:
+    import config  # import your config.py
+    api_key = getattr(config, "OPENAI_API_KEY", None)
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set in config.py")
+    return api_key
 
 # ---------------------------
 # Fixtures for pytest
 # ---------------------------
+# The RAGAS wrappers are imported when a test asks for them, so the offline
+# unit tests (test/test_*.py) run without langchain / ragas or an API key.
 
 @pytest.fixture(scope="session")
 def langchain_llm_ragas_wrapper():
     """
     Fixture: Provides an LLM wrapper for RAGAS metrics
     """
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, openai_api_key=API_KEY)
+    from langchain_openai import ChatOpenAI
+    from ragas.llms import LangchainLLMWrapper
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, openai_api_key=_api_key())
     return LangchainLLMWrapper(llm)
 
 
@@ -27,5 +30,7 @@ def get_embeddings():
     """
     Fixture: Provides an embeddings wrapper for RAGAS metrics
     """
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key=API_KEY)
+    from langchain_openai import OpenAIEmbeddings
+    from ragas.embeddings import LangchainEmbeddingsWrapper
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key=_api_key())
     return LangchainEmbeddingsWrapper(embeddings)
@@ -1,22 +1,15 @@
 import argparse
 import os
-from Document_Handler import load_document
-from Data_Handler import chunk_text, embed_texts
-from Database_Handler import add_text_chunks
+from Ingest_Pipeline import ingest_paths
 
 def ingest(paths):
-    for p in paths:
-        doc = load_document(p)
-        chunks = chunk_text(doc["content"])
-        if not chunks:
-            print(f"[skip] {doc['name']} is empty.")
-            continue
-        embs = embed_texts(chunks)
-        n = add_text_chunks(chunks, embs, source_name=doc["name"], source_path=doc["path"])
-        print(f"[ok] Indexed {n} chunks from {doc['name']}")
+    # Parse/chunk in a process pool, embed on I/O threads, index in this process
+    report = ingest_paths([(p, os.path.basename(p)) for p in paths])
+    print(f"[ok] Committed {report['chunks']} chunks to the index ({report['duplicates']} duplicate chunks skipped, "
+          f"{report['unchanged']} unchanged files skipped).")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Ingest docs into the vector store.")
-    ap.add_argument("paths", nargs="+", help="Files: .txt .md .pdf")
+    ap.add_argument("paths", nargs="+", help="Files: .txt .md .pdf .docx .dbc .cdd .arxml")
     args = ap.parse_args()
     ingest(args.paths)
@@ -25,17 +25,7 @@ NUM_QUESTIONS = 10  # per document
 #     "DEM": [r"\bdem\b", r"diagnostic event"],                # precise full-word match
 #     "NVM": [r"\bnvm\b", r"non volatile memory", r"nvblock"]
 # }
-MODULE_KEYWORDS = {
-    "RTE": [r"\brte\b", r"\brunnable\b", r"runtime environment"],
-    "COM": [r"\bcom\b", r"communication module", r"\bipdu\b", r"\bsignal\b"],
-    "PDUR": [r"\bpdur\b", r"\bpdu router\b"],
-    "CANIF": [r"\bcanif\b", r"can interface", r"can interface module", r"can interface layer"],
-    "CANTP": [r"\bcantp\b", r"can transport protocol"],
-    "CAN": [r"\bcan driver\b"],
-    "DEM": [r"\bdem\b", r"diagnostic event"],
-    "DCM": [r"\bdcm\b", r"diagnostic communication"],
-    "NVM": [r"\bnvm\b", r"non volatile memory", r"nvblock"]
-}
+from Module_Router import MODULE_KEYWORDS  # shared with index routing
  
 def _get_api_key():
     api_key = os.getenv("OPENAI_API_KEY")
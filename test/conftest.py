@@ -0,0 +1,94 @@
+import hashlib
+import os
+import re
+import tempfile
+
+import numpy as np
+import pytest
+
+# The unit tests never reach the OpenAI API: config needs a key to import, the
+# collection lives in a temporary DB_DIR and embeddings are faked below.
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["DB_DIR"] = tempfile.mkdtemp(prefix="rag_test_db_")
+os.environ["EMBED_CACHE"] = "0"
+
+import config  # noqa: E402
+import Data_Handler  # noqa: E402
+import Database_Handler as DH  # noqa: E402
+
+EMBED_DIM = 16
+
+
+class WordEncoder:
+    """Offline stand-in for a tiktoken encoding: one token per word, with its leading whitespace."""
+    def __init__(self):
+        self.pieces = []
+        self.ids = {}
+
+    def _id(self, piece: str) -> int:
+        if piece not in self.ids:
+            self.ids[piece] = len(self.pieces)
+            self.pieces.append(piece)
+        return self.ids[piece]
+
+    def encode(self, text: str, disallowed_special=()) -> list:
+        return [self._id(p) for p in re.findall(r"\s*\S+|\s+", text)]
+
+    def encode_batch(self, texts, disallowed_special=()) -> list:
+        return [self.encode(t) for t in texts]
+
+    def decode(self, tokens) -> str:
+        return "".join(self.pieces[t] for t in tokens)
+
+    def decode_with_offsets(self, tokens):
+        offsets, pos = [], 0
+        for t in tokens:
+            offsets.append(pos)
+            pos += len(self.pieces[t])
+        return self.decode(tokens), offsets
+
+
+ENCODER = WordEncoder()
+
+
+def fake_embedding(text: str) -> list:
+    """Deterministic unit vector per text (seeded by its hash)."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(EMBED_DIM).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def fake_embed_texts(texts, *args, **kwargs) -> list:
+    return [fake_embedding(t) for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def encoder(monkeypatch):
+    """Token counts and chunking use the word encoder (tiktoken needs a download)."""
+    monkeypatch.setattr(Data_Handler, "_encoder", lambda model: ENCODER)
+    return ENCODER
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    Empty collection in tmp_path, with fake embeddings. Compaction only runs
+    when a test calls compact_index(), never on the background thread.
+    """
+    collection = config.COLLECTION
+    monkeypatch.setattr(DH, "DB_DIR", str(tmp_path))
+    monkeypatch.setattr(DH, "FAISS_INDEX_PATH", str(tmp_path / f"{collection}.faiss"))
+    monkeypatch.setattr(DH, "META_PATH", str(tmp_path / f"{collection}_meta.pkl"))
+    monkeypatch.setattr(DH, "CHUNKS_DIR", str(tmp_path / f"{collection}_chunks"))
+    monkeypatch.setattr(DH, "HEADER_PATH", str(tmp_path / f"{collection}_index.json"))
+    monkeypatch.setattr(DH, "LEXICAL_PATH", str(tmp_path / f"{collection}_lexical.sqlite"))
+    monkeypatch.setattr(DH, "SIGNALS_PATH", str(tmp_path / f"{collection}_signals.sqlite"))
+    monkeypatch.setattr(DH, "ECUC_PATH", str(tmp_path / f"{collection}_ecuc.sqlite"))
+    monkeypatch.setattr(DH, "WRITE_LOCK_PATH", str(tmp_path / f"{collection}_write.lock"))
+    monkeypatch.setattr(DH, "_resident", DH.ResidentIndex())  # binds the lexical index path above
+    monkeypatch.setattr(DH._compactor, "request", lambda: None)
+    monkeypatch.setattr(DH, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(DH, "embed_query", lambda query, *args, **kwargs: fake_embedding(query))
+    monkeypatch.setattr(DH, "embed_queries", fake_embed_texts)
+    yield DH
+    DH._compactor.wait()
@@ -1,6 +1,8 @@
+from typing import List
 from fastapi import FastAPI
 from pydantic import BaseModel
 from UI import normalize_question, map_to_canonical, cached_embed, msearch, search_good_answer
+from Database_Handler import msearch_batch, structured_answer, structured_context
 from LLM_Handler import answer_with_context, answer_with_code, answer_with_flowchart
 
 app = FastAPI(title="AUTOSAR AI Agent API")
@@ -11,15 +13,26 @@ class QuestionRequest(BaseModel):
     code_language: str = "Python"
     generate_flowchart: bool = False
 
+class BatchSearchRequest(BaseModel):
+    questions: List[str]
+    top_k: int = 5
+
 @app.post("/predict")
 def predict(q: QuestionRequest):
     query_clean = normalize_question(q.question.strip())
     query_canonical = map_to_canonical(query_clean)
     combined_context = []
 
+    # Exact DBC / ECUC lookups need neither retrieval nor the LLM
+    structured = None
+    if not q.generate_code and not q.generate_flowchart:
+        structured = structured_answer(q.question.strip())
+
     # Check for good answers first
-    good_hits = search_good_answer(query_canonical)
-    if good_hits:
+    good_hits = search_good_answer(query_canonical) if structured is None else []
+    if structured:
+        answer = structured
+    elif good_hits:
         answer = good_hits[0].get("answer", "")
     else:
         qvec = cached_embed(query_canonical)
@@ -35,6 +48,7 @@ def predict(q: QuestionRequest):
                     "text": text_content,
                     "type": chunk_type
                 })
+        combined_context = structured_context(q.question.strip()) + combined_context
 
         context_text = "\n".join([r["text"] for r in combined_context]) if combined_context else ""
 
@@ -50,3 +64,19 @@ def predict(q: QuestionRequest):
                 answer = answer_with_context(query_canonical, context_text)
 
     return {"answer": answer}
+
+@app.post("/search_batch")
+def search_batch(req: BatchSearchRequest):
+    """Retrieval only, for offline evaluation: one embeddings request and one index pass for all questions."""
+    canonical = [map_to_canonical(normalize_question(q.strip())) for q in req.questions]
+    batch_results = msearch_batch(canonical, top_k=req.top_k)
+    return {"results": [
+        {
+            "question": q,
+            "canonical": c,
+            "chunks": [{"source": r.get("source", "doc"), "type": r.get("type", "paragraph"),
+                        "page": r.get("page"), "score": r.get("score"), "text": r.get("text", "")}
+                       for r in results]
+        }
+        for q, c, results in zip(req.questions, canonical, batch_results)
+    ]}
@@ -0,0 +1,153 @@
+import mmap
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from Chunk_Store import (ChunkStore, CHUNK_TYPES, OFFSETS_FILE, RECORDS_FILE, TYPES_FILE, migrate_pickle)
+
+
+def _vectors(n: int, dim: int = 4) -> np.ndarray:
+    v = np.arange(1, n * dim + 1, dtype=np.float32).reshape(n, dim)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _records(*texts, source="a.pdf"):
+    return [{"source": source, "text": t} for t in texts]
+
+
+def test_concurrent_readers_share_one_mapping(tmp_path, monkeypatch):
+    path = str(tmp_path / "chunks")
+    writer = ChunkStore(path)
+    writer.append(_records(*(f"chunk {i}" for i in range(200))), _vectors(200))
+    writer.commit()
+
+    real_mmap = mmap.mmap
+
+    def slow_mmap(*args, **kwargs):
+        time.sleep(0.02)  # widen the window between mapping the offsets and the records
+        return real_mmap(*args, **kwargs)
+
+    monkeypatch.setattr(mmap, "mmap", slow_mmap)
+    for _ in range(5):
+        store = ChunkStore(path)  # unmapped: every thread races to map it on first get
+        barrier = threading.Barrier(8)
+        errors, texts = [], []
+
+        def read():
+            barrier.wait()
+            try:
+                texts.append([store.get(r)["text"] for r in range(0, 200, 7)])
+                store.types()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert all(t == [f"chunk {r}" for r in range(0, 200, 7)] for t in texts)
+        store.close()
+
+
+def test_commit_publishes_rows(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    rows = store.append(_records("one", "two"), _vectors(2))
+    store.set_document("a.pdf", "/docs/a.pdf", rows)
+    assert len(store) == 0  # staged only
+    store.commit()
+
+    reopened = ChunkStore(str(tmp_path / "chunks"))
+    assert len(reopened) == 2
+    assert [r["text"] for r in reopened.get_many([0, 1])] == ["one", "two"]
+    assert reopened.dim == 4
+    np.testing.assert_allclose(reopened.vectors(), _vectors(2))
+    assert reopened.live_rows().tolist() == [0, 1]
+    assert reopened.row_document(1)["name"] == "a.pdf"
+
+
+def test_uncommitted_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "chunks")
+    store = ChunkStore(path)
+    store.append(_records("one"), _vectors(1))
+    store.commit()
+    committed = os.path.getsize(os.path.join(path, RECORDS_FILE))
+
+    crashed = ChunkStore(path)  # a batch that wrote rows, then died before its commit
+    crashed.append(_records("lost " * 50), _vectors(1))
+    crashed.flush()
+    assert os.path.getsize(os.path.join(path, RECORDS_FILE)) > committed
+
+    store = ChunkStore(path)
+    assert len(store) == 1
+    rows = store.append(_records("two"), _vectors(1))
+    assert rows == range(1, 2)
+    store.commit()
+
+    reopened = ChunkStore(path)
+    assert [r["text"] for r in reopened.get_many(range(len(reopened)))] == ["one", "two"]
+    assert os.path.getsize(os.path.join(path, OFFSETS_FILE)) == 2 * 8
+    assert reopened.vectors().shape == (2, 4)
+
+
+def test_replaced_document_returns_dead_rows(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    old = store.append(_records("one", "two"), _vectors(2))
+    assert len(store.set_document("a.pdf", "/a.pdf", old)) == 0
+    new = store.append(_records("two", "three"), _vectors(2))
+    assert store.set_document("a.pdf", "/a.pdf", new).tolist() == [0, 1]
+    store.commit()
+    assert store.live_rows().tolist() == [2, 3]
+    assert store.row_document(0) is None
+
+
+def test_columns_are_backfilled(tmp_path):
+    path = str(tmp_path / "chunks")
+    store = ChunkStore(path)
+    store.append([{"text": "[FIGURE] wiring", "page": 3}, {"text": "body", "type": "cdd_element"}])
+    store.commit()
+    os.remove(os.path.join(path, TYPES_FILE))  # a store written before the column existed
+
+    reopened = ChunkStore(path)
+    assert reopened.types().tolist() == [CHUNK_TYPES.index("figure_text"), CHUNK_TYPES.index("cdd_element")]
+    assert reopened.pages().tolist() == [3, -1]
+
+
+def test_migrate_pickle(tmp_path):
+    meta_path = str(tmp_path / "meta.pkl")
+    meta = _records("a1", "a2") + _records("b1", source="b.pdf") + _records("a3")  # a.pdf uploaded twice
+    with open(meta_path, "wb") as f:
+        pickle.dump(meta, f)
+
+    store = ChunkStore(str(tmp_path / "chunks"))
+    assert migrate_pickle(meta_path, store, _vectors(4)) == 4
+    reopened = ChunkStore(str(tmp_path / "chunks"))
+    assert len(reopened) == 4
+    assert reopened.live_rows().tolist() == [2, 3]  # the later upload of a.pdf supersedes the first
+    assert migrate_pickle(meta_path, reopened) == 0  # once only
+
+
+def test_write_over_another_writers_commit_fails(tmp_path):
+    path = str(tmp_path / "chunks")
+    first, second = ChunkStore(path), ChunkStore(path)
+    second.set_document("b.pdf", "/b.pdf", second.append(_records("committed by the other writer"), _vectors(1)))
+    second.commit()
+
+    first.append(_records("stale"), _vectors(1))
+    with pytest.raises(RuntimeError):
+        first.flush()  # would truncate the other writer's row
+    reopened = ChunkStore(path)
+    assert [r["text"] for r in reopened.get_many(range(len(reopened)))] == ["committed by the other writer"]
+
+    renaming = ChunkStore(path)
+    second.drop_document("b.pdf")
+    second.commit()
+    renaming.set_document("c.pdf", "/c.pdf", range(0, 1))
+    with pytest.raises(RuntimeError):
+        renaming.commit()  # would bring back the dropped document
+    assert ChunkStore(path).docs == {}
@@ -0,0 +1,72 @@
+import pytest
+
+import Data_Handler
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(Data_Handler.config, "CHUNK_SIZE", 10)
+    monkeypatch.setattr(Data_Handler.config, "CHUNK_OVERLAP", 4)
+    monkeypatch.setattr(Data_Handler.config, "MAX_CHUNKS_PER_FILE", 4000)
+
+
+def _words(spans) -> list:
+    return [s["text"].split() for s in spans]
+
+
+def test_long_section_is_split_into_overlapping_windows():
+    text = " ".join(f"w{i}" for i in range(25))
+    spans = Data_Handler.chunk_spans(text)
+    assert [s["tokens"] for s in spans] == [10, 10, 10, 7]
+    words = _words(spans)
+    assert [w[0] for w in words] == ["w0", "w6", "w12", "w18"]
+    assert all(a[-4:] == b[:4] for a, b in zip(words, words[1:]))  # CHUNK_OVERLAP tokens repeated
+
+
+def test_spans_are_offsets_into_the_text():
+    text = "  Intro line\n\n## Transmit\nCanIf_Transmit   requests a\ntransmission of an I-PDU \n"
+    for span in Data_Handler.chunk_spans(text):
+        assert text[span["start"]:span["end"]] == span["text"]
+        assert span["text"] == span["text"].strip()
+
+
+def test_sections_are_cut_at_headings_and_short_ones_packed():
+    first = "## Transmit\n" + " ".join(["a"] * 6)
+    second = "7.3 Reception\n" + " ".join(["b"] * 6)
+    assert [s["text"] for s in Data_Handler.chunk_spans(f"{first}\n{second}")] == [first, second]
+    assert [s["text"] for s in Data_Handler.chunk_spans("## A\nx\n## B\ny")] == ["## A\nx\n## B\ny"]
+    assert Data_Handler.chunk_spans("Not a heading here\n## B\ny", chunk_type="figure")[0]["start"] == 0
+    assert Data_Handler.chunk_spans("   ") == []
+
+
+def test_chunk_cap_applies_per_document(monkeypatch):
+    monkeypatch.setattr(Data_Handler.config, "MAX_CHUNKS_PER_FILE", 3)
+    read = []
+
+    def loader():
+        for i in range(4):
+            read.append(i)
+            yield {"text": " ".join(f"p{i}w{j}" for j in range(15)), "page": i + 1}
+
+    records = list(Data_Handler.iter_document_records(loader()))
+    assert [(r["page"], r["text"].split()[0]) for r in records] == [(1, "p0w0"), (1, "p0w6"), (2, "p1w0")]
+    assert read == [0, 1, 2, 3]  # the loader is still read to the end
+
+    short = [{"text": f"chunk {i}"} for i in range(5)]
+    assert len(Data_Handler.process_document_records(short)) == 3  # one span per loader chunk, capped in total
+
+
+def test_records_are_packed_up_to_the_type_limit():
+    records = [{"text": f"DID /Ecu/D{i}\nQUAL: D{i}", "type": "cdd_element", "page": None} for i in range(5)]
+    packed = list(Data_Handler.pack_records(records, "cdd_element"))  # 10 tokens, 4 per record plus separator
+    assert [p["text"].count("DID ") for p in packed] == [2, 2, 1]
+    assert packed[0]["text"] == "DID /Ecu/D0\nQUAL: D0\n\nDID /Ecu/D1\nQUAL: D1"  # never cut inside a record
+
+
+def test_oversized_record_is_split_at_lines_under_its_header():
+    record = {"text": "ECUC-CONTAINER-VALUE /EcuC/Big\n" + "\n".join(f"P{i} = {i}" for i in range(6)),
+              "type": "arxml_element"}
+    texts = [r["text"] for r in Data_Handler.iter_document_records([record])]
+    assert len(texts) > 1
+    assert all(t.startswith("ECUC-CONTAINER-VALUE /EcuC/Big\n") for t in texts)
+    assert [line for t in texts for line in t.split("\n")[1:]] == [f"P{i} = {i}" for i in range(6)]
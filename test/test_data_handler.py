@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+from openai import APIConnectionError, RateLimitError
+
+import Data_Handler
+from test.conftest import fake_embedding
+
+
+class FakeClient:
+    """Embeddings client that fails with the given errors first, then embeds the inputs."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.requests = []
+        self.embeddings = self
+
+    def create(self, input, **kwargs):
+        self.requests.append(list(input))
+        if self.errors:
+            raise self.errors.pop(0)
+        data = [SimpleNamespace(index=i, embedding=fake_embedding(t)) for i, t in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])  # the API does not promise input order
+
+
+def _rate_limited(retry_after=None) -> RateLimitError:
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = SimpleNamespace(request=None, status_code=429, headers=headers)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(*errors) -> FakeClient:
+        fake = FakeClient(*errors)
+        monkeypatch.setattr(Data_Handler, "_client", fake)
+        return fake
+    return install
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(Data_Handler.time, "sleep", delays.append)
+    return delays
+
+
+def test_pack_batches():
+    assert Data_Handler.pack_batches([3, 3, 3, 3], max_tokens=6) == [(0, 2), (2, 4)]
+    assert Data_Handler.pack_batches([1] * 5, max_tokens=100, max_inputs=2) == [(0, 2), (2, 4), (4, 5)]
+    assert Data_Handler.pack_batches([2, 10, 2], max_tokens=5) == [(0, 1), (1, 2), (2, 3)]  # oversized alone
+    assert Data_Handler.pack_batches([], max_tokens=5) == []
+
+
+def test_embed_batch_retries_transient_errors(client, sleeps):
+    fake = client(_rate_limited("2"), APIConnectionError(request=None))
+    assert Data_Handler._embed_batch(["a", "b"]) == [fake_embedding("a"), fake_embedding("b")]
+    assert len(fake.requests) == 3
+    assert sleeps[0] == 2.0  # the server's Retry-After
+    assert 0.5 <= sleeps[1] <= 3.0  # jittered backoff for the second attempt
+
+
+def test_embed_batch_gives_up_after_max_retries(client, sleeps, monkeypatch):
+    monkeypatch.setattr(Data_Handler.config, "EMBED_MAX_RETRIES", 2)
+    fake = client(*(_rate_limited() for _ in range(3)))
+    with pytest.raises(RateLimitError):
+        Data_Handler._embed_batch(["a"])
+    assert (len(fake.requests), len(sleeps)) == (3, 2)
+
+
+def test_embed_texts_keeps_input_order(client, monkeypatch):
+    monkeypatch.setattr(Data_Handler.config, "EMBED_BATCH_TOKENS", 4)
+    monkeypatch.setattr(Data_Handler.config, "EMBED_WORKERS", 3)
+    monkeypatch.setattr(Data_Handler, "EMBED_INPUT_TOKENS", 4)
+    fake = client()
+    texts = ["one two", "three", "four five six", "seven", "a b c d e f"]
+    vectors = Data_Handler.embed_texts(texts)
+    assert vectors[:4] == [fake_embedding(t) for t in texts[:4]]
+    assert vectors[4] == fake_embedding("a b c d")  # truncated to the input limit
+    assert sorted(fake.requests) == [["a b c d"], ["four five six", "seven"], ["one two", "three"]]
@@ -0,0 +1,76 @@
+import pytest
+
+from Document_Handler import CDD_ENCLOSING_TAGS, CDD_RECORD_TAGS, iter_xml_records
+
+ARXML = """<?xml version="1.0" encoding="UTF-8"?>
+<AUTOSAR xmlns="http://autosar.org/schema/r4.0">
+  <AR-PACKAGES>
+    <AR-PACKAGE>
+      <SHORT-NAME>ActiveEcuC</SHORT-NAME>
+      <ELEMENTS>
+        <ECUC-MODULE-CONFIGURATION-VALUES>
+          <SHORT-NAME>CanIf</SHORT-NAME>
+          <DEFINITION-REF DEST="ECUC-MODULE-DEF">/AUTOSAR/EcucDefs/CanIf</DEFINITION-REF>
+          <CONTAINERS>
+            <ECUC-CONTAINER-VALUE>
+              <SHORT-NAME>CanIfPublicCfg</SHORT-NAME>
+              <DEFINITION-REF DEST="ECUC-PARAM-CONF-CONTAINER-DEF">/AUTOSAR/EcucDefs/CanIf/CanIfPublicCfg</DEFINITION-REF>
+              <PARAMETER-VALUES>
+                <ECUC-NUMERICAL-PARAM-VALUE>
+                  <DEFINITION-REF DEST="ECUC-BOOLEAN-PARAM-DEF">/AUTOSAR/EcucDefs/CanIf/CanIfPublicCfg/CanIfPublicTxBuffering</DEFINITION-REF>
+                  <VALUE>true</VALUE>
+                </ECUC-NUMERICAL-PARAM-VALUE>
+              </PARAMETER-VALUES>
+            </ECUC-CONTAINER-VALUE>
+          </CONTAINERS>
+        </ECUC-MODULE-CONFIGURATION-VALUES>
+      </ELEMENTS>
+    </AR-PACKAGE>
+  </AR-PACKAGES>
+</AUTOSAR>
+"""
+
+CDD = """<CANDELA><ECUDOC><ECU id="e1"><QUAL>MyEcu</QUAL><VAR id="v"><QUAL>Var1</QUAL>
+<DIAGINST id="_1"><QUAL>ReadVin</QUAL><NAME><TUV xml:lang="en-US">Vehicle Identification Number</TUV></NAME>
+<SERVICE id="_2" func="1"><QUAL>Read</QUAL></SERVICE></DIAGINST>
+<DID id="d1" n="0xF190"><QUAL>VinDid</QUAL><STRUCTURE><DATAOBJ id="o1"><QUAL>VinChars</QUAL></DATAOBJ></STRUCTURE></DID>
+</VAR></ECU></ECUDOC></CANDELA>
+"""
+
+
+def _write(tmp_path, name: str, content: str) -> str:
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_arxml_records_are_named_by_short_name_path(tmp_path):
+    values = []
+    records = list(iter_xml_records(_write(tmp_path, "ecuc.arxml", ARXML), "ARXML", ecuc_values=values))
+    assert [(tag, header) for tag, header, _ in records] == [
+        ("ECUC-CONTAINER-VALUE", "ECUC-CONTAINER-VALUE /ActiveEcuC/CanIf/CanIfPublicCfg"),  # inner record first
+        ("ECUC-MODULE-CONFIGURATION-VALUES", "ECUC-MODULE-CONFIGURATION-VALUES /ActiveEcuC/CanIf"),
+    ]
+    assert "CanIfPublicTxBuffering = true" in records[0][2]
+    assert values == [("/ActiveEcuC/CanIf/CanIfPublicCfg",
+                       "/AUTOSAR/EcucDefs/CanIf/CanIfPublicCfg/CanIfPublicTxBuffering", "true")]
+
+
+def test_cdd_records_are_named_by_qual(tmp_path):
+    records = {header: lines for _, header, lines in
+               iter_xml_records(_write(tmp_path, "ecu.cdd", CDD), "CDD", CDD_RECORD_TAGS, CDD_ENCLOSING_TAGS)}
+    assert list(records) == [
+        "SERVICE /MyEcu/Var1/ReadVin/Read [id=_2, func=1]",
+        "DIAGINST /MyEcu/Var1/ReadVin [id=_1]",
+        "DID /MyEcu/Var1/VinDid [id=d1, n=0xF190]",
+        "VAR /MyEcu/Var1 [id=v]",
+        "ECU /MyEcu [id=e1]",
+    ]
+    assert "NAME/TUV: Vehicle Identification Number" in records["DIAGINST /MyEcu/Var1/ReadVin [id=_1]"]
+    # A data object inside a DID stays in the DID's record
+    assert "STRUCTURE/DATAOBJ/QUAL: VinChars" in records["DID /MyEcu/Var1/VinDid [id=d1, n=0xF190]"]
+
+
+def test_malformed_xml(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_xml_records(_write(tmp_path, "bad.arxml", "<AUTOSAR><AR-PACKAGES>"), "ARXML"))
@@ -0,0 +1,79 @@
+import pytest
+
+from Ecuc_Index import EcucIndex, answer_ecuc_query, ecuc_context, module_name
+
+DEFS = "/AUTOSAR/EcucDefs/CanIf"
+VALUES = [
+    ("/ActiveEcuC/CanIf/CanIfPublicCfg", f"{DEFS}/CanIfPublicCfg/CanIfPublicTxBuffering", "true"),
+    ("/ActiveEcuC/CanIf/CanIfPublicCfg", f"{DEFS}/CanIfPublicCfg/CanIfPublicReadRxPduDataApi", "false"),
+    ("/ActiveEcuC/CanIf/TxPdu_A", f"{DEFS}/CanIfInitCfg/CanIfTxPduCfg/CanIfTxPduId", "3"),
+    ("/ActiveEcuC/CanIf/TxPdu_B", f"{DEFS}/CanIfInitCfg/CanIfTxPduCfg/CanIfTxPduId", "4"),
+    ("/ActiveEcuC/CanIf", f"{DEFS}/CanIfGeneral", "x"),  # the module's own configuration
+]
+
+
+@pytest.fixture
+def ecuc(tmp_path):
+    index = EcucIndex(str(tmp_path / "ecuc.sqlite"))
+    index.update({"ecu.arxml": VALUES})
+    return index
+
+
+def test_module_name():
+    assert module_name(f"{DEFS}/CanIfPublicCfg") == "CanIf"
+    assert module_name("/MICROSAR/CanIf/CanIfPublicCfg") == "CanIf"
+
+
+def test_value_question(ecuc):
+    assert answer_ecuc_query(ecuc, "What is CanIfPublicTxBuffering set to?") == \
+        "- `/ActiveEcuC/CanIf/CanIfPublicCfg/CanIfPublicTxBuffering` = **true** (ecu.arxml)"
+    assert answer_ecuc_query(ecuc, "What is the value of canIfPublicTXBuffering?") is not None  # any case
+
+
+def test_value_question_in_named_container(ecuc):
+    assert answer_ecuc_query(ecuc, "Value of CanIfTxPduId in TxPdu_B?") == \
+        "- `/ActiveEcuC/CanIf/TxPdu_B/CanIfTxPduId` = **4** (ecu.arxml)"
+    assert answer_ecuc_query(ecuc, "Value of CanIfTxPduId?").count("CanIfTxPduId") == 2  # every container
+
+
+def test_container_question(ecuc):
+    answer = answer_ecuc_query(ecuc, "List the parameters of the container CanIfPublicCfg")
+    assert answer.split("\n") == [
+        "- `/ActiveEcuC/CanIf/CanIfPublicCfg/CanIfPublicTxBuffering` = **true** (ecu.arxml)",
+        "- `/ActiveEcuC/CanIf/CanIfPublicCfg/CanIfPublicReadRxPduDataApi` = **false** (ecu.arxml)"]
+    assert answer_ecuc_query(ecuc, "parameters of CanIf") is None  # never a whole module
+
+
+@pytest.mark.parametrize("query", [
+    "What does CanIfPublicTxBuffering mean?",  # names a parameter, but does not ask for its value
+    "What is the default value of CanIfPublicTxBuffering in the SWS?",  # what the specification allows
+    "What is CanIfUnknownParam set to?",
+    "",
+])
+def test_other_questions_fall_back_to_rag(ecuc, query):
+    assert answer_ecuc_query(ecuc, query) is None
+
+
+def test_context_for_rag_questions(ecuc):
+    context = ecuc_context(ecuc, "What does CanIfPublicTxBuffering mean?")
+    assert [(c["source"], c["type"]) for c in context] == [("ecu.arxml", "ecuc_value")]
+    assert "= **true**" in context[0]["text"]
+    assert ecuc_context(ecuc, "What is a PDU?") == []
+
+
+def test_staged_values_are_published_by_update(ecuc):
+    ecuc.stage("t1", "ecu.arxml", [("/ActiveEcuC/CanIf/TxPdu_A", VALUES[2][1], "7")])
+    ecuc.stage("t2", "ecu.arxml", [("/ActiveEcuC/CanIf/TxPdu_A", VALUES[2][1], "8")])  # an aborted batch
+    assert "**3**" in answer_ecuc_query(ecuc, "Value of CanIfTxPduId in TxPdu_A?")
+    ecuc.update({}, staged={"ecu.arxml": "t1"})
+    assert answer_ecuc_query(ecuc, "Value of CanIfTxPduId?") == \
+        "- `/ActiveEcuC/CanIf/TxPdu_A/CanIfTxPduId` = **7** (ecu.arxml)"  # replaces the source's values
+    ecuc.update({}, staged={"ecu.arxml": "t2"})
+    assert answer_ecuc_query(ecuc, "Value of CanIfTxPduId?") is None  # stale rows were dropped with t1's
+
+
+def test_structured_answer_uses_the_ecuc_index(db):
+    with db.IngestSession() as session:
+        session.add(["CanIfPublicCfg container"], None, "ecu.arxml", "/ecu.arxml", ecuc_values=VALUES)
+    assert db.structured_answer("What is CanIfPublicTxBuffering set to?").endswith("**true** (ecu.arxml)")
+    assert db.structured_context("What does CanIfPublicTxBuffering mean?")[0]["type"] == "ecuc_value"
@@ -0,0 +1,48 @@
+import itertools
+
+import pytest
+
+import Data_Handler
+import Embedding_Cache
+from Embedding_Cache import EmbeddingCache
+from test.conftest import fake_embedding
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1)
+    monkeypatch.setattr(Embedding_Cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_get_and_put(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get_many("m", 4, ["a"]) == [None]
+    cache.put_many("m", 4, ["a", "b"], [[1, 0, 0, 0], [0, 1, 0, 0]])
+    assert cache.get_many("m", 4, ["b", "x", "a", "b"]) == [[0, 1, 0, 0], None, [1, 0, 0, 0], [0, 1, 0, 0]]
+    assert cache.get_many("m", 8, ["a"]) == [None]  # keyed by the requested dimensions
+    assert cache.get_many("other", 4, ["a"]) == [None]  # and by the model
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_rows=10)
+    texts = [f"t{i}" for i in range(10)]
+    for t in texts:
+        cache.put_many("m", 1, [t], [[1.0]])
+    cache.get_many("m", 1, ["t0", "t1"])  # recently used again
+    cache.put_many("m", 1, ["new"], [[2.0]])  # 11 rows: evict down to 9
+
+    kept = [t for t, v in zip(texts + ["new"], cache.get_many("m", 1, texts + ["new"])) if v is not None]
+    assert kept == ["t0", "t1", "t4", "t5", "t6", "t7", "t8", "t9", "new"]
+
+
+def test_cached_embeds_only_distinct_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(Data_Handler, "_cache", EmbeddingCache(str(tmp_path / "cache.sqlite")))
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [fake_embedding(t) for t in texts]
+
+    assert Data_Handler._cached(["a", "b", "a"], None, embed) == [fake_embedding(t) for t in "aba"]
+    assert Data_Handler._cached(["b", "c"], None, embed) == [fake_embedding("b"), fake_embedding("c")]
+    assert calls == [["a", "b"], ["c"]]
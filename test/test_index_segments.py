@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from test.conftest import fake_embedding
+
+
+def _query(text: str) -> np.ndarray:
+    return np.asarray([fake_embedding(text)], dtype=np.float32)
+
+
+def _hits(db, text: str, top_k: int = 10, allowed=None) -> list:
+    segs, store = db.get_resident_index()
+    _, ids = db._search_segments(segs, store, _query(text), top_k, allowed)[0]
+    return [store.get(int(i))["text"] for i in ids]
+
+
+def test_new_rows_are_searchable_through_delta(db):
+    db.add_text_chunks(["a one", "a two"], None, "a.pdf", "/a.pdf")
+    segs, _ = db.get_resident_index()
+    assert segs.base is None
+    assert segs.delta.ntotal == 2
+    assert _hits(db, "a two")[0] == "a two"
+
+
+def test_compaction_folds_delta_into_base(db):
+    db.add_text_chunks(["a one", "a two"], None, "a.pdf", "/a.pdf")
+    assert db.compact_index() == 2
+    segs, _ = db.get_resident_index()
+    assert (segs.base.ntotal, segs.delta, segs.tombstones) == (2, None, None)
+
+    db.add_text_chunks(["b one"], None, "b.pdf", "/b.pdf")
+    segs, _ = db.get_resident_index()
+    assert (segs.base.ntotal, segs.delta.ntotal) == (2, 1)  # the base is not rewritten per upload
+    assert _hits(db, "b one")[0] == "b one"
+    assert _hits(db, "a one")[0] == "a one"
+
+    assert db.compact_index() == 3
+    segs, _ = db.get_resident_index()
+    assert (segs.base.ntotal, segs.delta) == (3, None)
+
+
+def test_deleted_rows_are_tombstoned_until_compaction(db):
+    db.add_text_chunks(["a one", "a two"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["b one"], None, "b.pdf", "/b.pdf")
+    db.compact_index()
+    db.delete_document("a.pdf")
+
+    segs, _ = db.get_resident_index()
+    assert segs.base.ntotal == 3
+    assert segs.tombstones.tolist() == [False, False, True]  # live-row bitmap masking the base
+    assert _hits(db, "a one") == ["b one"]
+
+    assert db.compact_index() == 1
+    segs, _ = db.get_resident_index()
+    assert (segs.base.ntotal, segs.tombstones) == (1, None)
+    assert _hits(db, "a one") == ["b one"]
+
+
+def test_needs_compaction(db, monkeypatch):
+    monkeypatch.setattr(db.config, "COMPACT_DELTA_ROWS", 2)
+    db.add_text_chunks(["a one"], None, "a.pdf", "/a.pdf")
+    assert db.needs_compaction(db.open_chunk_store())  # no base index yet
+    db.compact_index()
+    assert not db.needs_compaction(db.open_chunk_store())
+    db.add_text_chunks(["b one", "b two"], None, "b.pdf", "/b.pdf")
+    assert db.needs_compaction(db.open_chunk_store())
+
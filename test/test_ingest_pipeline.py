@@ -0,0 +1,142 @@
+import pytest
+
+from test.conftest import fake_embed_texts
+
+
+@pytest.fixture
+def pipeline(db, monkeypatch):
+    import Ingest_Pipeline
+    monkeypatch.setattr(Ingest_Pipeline, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(Ingest_Pipeline.config, "INGEST_WORKERS", 2)  # parsed in worker processes
+    return Ingest_Pipeline
+
+
+def _write(tmp_path, name: str, text: str) -> tuple:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path), name
+
+
+def _texts(db) -> list:
+    store = db.open_chunk_store()
+    return sorted(store.get(int(r))["text"] for r in store.live_rows())
+
+
+def test_ingest_paths_indexes_files(pipeline, db, tmp_path):
+    files = [_write(tmp_path, "a.txt", "CanIf transmit request"),
+             _write(tmp_path, "b.md", "## PduR\nrouting path"),
+             _write(tmp_path, "c.txt", "   "),
+             _write(tmp_path, "d.xyz", "unsupported")]
+    done = []
+    report = pipeline.ingest_paths(files, progress=lambda n, total, item: done.append((n, total)))
+    assert (report["files"], report["chunks"], report["failed"]) == (2, 2, 1)
+    assert sorted(done) == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert _texts(db) == ["## PduR\nrouting path", "CanIf transmit request"]
+    assert sorted(d["name"] for d in db.list_documents()) == ["a.txt", "b.md"]  # no entry for empty or failed files
+
+
+def test_unchanged_files_are_skipped(pipeline, db, tmp_path):
+    files = [_write(tmp_path, "a.txt", "alpha"), _write(tmp_path, "b.txt", "beta")]
+    pipeline.ingest_paths(files)
+    _write(tmp_path, "b.txt", "beta v2")
+    report = pipeline.ingest_paths(files)
+    assert (report["unchanged"], report["files"], report["chunks"]) == (1, 1, 1)
+    assert _texts(db) == ["alpha", "beta v2"]
+
+
+def test_rows_are_published_by_the_session_commit(pipeline, db, tmp_path):
+    with db.IngestSession() as session:
+        pipeline.ingest_paths([_write(tmp_path, "a.txt", "alpha")], session)
+        assert len(db.open_chunk_store()) == 0  # flushed to the data files, not in the manifest yet
+    assert _texts(db) == ["alpha"]
+
+
+def test_ingest_documents(pipeline, db, tmp_path):
+    paths = [_write(tmp_path, "a.txt", "alpha")[0], _write(tmp_path, "b.txt", "alpha")[0]]
+    assert db.ingest_documents(paths) == 1  # the repeated chunk is stored once
+    assert {d["name"]: d["chunks"] for d in db.list_documents()} == {"a.txt": 1, "b.txt": 1}
+
+
+# --------------------------
+# Streamed ARXML / CDD files
+# --------------------------
+def _arxml(values: dict) -> str:
+    containers = "".join(f"""
+            <ECUC-CONTAINER-VALUE>
+              <SHORT-NAME>{name}</SHORT-NAME>
+              <DEFINITION-REF DEST="ECUC-PARAM-CONF-CONTAINER-DEF">/AUTOSAR/EcucDefs/CanIf/CanIfTxPduCfg</DEFINITION-REF>
+              <PARAMETER-VALUES>
+                <ECUC-NUMERICAL-PARAM-VALUE>
+                  <DEFINITION-REF DEST="ECUC-INTEGER-PARAM-DEF">/AUTOSAR/EcucDefs/CanIf/CanIfTxPduCfg/CanIfTxPduId</DEFINITION-REF>
+                  <VALUE>{value}</VALUE>
+                </ECUC-NUMERICAL-PARAM-VALUE>
+              </PARAMETER-VALUES>
+            </ECUC-CONTAINER-VALUE>""" for name, value in values.items())
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<AUTOSAR xmlns="http://autosar.org/schema/r4.0">
+  <AR-PACKAGES><AR-PACKAGE><SHORT-NAME>ActiveEcuC</SHORT-NAME><ELEMENTS>
+        <ECUC-MODULE-CONFIGURATION-VALUES>
+          <SHORT-NAME>CanIf</SHORT-NAME>
+          <CONTAINERS>{containers}
+          </CONTAINERS>
+        </ECUC-MODULE-CONFIGURATION-VALUES>
+  </ELEMENTS></AR-PACKAGE></AR-PACKAGES>
+</AUTOSAR>
+"""
+
+
+CDD = """<CANDELA><ECUDOC><ECU id="e1"><QUAL>MyEcu</QUAL><VAR id="v"><QUAL>Var1</QUAL>
+<DID id="d1" n="0xF190"><QUAL>VinDid</QUAL></DID><DID id="d2" n="0xF18C"><QUAL>SerialDid</QUAL></DID>
+</VAR></ECU></ECUDOC></CANDELA>
+"""
+
+
+@pytest.fixture
+def parts(pipeline, db, monkeypatch):
+    """Record count of every part the session stages, by document name."""
+    monkeypatch.setattr(pipeline.config, "INGEST_PART_RECORDS", 2)
+    monkeypatch.setattr(pipeline.config, "CHUNK_SIZE", 20)  # about one ECUC container per chunk
+    staged = {}
+    add_part = db.IngestSession.add_part
+
+    def counting(self, chunks, *args, **kwargs):
+        staged.setdefault(kwargs["source_name"], []).append(len(chunks))
+        return add_part(self, chunks, *args, **kwargs)
+
+    monkeypatch.setattr(db.IngestSession, "add_part", counting)
+    return staged
+
+
+def _pdu_ids(db) -> dict:
+    from Ecuc_Index import EcucIndex
+    return {h["path"]: h["value"] for h in EcucIndex(db.ECUC_PATH).find_parameters(["CanIfTxPduId"])}
+
+
+def test_arxml_is_streamed_in_parts(parts, db, tmp_path):
+    values = {f"Pdu{i}": str(i) for i in range(7)}
+    path, _ = _write(tmp_path, "ecuc.arxml", _arxml(values))
+    _write(tmp_path, "notes.txt", "not an ARXML file")
+    added = db.ingest_arxml_files([path, str(tmp_path / "notes.txt")])
+
+    assert len(parts["ecuc.arxml"]) > 1 and max(parts["ecuc.arxml"]) <= 2
+    assert "notes.txt" not in parts
+    assert added == sum(parts["ecuc.arxml"]) == db.list_documents()[0]["chunks"]
+    assert _pdu_ids(db) == {f"/ActiveEcuC/CanIf/{name}": value for name, value in values.items()}
+    assert db.ingest_arxml_files([path]) == 0  # unchanged
+
+
+def test_failed_stream_keeps_previous_version(parts, db, tmp_path):
+    path, _ = _write(tmp_path, "ecuc.arxml", _arxml({"Pdu0": "0", "Pdu1": "1"}))
+    db.ingest_arxml_files([path])
+    before = _texts(db)
+
+    _write(tmp_path, "ecuc.arxml", _arxml({f"Pdu{i}": "9" for i in range(7)})[:-40])  # cut off mid-file
+    assert db.ingest_arxml_files([path]) == 0
+    assert _texts(db) == before
+    assert _pdu_ids(db) == {"/ActiveEcuC/CanIf/Pdu0": "0", "/ActiveEcuC/CanIf/Pdu1": "1"}
+
+
+def test_cdd_is_streamed(parts, pipeline, db, tmp_path):
+    report = pipeline.ingest_paths([_write(tmp_path, "ecu.cdd", CDD)])
+    assert (report["files"], report["failed"]) == (1, 0)
+    assert any("DID /MyEcu/Var1/VinDid" in t for t in _texts(db))
@@ -0,0 +1,200 @@
+import threading
+
+import pytest
+
+from test.conftest import fake_embedding
+
+
+def _texts(store, rows):
+    return sorted(store.get(int(r))["text"] for r in rows)
+
+
+def test_batch_is_published_once_on_exit(db):
+    with db.IngestSession() as session:
+        assert session.add(["alpha", "beta", "alpha"], None, "a.pdf", "/a.pdf", "h1") == 2
+        assert session.skipped == 1  # repeated within the document
+        session.add(["gamma"], None, "b.pdf", "/b.pdf", "h2")
+        assert len(db.open_chunk_store()) == 0  # nothing visible before the commit
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["alpha", "beta", "gamma"]
+    assert {d["name"]: d["chunks"] for d in db.list_documents()} == {"a.pdf": 2, "b.pdf": 1}
+
+
+def test_unchanged_document_is_detected(db):
+    with db.IngestSession() as session:
+        session.add(["alpha"], None, "a.pdf", "/a.pdf", "h1")
+    with db.IngestSession() as session:
+        assert session.is_unchanged("a.pdf", "h1")
+        assert not session.is_unchanged("a.pdf", "h2")
+        assert not session.is_unchanged("b.pdf", "h1")
+
+
+def test_exception_discards_batch(db):
+    db.add_text_chunks(["kept"], None, "a.pdf", "/a.pdf")
+    with pytest.raises(RuntimeError):
+        with db.IngestSession() as session:
+            session.add(["lost"], None, "b.pdf", "/b.pdf")
+            session.delete_document("a.pdf")
+            raise RuntimeError("parse failed")
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["kept"]
+    assert store.find_document("b.pdf") is None
+
+
+def test_given_embeddings_are_stored_normalized(db):
+    vector = [3.0] + [0.0] * 15
+    db.add_text_chunks(["alpha", "beta"], [vector, None], "a.pdf", "/a.pdf")
+    vectors = db.open_chunk_store().vectors()
+    assert vectors[0].tolist() == [1.0] + [0.0] * 15
+    assert vectors[1] == pytest.approx(fake_embedding("beta"), abs=1e-6)
+
+
+def test_replace_document(db):
+    db.add_text_chunks(["alpha", "beta"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["other"], None, "b.pdf", "/b.pdf")
+    db.replace_document(["gamma", "delta"], None, "a.pdf", "/v2/a.pdf", "h2")
+
+    store = db.open_chunk_store()
+    doc = store.find_document("a.pdf")
+    assert (doc["path"], doc["sha256"]) == ("/v2/a.pdf", "h2")
+    assert _texts(store, store.document_rows([doc])) == ["delta", "gamma"]
+    assert _texts(store, store.live_rows()) == ["delta", "gamma", "other"]
+
+
+def test_delete_document(db):
+    db.add_text_chunks(["alpha", "beta"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["other"], None, "b.pdf", "/b.pdf")
+    assert db.delete_document("a.pdf") == 2
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["other"]
+    assert [d["name"] for d in db.list_documents()] == ["b.pdf"]
+    assert db.delete_document("a.pdf") == 0
+    assert db.delete_document("missing.pdf") == 0
+
+
+def test_parts_become_document_on_finish(db):
+    with db.IngestSession() as session:
+        session.add(["v1 part"], None, "big.arxml", "/big.arxml", "h1")
+    with db.IngestSession() as session:
+        session.add_part(["part one"], None, "big.arxml", "/big.arxml")
+        session.add(["other"], None, "b.pdf", "/b.pdf")
+        session.add_part(["part two"], None, "big.arxml", "/big.arxml")
+        session.finish_document("big.arxml", "h2")
+        assert session.removed == 1  # "v1 part"
+
+    store = db.open_chunk_store()
+    doc = store.find_document("big.arxml")
+    assert doc["sha256"] == "h2"
+    assert _texts(store, store.document_rows([doc])) == ["part one", "part two"]
+    assert {d["name"] for d in db.list_documents()} == {"big.arxml", "b.pdf"}
+
+
+def test_aborted_parts_keep_previous_version(db):
+    with db.IngestSession() as session:
+        session.add(["v1 part"], None, "big.arxml", "/big.arxml", "h1")
+    with db.IngestSession() as session:
+        session.add_part(["half written"], None, "big.arxml", "/big.arxml")
+        session.abort_document("big.arxml")
+        session.add_part(["never finished"], None, "c.arxml", "/c.arxml")  # dropped by commit
+
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["v1 part"]
+    assert store.find_document("big.arxml")["sha256"] == "h1"
+    assert {d["name"] for d in db.list_documents()} == {"big.arxml"}
+
+
+def test_reupload_keeps_unchanged_rows(db):
+    with db.IngestSession() as session:
+        session.add(["alpha", "beta", "gamma"], None, "a.pdf", "/a.pdf", "h1")
+    with db.IngestSession() as session:
+        added = session.add(["alpha", "beta", "delta"], None, "a.pdf", "/a.pdf", "h2")
+        assert (added, session.removed) == (1, 1)  # only "delta" is new, only "gamma" is gone
+
+    store = db.open_chunk_store()
+    assert store.live_rows().tolist() == [0, 1, 3]
+    assert all(store.row_document(r)["name"] == "a.pdf" for r in store.live_rows())
+    assert db.list_documents()[0]["chunks"] == 3  # two of them shared with the previous version
+
+
+def test_shared_row_lives_until_last_owner_is_deleted(db):
+    db.add_text_chunks(["common", "only a"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["common", "only b"], None, "b.pdf", "/b.pdf")
+    assert len(db.open_chunk_store()) == 3  # "common" is stored once
+    assert {d["name"]: d["chunks"] for d in db.list_documents()} == {"a.pdf": 2, "b.pdf": 2}
+
+    assert db.delete_document("a.pdf") == 1  # "only a"; "common" is still b.pdf's
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["common", "only b"]
+    assert store.row_document(0)["name"] == "b.pdf"
+
+    assert db.delete_document("b.pdf") == 2
+    assert len(db.open_chunk_store().live_rows()) == 0
+
+
+def test_shared_row_is_attributed_to_live_owner(db):
+    db.add_text_chunks(["common text"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["common text", "b text"], None, "b.pdf", "/b.pdf")
+    db.delete_document("a.pdf")
+    results = db.msearch("common text", top_k=1, min_score=0, token_budget=0)
+    assert [(r["text"], r["source"], r["path"]) for r in results] == [("common text", "b.pdf", "/b.pdf")]
+
+
+def test_sessions_wait_for_the_writer_lock(db):
+    finished = threading.Event()
+
+    def other_writer():
+        with db.IngestSession() as other:
+            other.add(["from thread"], None, "b.pdf", "/b.pdf")
+        finished.set()
+
+    with db.IngestSession() as session:
+        session.add(["from main"], None, "a.pdf", "/a.pdf")
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        assert not finished.wait(0.3)  # blocked until this session commits
+    thread.join(5)
+    assert finished.is_set()
+
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["from main", "from thread"]
+    assert {d["name"] for d in db.list_documents()} == {"a.pdf", "b.pdf"}
+
+
+def test_failed_session_releases_the_writer_lock(db):
+    with pytest.raises(RuntimeError):
+        with db.IngestSession() as session:
+            session.add(["lost"], None, "a.pdf", "/a.pdf")
+            raise RuntimeError("parse failed")
+    db.add_text_chunks(["kept"], None, "b.pdf", "/b.pdf")  # would block forever if the lock were still held
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["kept"]
+
+
+def test_session_reopens_after_commit(db):
+    session = db.IngestSession()
+    session.add(["first"], None, "a.pdf", "/a.pdf")
+    session.commit()
+    db.add_text_chunks(["between"], None, "b.pdf", "/b.pdf")  # another writer commits meanwhile
+    session.add(["second"], None, "c.pdf", "/c.pdf")
+    session.commit()
+    store = db.open_chunk_store()
+    assert _texts(store, store.live_rows()) == ["between", "first", "second"]
+
+
+def test_ecuc_values_are_published_with_the_document(db):
+    from Ecuc_Index import EcucIndex
+    ecuc = EcucIndex(db.ECUC_PATH)
+    value = ("/ActiveEcuC/CanIf/CanIfPublicCfg", "/AUTOSAR/EcucDefs/CanIf/CanIfPublicCfg/CanIfPublicTxBuffering")
+    with db.IngestSession() as session:
+        session.add_part(["part one"], None, "a.arxml", "/a.arxml", ecuc_values=[(*value, "true")])
+        assert ecuc.find_parameters(["CanIfPublicTxBuffering"]) == []  # staged only
+        session.finish_document("a.arxml", "h1")
+    assert [h["value"] for h in ecuc.find_parameters(["CanIfPublicTxBuffering"])] == ["true"]
+
+    with db.IngestSession() as session:
+        session.add_part(["part two"], None, "a.arxml", "/a.arxml", ecuc_values=[(*value, "false")])
+        session.abort_document("a.arxml")
+    assert [h["value"] for h in ecuc.find_parameters(["CanIfPublicTxBuffering"])] == ["true"]
+
+    db.delete_document("a.arxml")
+    assert ecuc.find_parameters(["CanIfPublicTxBuffering"]) == []
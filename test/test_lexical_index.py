@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from Chunk_Store import ChunkStore
+from Lexical_Index import LexicalIndex, match_expression, query_identifiers, query_terms, reciprocal_rank_fusion
+
+
+def _store(path, *texts) -> ChunkStore:
+    store = ChunkStore(str(path / "chunks"))
+    store.set_document("a.pdf", "/a.pdf", store.append([{"text": t} for t in texts]))
+    store.commit()
+    return store
+
+
+def test_query_terms_and_identifiers():
+    assert query_terms("What is the CanIf_Transmit return value?") == ["canif", "transmit", "return", "value"]
+    assert match_expression("the CanIf") == '"canif"'
+    assert query_identifiers("Is CanControllerFdBaudrateConfig used by CanIf_Transmit?") == \
+        ["CanControllerFdBaudrateConfig", "CanIf_Transmit"]
+
+
+def test_sync_and_search(tmp_path):
+    store = _store(tmp_path, "CanIf_Transmit requests a transmission", "PduR routes I-PDUs",
+                   "CanControllerFdBaudrateConfig sets the FD rate")
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    assert lexical.sync(store) == 3
+    assert lexical.sync(store) == 0  # incremental
+    assert lexical.indexed_rows() == 3
+
+    _, ids = lexical.search("CanControllerFdBaudrateConfig", 5)
+    assert ids.tolist() == [2]
+    _, ids = lexical.search("CanIf transmission routes", 5)
+    assert sorted(ids.tolist()) == [0, 1]
+    allowed = np.array([False, True, True])
+    assert lexical.search("CanIf transmission routes", 5, allowed)[1].tolist() == [1]
+    assert lexical.search("the of", 5)[1].tolist() == []  # stopwords only
+
+
+def test_sync_drops_removed_rows(tmp_path):
+    store = _store(tmp_path, "CanIf_Transmit", "PduR_Transmit")
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    lexical.sync(store)
+    lexical.sync(store, np.array([0]))
+    assert lexical.search("transmit", 5)[1].tolist() == [1]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([np.array([3, 1, 2]), np.array([2, 4])], k=60)
+    assert fused[2] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[3] == pytest.approx(1 / 61)
+    assert sorted(fused, key=fused.get, reverse=True)[:2] == [2, 3]
+
+
+def test_hybrid_search_ranks_exact_identifier_first(db, monkeypatch):
+    monkeypatch.setattr(db.config, "MODULE_ROUTING", False)
+    noise = [f"general text about topic {i}" for i in range(30)]
+    db.add_text_chunks(noise + ["CanControllerFdBaudrateConfig sets the FD data rate"], None, "a.pdf", "/a.pdf")
+    query = "Which CanControllerFdBaudrateConfig?"
+
+    monkeypatch.setattr(db.config, "HYBRID_SEARCH", True)
+    results = db.msearch(query, top_k=1, min_score=-1, token_budget=0)
+    assert results[0]["text"].startswith("CanControllerFdBaudrateConfig")
+    assert results[0]["score"] == pytest.approx(
+        float(np.dot(db.open_chunk_store().vectors()[30], np.asarray(db.embed_query(query), dtype=np.float32))),
+        abs=1e-5)  # scores stay cosine similarities
+
+    monkeypatch.setattr(db.config, "HYBRID_SEARCH", False)  # dense only: the fake embeddings ignore words
+    results = db.msearch(query, top_k=1, min_score=-1, token_budget=0)
+    assert not results[0]["text"].startswith("CanControllerFdBaudrateConfig")
+
+
+def test_hybrid_search_skips_deleted_rows(db):
+    db.add_text_chunks(["CanIf_Transmit old"], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks(["unrelated"], None, "b.pdf", "/b.pdf")
+    db.delete_document("a.pdf")
+    results = db.msearch("CanIf_Transmit", top_k=5, min_score=-1, token_budget=0)
+    assert [r["text"] for r in results] == ["unrelated"]
+
+
+def test_stale_snapshot_keeps_newer_rows(tmp_path):
+    path = str(tmp_path / "chunks")
+    writer = ChunkStore(path)
+    writer.set_document("a.pdf", "/a.pdf", writer.append([{"text": "CanIf_Transmit"}, {"text": "PduR_Transmit"}]))
+    writer.commit()
+    snapshot = ChunkStore(path)  # e.g. taken by a background compaction
+    writer.set_document("b.pdf", "/b.pdf", writer.append([{"text": "Com_SendSignal"}]))
+    writer.commit()
+
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    assert lexical.sync(writer) == 3
+    assert lexical.sync(snapshot) == 0
+    assert lexical.indexed_rows() == 3
+    assert lexical.search("Com_SendSignal", 5)[1].tolist() == [2]
+
+
+def test_recreated_store_is_indexed_from_scratch(tmp_path):
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    lexical.sync(_store(tmp_path / "old", "CanIf_Transmit", "PduR_Transmit", "Com_SendSignal"))
+    assert lexical.sync(_store(tmp_path / "new", "Dem_SetEventStatus")) == 1
+    assert lexical.indexed_rows() == 1
+    assert lexical.search("transmit", 5)[1].tolist() == []
+    assert lexical.search("Dem_SetEventStatus", 5)[1].tolist() == [0]
+
+
+def test_dead_rows_are_not_indexed(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    store.set_document("a.pdf", "/a.pdf", store.append([{"text": "CanIf_Transmit"}]))
+    store.set_document("a.pdf", "/a.pdf", store.append([{"text": "PduR_Transmit"}]))  # replaced in the same batch
+    store.commit()
+    lexical = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    assert lexical.sync(store) == 1
+    assert lexical.search("transmit", 5)[1].tolist() == [1]
+
+
+def test_background_compaction_keeps_lexical_rows(db):
+    db.add_text_chunks([f"chunk {i}" for i in range(10)], None, "a.pdf", "/a.pdf")
+    snapshot = db.open_chunk_store()  # what a compaction that starts now works on
+    db.add_text_chunks(["Com_SendSignal sends a signal"], None, "b.pdf", "/b.pdf")  # committed meanwhile
+    db.delete_document("a.pdf")
+
+    real_open = db.open_chunk_store
+    db.open_chunk_store = lambda: snapshot
+    try:
+        db.compact_index()
+    finally:
+        db.open_chunk_store = real_open
+    assert db._resident.lexical().indexed_rows() == 11
+    results = db.msearch("Com_SendSignal", top_k=5, min_score=-1, token_budget=0)
+    assert [r["text"] for r in results] == ["Com_SendSignal sends a signal"]
+    assert db._resident.lexical().search("chunk", 20)[1].tolist() == []  # deleted rows stay out
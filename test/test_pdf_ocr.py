@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+import Document_Handler
+from OCR_Cache import OCRCache
+
+
+class FakePage:
+    def __init__(self, text: str, images: list):
+        self.text, self.images = text, images  # images: (xref, width, height)
+
+    def get_text(self, kind: str) -> str:
+        return self.text
+
+    def get_images(self, full: bool = False) -> list:
+        return [(xref, 0, width, height) for xref, width, height in self.images]
+
+
+class FakePdf:
+    """The PyMuPDF calls load_pdf makes, on pages with images given by xref."""
+    def __init__(self, pages: list, blobs: dict):
+        self.pages, self.blobs = pages, blobs
+        self.extracted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def extract_image(self, xref: int) -> dict:
+        self.extracted.append(xref)
+        return {"image": self.blobs[xref]}
+
+
+@pytest.fixture
+def ocr(tmp_path, monkeypatch):
+    """OCR'd image bytes, in call order; the OCR 'reads' the image bytes as text."""
+    calls = []
+
+    def fake_ocr(image_bytes: bytes) -> str:
+        calls.append(image_bytes)
+        return image_bytes.decode()
+
+    monkeypatch.setattr(Document_Handler, "_ocr_bytes", fake_ocr)
+    monkeypatch.setattr(Document_Handler, "_ocr_cache", OCRCache(str(tmp_path / "ocr_cache.sqlite")))
+    monkeypatch.setattr(Document_Handler.config, "OCR_WORKERS", 1)
+    monkeypatch.setattr(Document_Handler.config, "OCR_MIN_SIZE", 100)
+    return calls
+
+
+def _load(monkeypatch, pdf: FakePdf) -> list:
+    monkeypatch.setattr(Document_Handler, "fitz", SimpleNamespace(open=lambda path: pdf))
+    return Document_Handler.load_pdf("/docs/a.pdf")["chunks"]
+
+
+def _pdf() -> FakePdf:
+    pages = [FakePage("page one", [(1, 400, 300), (2, 40, 300)]),  # 2: too narrow to hold text
+             FakePage("", [(1, 400, 300), (3, 200, 200)]),  # 1 again: a logo on every page
+             FakePage("page three", [(4, 200, 200)])]  # same pixels as 3
+    return FakePdf(pages, {1: b"logo", 2: b"rule", 3: b"wiring", 4: b"wiring"})
+
+
+def test_figures_are_ocrd_once_per_distinct_image(ocr, monkeypatch):
+    pdf = _pdf()
+    chunks = _load(monkeypatch, pdf)
+    assert sorted(pdf.extracted) == [1, 3, 4]  # the small image is skipped by its size alone
+    assert sorted(ocr) == [b"logo", b"wiring"]
+    assert [(c["type"], c["page"], c["text"]) for c in chunks] == [
+        ("paragraph", 1, "page one"), ("paragraph", 3, "page three"),
+        ("figure_text", 1, "[FIGURE] logo"), ("figure_text", 2, "[FIGURE] wiring")]
+
+
+def test_ocr_results_come_from_the_cache(ocr, monkeypatch):
+    first = _load(monkeypatch, _pdf())
+    ocr.clear()
+    assert _load(monkeypatch, _pdf()) == first
+    assert ocr == []
+
+
+def test_images_without_text_are_cached_too(ocr, monkeypatch):
+    monkeypatch.setattr(Document_Handler, "_ocr_bytes", lambda b: ocr.append(b) or "")
+    pdf = FakePdf([FakePage("text", [(1, 400, 300)])], {1: b"photo"})
+    assert [c["type"] for c in _load(monkeypatch, pdf)] == ["paragraph"]
+    _load(monkeypatch, pdf)
+    assert ocr == [b"photo"]
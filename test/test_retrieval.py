@@ -0,0 +1,81 @@
+import pytest
+
+import config
+import Database_Handler as DH
+
+
+@pytest.fixture(autouse=True)
+def cutoffs(monkeypatch):
+    monkeypatch.setattr(config, "SIMILARITY_THRESHOLD", 0.35)
+    monkeypatch.setattr(config, "SCORE_GAP", 0.08)
+    monkeypatch.setattr(config, "MIN_RESULTS", 2)
+    monkeypatch.setattr(config, "MMR_RERANK", False)
+
+
+def _results(*scores, text="some chunk text"):
+    return [{"id": i, "score": s, "text": text} for i, s in enumerate(scores)]
+
+
+def _ids(results) -> list:
+    return [r["id"] for r in results]
+
+
+def test_similarity_threshold():
+    assert _ids(DH.apply_cutoffs(_results(0.6, 0.58, 0.3), "query", token_budget=0)) == [0, 1]
+    assert _ids(DH.apply_cutoffs(_results(0.6, 0.58, 0.3), "query", min_score=0.59, token_budget=0)) == [0]
+
+
+def test_score_gap_keeps_min_results():
+    # The 0.2 drop after the first result is within MIN_RESULTS; the next one cuts
+    results = _results(0.9, 0.7, 0.69, 0.5, 0.49)
+    assert _ids(DH.apply_cutoffs(results, "query", token_budget=0)) == [0, 1, 2]
+
+
+def test_score_gap_disabled(monkeypatch):
+    monkeypatch.setattr(config, "SCORE_GAP", 0)
+    results = _results(0.9, 0.7, 0.69, 0.5, 0.49)
+    assert _ids(DH.apply_cutoffs(results, "query", token_budget=0)) == [0, 1, 2, 3, 4]
+
+
+def test_exact_identifier_passes_score_cutoffs():
+    results = _results(0.9, 0.85, 0.3) + [{"id": 3, "score": 0.1, "text": "CanIf_Transmit returns E_OK"}]
+    assert _ids(DH.apply_cutoffs(results, "what does CanIf_Transmit return", token_budget=0)) == [0, 1, 3]
+
+
+def test_token_budget():
+    results = _results(0.9, 0.89, 0.88, text="five words in this chunk")  # 5 tokens for the word encoder
+    assert _ids(DH.apply_cutoffs(results, "query", token_budget=12)) == [0, 1]
+    # The first chunk is kept even if it alone exceeds the budget
+    assert _ids(DH.apply_cutoffs(results, "query", token_budget=3)) == [0]
+
+
+def test_msearch_applies_cutoffs(db):
+    db.add_text_chunks(["alpha chunk", "beta chunk"], None, "a.pdf", "/a.pdf")
+    assert [r["text"] for r in db.msearch("alpha chunk", top_k=5)] == ["alpha chunk"]  # beta is far below 0.35
+
+
+# --------------------------
+# MMR re-ranking
+# --------------------------
+@pytest.fixture
+def near_duplicates(db):
+    def unit(*xs):
+        return list(xs) + [0.0] * (16 - len(xs))
+    db.add_text_chunks(["spec text", "spec text, repeated", "other topic", "fourth"],
+                       [unit(1.0), unit(0.99, 0.14), unit(0.0, 1.0), unit(0.0, 0.0, 1.0)], "a.pdf", "/a.pdf")
+    return [{"id": i, "score": s, "text": t} for i, (s, t) in
+            enumerate([(0.9, "spec text"), (0.89, "spec text, repeated"), (0.8, "other topic"), (0.5, "fourth")])]
+
+
+def test_mmr_moves_near_duplicates_back(db, near_duplicates):
+    assert _ids(DH.mmr_rerank(near_duplicates, lambda_=0.7)) == [0, 2, 3, 1]  # the near duplicate sinks to the end
+    assert _ids(DH.mmr_rerank(near_duplicates, lambda_=1.0)) == [0, 1, 2, 3]  # relevance only
+    assert _ids(DH.mmr_rerank(near_duplicates, lambda_=0.7, top_n=2)) == [0, 2]
+    assert _ids(DH.mmr_rerank(near_duplicates[:2], lambda_=0.7)) == [0, 1]  # too few to diversify
+
+
+def test_cutoffs_run_mmr_before_the_token_budget(db, near_duplicates, monkeypatch):
+    monkeypatch.setattr(config, "MMR_LAMBDA", 0.7)
+    monkeypatch.setattr(config, "SCORE_GAP", 0)
+    assert _ids(DH.apply_cutoffs(near_duplicates, "query", token_budget=4, mmr=True)) == [0, 2]
+    assert _ids(DH.apply_cutoffs(near_duplicates, "query", token_budget=4, mmr=False)) == [0]
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from test.conftest import fake_embedding
+
+
+def test_resident_index_is_reused_until_the_store_changes(db):
+    db.add_text_chunks(["CanIf transmit request", "PduR routing path"], None, "a.pdf", "/a.pdf")
+    index, store = db.get_resident_index()
+    assert db.get_resident_index() == (index, store)  # served from memory
+
+    db.add_text_chunks(["Com signal group"], None, "b.pdf", "/b.pdf")
+    _, reloaded = db.get_resident_index()
+    assert reloaded is not store
+    assert len(reloaded) == 3
+
+
+def test_msearch_finds_chunk(db):
+    db.add_text_chunks(["CanIf transmit request", "PduR routing path"], None, "a.pdf", "/a.pdf")
+    results = db.msearch("PduR routing path", top_k=1, min_score=0, token_budget=0)
+    assert [(r["text"], r["source"]) for r in results] == [("PduR routing path", "a.pdf")]
+
+
+def test_msearch_on_empty_collection(db):
+    assert db.msearch("PduR routing path") == []
+
+
+# --------------------------
+# Module routing
+# --------------------------
+def test_route_query_and_document_module():
+    from Module_Router import detect_document_module, route_query
+    assert route_query("How does CanIf_Transmit reach the PduR?") == ["CANIF", "PDUR"]
+    assert route_query("What is a watchdog?") == []
+    assert detect_document_module("AUTOSAR_SWS_CANInterface.pdf") == "CANIF"
+    assert detect_document_module("notes.pdf", "The PDU Router forwards I-PDUs") == "PDUR"
+
+
+@pytest.fixture
+def modules(db):
+    db.add_text_chunks(["canif one", "canif two"], None, "AUTOSAR_SWS_CANInterface.pdf", "/canif.pdf")
+    db.add_text_chunks(["pdur one", "pdur two", "pdur three"], None, "AUTOSAR_SWS_PDURouter.pdf", "/pdur.pdf")
+    return db
+
+
+def _routed(db, text: str, top_k: int, modules: list) -> list:
+    segs, store = db.get_resident_index()
+    _, ids = db.search_routed(segs, store, np.asarray([fake_embedding(text)], dtype=np.float32), top_k, modules)
+    return [store.get(int(i))["text"] for i in ids]
+
+
+@pytest.mark.parametrize("compacted", [False, True])
+def test_routed_search_is_restricted_to_module_rows(modules, compacted):
+    if compacted:
+        modules.compact_index()  # routed through a bitmap selector on the base index, not the delta only
+    assert sorted(_routed(modules, "pdur one", 2, ["CANIF"])) == ["canif one", "canif two"]
+    assert _routed(modules, "pdur one", 2, ["PDUR"])[0] == "pdur one"
+
+
+def test_routed_search_tops_up_from_other_modules(modules):
+    hits = _routed(modules, "pdur one", 4, ["CANIF"])
+    assert sorted(hits[:2]) == ["canif one", "canif two"]  # the module's chunks first
+    assert hits[2] == "pdur one"
+    assert _routed(modules, "pdur one", 2, ["DEM"])[0] == "pdur one"  # no chunks: unrestricted
+
+
+def test_msearch_routes_by_question(modules, monkeypatch):
+    monkeypatch.setattr(modules.config, "HYBRID_SEARCH", False)  # BM25 matches are not routed
+    results = modules.msearch("What does the CanIf do?", top_k=2, min_score=-1, token_budget=0)
+    assert {r["module"] for r in results} == {"CANIF"}
+    results = modules.msearch("What does the CanIf do?", top_k=3, modules=["PDUR"], min_score=-1, token_budget=0)
+    assert {r["module"] for r in results} == {"PDUR"}
+
+
+# --------------------------
+# Metadata filters
+# --------------------------
+@pytest.fixture
+def filtered(db):
+    db.add_text_chunks([{"text": "para p1", "type": "paragraph", "page": 1},
+                        {"text": "fig p1", "type": "figure_text", "page": 1},
+                        {"text": "fig p2", "type": "figure_text", "page": 2}], None, "a.pdf", "/a.pdf")
+    db.add_text_chunks([{"text": "b para p1", "type": "paragraph", "page": 1}], None, "b.pdf", "/b.pdf")
+    db.add_text_chunks(["msg"], None, "c.dbc", "/c.dbc")
+    return db
+
+
+def _matching(db, filters: dict) -> list:
+    _, store = db.get_resident_index()
+    return sorted(store.get(int(r))["text"] for r in np.flatnonzero(db.filter_mask(store, filters)))
+
+
+def test_filter_by_type_alias_and_page(filtered):
+    assert _matching(filtered, {"type": "figure"}) == ["fig p1", "fig p2"]
+    assert _matching(filtered, {"page": 1}) == ["b para p1", "fig p1", "para p1"]
+    assert _matching(filtered, {"type": "figure", "page": 1}) == ["fig p1"]  # attributes are AND-ed
+
+
+def test_filter_values_are_ored(filtered):
+    assert _matching(filtered, {"source": ["b.pdf", "c.dbc"]}) == ["b para p1", "msg"]
+    assert _matching(filtered, {"source": "a.pdf", "page": [2, 3]}) == ["fig p2"]
+    assert _matching(filtered, {"source": "missing.pdf"}) == []
+
+
+def test_filter_excludes_dead_rows(filtered):
+    filtered.delete_document("a.pdf")
+    assert _matching(filtered, {"page": 1}) == ["b para p1"]
+    assert _matching(filtered, {}) == ["b para p1", "msg"]
+
+
+def test_unknown_filter(filtered):
+    _, store = filtered.get_resident_index()
+    with pytest.raises(ValueError):
+        filtered.filter_mask(store, {"color": "red"})
+
+
+@pytest.mark.parametrize("exact_max", [0, 2048])  # through the FAISS ID selector, or scored exactly
+def test_filtered_search(filtered, monkeypatch, exact_max):
+    monkeypatch.setattr(filtered, "FILTER_EXACT_MAX", exact_max)
+    filtered.compact_index()
+    results = filtered.msearch("para p1", top_k=5, filters={"type": "figure"}, min_score=-1, token_budget=0)
+    assert sorted(r["text"] for r in results) == ["fig p1", "fig p2"]
+
+
+# --------------------------
+# Batched search
+# --------------------------
+def test_msearch_batch_matches_single_searches(modules):
+    modules.add_text_chunks([{"text": "CanIf_Transmit figure", "type": "figure_text", "page": 4}], None,
+                            "AUTOSAR_SWS_CANInterface_figures.pdf", "/fig.pdf")
+    modules.compact_index()
+    modules.add_text_chunks(["delta row about PduR"], None, "notes.pdf", "/notes.pdf")  # in the delta segment
+    queries = ["What does the CanIf do?", "pdur two", "", "CanIf_Transmit", "PduR routing table", "   "]
+    for filters in (None, {"type": "figure"}):
+        batch = modules.msearch_batch(queries, top_k=3, filters=filters, min_score=-1, token_budget=0)
+        assert len(batch) == len(queries)
+        assert all(batch[qi] for qi in (0, 1, 3, 4))
+        for query, results in zip(queries, batch):
+            single = modules.msearch(query, top_k=3, filters=filters, min_score=-1, token_budget=0) \
+                if query.strip() else []
+            assert [(r["id"], pytest.approx(r["score"], abs=1e-5)) for r in results] == \
+                [(r["id"], r["score"]) for r in single]
+    assert modules.msearch_batch(["", " "]) == [[], []]
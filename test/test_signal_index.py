@@ -0,0 +1,77 @@
+import pytest
+
+from Signal_Index import SignalIndex, answer_signal_query, lookup_subjects
+
+
+def _signal(name: str, start: int, **fields) -> dict:
+    return {"name": name, "start": start, "length": 8, "byte_order": "little_endian", "is_signed": False,
+            "scale": 1, "offset": 0, "minimum": 0, "maximum": 255, "unit": None, "choices": None, "comment": None,
+            **fields}
+
+
+MESSAGES = [
+    {"name": "VehicleStatus", "frame_id": 0x1A0, "length": 8, "senders": "ECU1",
+     "signals": [_signal("EngineTemp", 16, scale=0.5, offset=-40, unit="degC"),
+                 _signal("VehicleSpeed", 0, length=16, scale=0.01, maximum=655.35, unit="km/h")]},
+    {"name": "Status", "frame_id": 0x2B0, "length": 1, "senders": None,
+     "signals": [_signal("Mode", 0, length=2, choices="{0: 'Off', 1: 'On'}")]},
+]
+
+
+@pytest.fixture
+def signals(tmp_path):
+    index = SignalIndex(str(tmp_path / "signals.sqlite"))
+    index.update({"car.dbc": MESSAGES})
+    return index
+
+
+def test_lookup_subjects():
+    assert "VehicleSpeed" in lookup_subjects("What is the start bit and scale of VehicleSpeed?")
+    assert lookup_subjects("VehicleSpeed start bit") == ["VehicleSpeed"]
+    assert lookup_subjects("signals of the message 0x1A0") == ["0x1A0"]
+    assert lookup_subjects("Explain how VehicleSpeed is used") == []
+
+
+def test_signal_answer(signals):
+    answer = answer_signal_query(signals, "What is the start bit and scale of VehicleSpeed?")
+    assert answer == ("- **VehicleSpeed** (message VehicleStatus, ID 0x1a0, car.dbc): start bit 0, length 16 bits, "
+                      "little_endian, unsigned, scale 0.01, offset 0, range [0, 655.35] km/h")
+    assert "message VehicleStatus" in answer_signal_query(signals, "Which message carries EngineTemp?")
+    assert "values {0: 'Off', 1: 'On'}" in answer_signal_query(signals, "values of Mode")
+
+
+def test_message_answer_lists_signals_by_start_bit(signals):
+    answer = answer_signal_query(signals, "signals of 0x1A0").split("\n")
+    assert answer[0] == "**VehicleStatus** (ID 0x1a0, 8 bytes, car.dbc), sent by ECU1:"
+    assert [line.split("**")[1] for line in answer[1:]] == ["VehicleSpeed", "EngineTemp"]
+    assert answer_signal_query(signals, "signals of the message Status").startswith("**Status** (ID 0x2b0")
+
+
+@pytest.mark.parametrize("query", [
+    "Explain how VehicleSpeed is used",  # names a signal, but is not a lookup
+    "What is the status range?",  # a plain word, not the message called Status
+    "Status of the signal range check?",  # sentence case
+    "scale of vehiclespeed",  # not identifier-shaped, so only its exact case matches
+    "signals of 0x7FF",
+])
+def test_non_lookups_fall_back_to_rag(signals, query):
+    assert answer_signal_query(signals, query) is None
+
+
+def test_case_insensitive_identifiers(signals):
+    assert answer_signal_query(signals, "scale of engineTemp").startswith("- **EngineTemp**")
+
+
+def test_update_replaces_and_deletes_sources(signals):
+    signals.update({"car.dbc": MESSAGES[1:]})
+    assert answer_signal_query(signals, "scale of VehicleSpeed") is None
+    signals.update({}, ["car.dbc"])
+    assert answer_signal_query(signals, "values of Mode") is None
+
+
+def test_structured_answer_follows_the_documents(db):
+    with db.IngestSession() as session:
+        session.add(["VehicleStatus message"], None, "car.dbc", "/car.dbc", dbc_messages=MESSAGES)
+    assert db.structured_answer("scale of EngineTemp").startswith("- **EngineTemp**")
+    db.delete_document("car.dbc")
+    assert db.structured_answer("scale of EngineTemp") is None
@@ -1,12 +1,10 @@
 import os
-import pickle
 import numpy as np
 from typing import List, Dict
 from Data_Handler import embed_texts, embed_query
 import config
 
 GOOD_FILE = os.path.join("data", "good_answers.csv")
-EMB_CACHE_FILE = os.path.join("vector_store", "good_embeddings_cache.pkl")
 
 # --------------------------
 # Load good answers
@@ -27,22 +25,11 @@ for col in ["question", "answer"]:
         df_good[col] = ""
 
 # --------------------------
-# Embedding cache for good answers
+# Embeddings for good answers
 # --------------------------
-if os.path.exists(EMB_CACHE_FILE):
-    with open(EMB_CACHE_FILE, "rb") as f:
-        emb_cache = pickle.load(f)
-else:
-    emb_cache = {}
-
 def cached_embed(text: str):
-    if text in emb_cache:
-        return emb_cache[text]
-    emb = embed_query(text)
-    emb_cache[text] = emb
-    with open(EMB_CACHE_FILE, "wb") as f:
-        pickle.dump(emb_cache, f)
-    return emb
+    """embed_query reads through the persistent embedding cache (Embedding_Cache)."""
+    return embed_query(text)
 
 # --------------------------
 # Add a good answer
@@ -68,7 +55,7 @@ def search_good_answer(query: str, top_k: int = 3, threshold: float = 0.8) -> Li
 
     # Prepare embeddings matrix for all good answers
     good_questions = df_good["question"].tolist()
-    good_embeddings = np.array([cached_embed(q) for q in good_questions], dtype=np.float32)
+    good_embeddings = np.array(embed_texts(good_questions), dtype=np.float32)  # one cache lookup
 
     # Normalize embeddings
     query_vec_norm = query_vec / np.linalg.norm(query_vec)